@@ -9,10 +9,14 @@ Updates knowledge base with both backup and fixed code
 import os
 import re
 import json
-from google import genai
+import time
+import atexit
 from dotenv import load_dotenv
 from datetime import datetime
 
+import log_archive
+import metrics
+
 # ============================================================
 #  Load environment variables
 # ============================================================
@@ -24,6 +28,17 @@ MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 KB_PATH = os.path.join(SCRIPT_DIR, os.getenv("KB_PATH", "knowledge_base.json"))
 LOG_FILE = os.path.join(SCRIPT_DIR, os.getenv("LOG_FILE", "log.txt"))
+# Where the fix is written for the orchestrator to apply; each shard worker passes its own
+FIXED_OUTPUT = os.path.join(SCRIPT_DIR, os.getenv("FIXED_OUTPUT", "fixed_output.py"))
+METRICS_JOB = os.getenv("METRICS_JOB", "ai_agent")
+LOG_RECORDS = 50  # most recent ERROR/FATAL records sent to the LLM
+ERROR_LOG_STREAM = os.getenv("ERROR_LOG_STREAM", "log")  # set per shard by shard_router.py
+
+# Written to METRICS_DIR/ai_agent.prom on exit and served by the admin panel's /metrics
+LLM_SECONDS = metrics.histogram("ai_agent_llm_request_seconds", "Latency of LLM fix requests")
+LLM_REQUESTS = metrics.counter("ai_agent_llm_requests_total", "LLM fix requests by result", ("result",))
+PROMPT_BYTES = metrics.histogram("ai_agent_prompt_bytes", "Size of the prompt sent to the LLM",
+                                 buckets=(1024, 4096, 16384, 65536, 262144))
 
 # ============================================================
 #  Initialize Gemini client
@@ -33,10 +48,17 @@ if not API_KEY:
     # Do not exit here to allow parts of the script that don't need the client to run in tests.
 
 client = None
-try:
-    client = genai.Client(api_key=API_KEY) if API_KEY else None
-except Exception as e:
-    print(f"Failed to initialize Gemini client: {e}")
+
+def get_client():
+    """Gemini client, created on first use: importing google.genai dominates AiAgent's startup time."""
+    global client
+    if client is None and API_KEY:
+        try:
+            from google import genai
+            client = genai.Client(api_key=API_KEY)
+        except Exception as e:
+            print(f"Failed to initialize Gemini client: {e}")
+    return client
 
 # ============================================================
 #  Knowledge Base Helpers
@@ -84,7 +106,14 @@ def add_to_kb(faulty_code, fixed_code):
 #  Log Reader
 # ============================================================
 def read_logs() -> str:
-    """Read logs from the log file."""
+    """Read the most recent ERROR/FATAL records from the log archive (legacy log file as fallback)."""
+    try:
+        logs = log_archive.read_text(ERROR_LOG_STREAM, lines=LOG_RECORDS).strip()
+        if logs:
+            return logs
+    except Exception as e:
+        print(f"Error reading log archive: {e}")
+
     log_path = LOG_FILE
     if os.path.exists(log_path):
         try:
@@ -146,15 +175,23 @@ def fix_code(faulty_code: str, logs: str = "") -> str:
         f"Make sure to make the CODE DOESNT CRASH or THROW ANY ERROR, even if there is an error and handle it carefully as put it as info and NOT as an ERROR"
     )
 
+    client = get_client()
     if client is None:
         print("Gemini client not available; returning original faulty code.")
+        metrics.inc(LLM_REQUESTS, ("no_client",))
         return faulty_code
 
+    metrics.observe(PROMPT_BYTES, len(prompt.encode("utf-8")))
+    started = time.perf_counter()
     try:
         response = client.models.generate_content(model=MODEL_NAME, contents=prompt)
     except Exception as e:
         print(f"Error calling Gemini API: {e}")
+        metrics.inc(LLM_REQUESTS, ("error",))
         return faulty_code
+    finally:
+        metrics.observe(LLM_SECONDS, time.perf_counter() - started)
+    metrics.inc(LLM_REQUESTS, ("ok",))
 
     # Extract LLM text safely
     text = getattr(response, "text", "") or ""
@@ -185,6 +222,9 @@ def run_code(code: str):
 #  Main Execution
 # ============================================================
 if __name__ == "__main__":
+    metrics.load_textfile(METRICS_JOB)
+    atexit.register(metrics.write_textfile, METRICS_JOB)
+
     # Read logs first to determine which application/file caused the error
     logs = read_logs()
     print("\n=== Reading Application Logs ===")
@@ -226,7 +266,7 @@ if __name__ == "__main__":
     run_code(fixed_code)
     add_to_kb(faulty_code, fixed_code)
 
-    fixed_output_path = os.path.join(script_dir, "fixed_output.py")
+    fixed_output_path = FIXED_OUTPUT
     try:
         with open(fixed_output_path, "w", encoding="utf-8") as f:
             f.write(fixed_code)
@@ -3,76 +3,217 @@ auto_update.py
 Creates a backup of the dependencies and their versions
 For each depenedency, updates requirements.txt with latest version available online
 Upgrade each depenedency to the version listed in requiremnets.txt
-Runs service to check if dependency works with upgraded version
+Runs every registered service to check if dependency works with upgraded version
 Rollsback to backup if service failed to start with upgraded version
+Upgrades are installed into a snapshot of the service virtualenv (.venvs/candidate),
+so promoting or rolling back an upgrade is a directory swap instead of a reinstall
+Each environment has a lockfile next to it and its wheels are cached (see wheel_cache.py),
+so a deleted environment can be rebuilt offline
 """
 import os
+import re
+import sys
+import json
+import venv
 import subprocess
 import shutil
+import importlib.metadata
+
+import wheel_cache
+from venvs import (VENV_DIR, CURRENT_ENV, CANDIDATE_ENV, PREVIOUS_ENV,
+                   CURRENT_LOCK, CANDIDATE_LOCK, PREVIOUS_LOCK, env_python, service_python)
 
 REQ_FILE = "requirements.txt"
 BACKUP_FILE = "requirements.txt.bkp"
 
+# Lists every distribution visible to an interpreter in one pass (first one on sys.path wins)
+VERSIONS_SNIPPET = (
+    "import importlib.metadata, json\n"
+    "versions = {}\n"
+    "for dist in importlib.metadata.distributions():\n"
+    "    versions.setdefault(dist.metadata['Name'], dist.version)\n"
+    "print(json.dumps(versions))\n"
+)
+
+def normalize(name):
+    """PEP 503 name normalization so 'Typing_Extensions' matches 'typing-extensions'"""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+def installed_versions(python=None):
+    """Installed version of every distribution, keyed by normalized name"""
+    if python is None or python == sys.executable:
+        versions = {}
+        for dist in importlib.metadata.distributions():
+            versions.setdefault(normalize(dist.metadata["Name"]), dist.version)
+        return versions
+    result = subprocess.run([python, "-c", VERSIONS_SNIPPET], capture_output=True, text=True)
+    return {normalize(name): ver for name, ver in json.loads(result.stdout).items()}
+
+def read_libs(file):
+    with open(file, "r") as f:
+        return [line.strip().split("==")[0] for line in f if line.strip()]
+
+def write_pinned(file, libs, versions):
+    """Write lib==version for every lib that is installed"""
+    with open(file, "w") as f:
+        for lib in libs:
+            version = versions.get(normalize(lib))
+            if version:
+                f.write(f"{lib}=={version}\n")
+
 def backup_requirements():
     if os.path.exists(REQ_FILE):
-        shutil.copy(REQ_FILE, BACKUP_FILE)
-        with open(BACKUP_FILE, "r") as f:
-            libs = [line.strip().split("==")[0] for line in f if line.strip()]
-        with open(BACKUP_FILE, "w") as f:
-            for lib in libs:
-                result = subprocess.run(["pip", "show", lib], capture_output=True, text=True)
-                for line in result.stdout.splitlines():
-                    if line.startswith("Version:"):
-                        version = line.split(":")[1].strip()
-                        f.write(f"{lib}=={version}\n")
-
+        libs = read_libs(REQ_FILE)
+        write_pinned(BACKUP_FILE, libs, installed_versions(service_python()))
+        # Lock and cache the current environment so rolling back never needs the index
+        wheel_cache.lock_environment(service_python(), CURRENT_LOCK)
+        wheel_cache.ensure_cached(service_python(), CURRENT_LOCK)
         print("[+] Backup created as requirements.txt.bkp")
     else:
         print("[-] requirements.txt not found.")
         exit()
 
-def upgrade_libraries():
-    print("[+] Upgrading libraries to latest versions...")
-    subprocess.run(["pip", "install", "-r", REQ_FILE])
-    with open(REQ_FILE, "r") as f:
-        libs = [line.strip().split("==")[0] for line in f if line.strip()]
-    with open(REQ_FILE, "w") as f:
-        for lib in libs:
-            result = subprocess.run(["pip", "show", lib], capture_output=True, text=True)
-            for line in result.stdout.splitlines():
-                if line.startswith("Version:"):
-                    version = line.split(":")[1].strip()
-                    f.write(f"{lib}=={version}\n")
+def snapshot_environment():
+    """
+    Create the candidate environment as a copy of the current one.
+    Without a current environment the candidate overlays the system site-packages,
+    so only the upgraded packages are installed into it.
+    """
+    if os.path.exists(CANDIDATE_ENV):
+        shutil.rmtree(CANDIDATE_ENV)
+    if os.path.exists(CURRENT_ENV):
+        shutil.copytree(CURRENT_ENV, CANDIDATE_ENV, symlinks=True)
+    else:
+        venv.create(CANDIDATE_ENV, system_site_packages=True, with_pip=True)
+    return env_python(CANDIDATE_ENV)
+
+def upgrade_libraries(constraints=None):
+    print("[+] Upgrading libraries to latest versions in a candidate environment...")
+    python = snapshot_environment()
+    extra = ["-c", constraints] if constraints else []
+    subprocess.run([python, "-m", "pip", "install", "--find-links", wheel_cache.WHEELHOUSE, *extra, "-r", REQ_FILE])
+    write_pinned(REQ_FILE, read_libs(REQ_FILE), installed_versions(python))
+    wheel_cache.lock_environment(python, CANDIDATE_LOCK)
+    wheel_cache.ensure_cached(python, CANDIDATE_LOCK)
+    wheel_cache.evict(protected_locks=[CURRENT_LOCK, CANDIDATE_LOCK, PREVIOUS_LOCK])
     print("[+] requirements.txt updated with latest versions.")
+    return python
 
-def install_requirements(file):
-    subprocess.run(["pip", "install", "-r", file])
+def run_test(python=None):
+    import fleet_check
 
-def run_test():
-    print("[+] Running 3.py ...")
-    result = subprocess.run(["python", "3.py"], capture_output=True, text=True)
-    print(result.stdout)
-    if result.returncode != 0:
-        print("[-] Crash detected:", result.stderr)
+    print("[+] Running smoke checks of every registered service ...")
+    results = fleet_check.run_fleet(python or service_python())
+    fleet_check.print_results(results)
+    if not all(result["ok"] for result in results.values()):
+        print("[-] Crash detected in:", ", ".join(name for name, result in results.items() if not result["ok"]))
         return False
     return True
 
+def move_environment(src, dst):
+    """Rename an environment directory together with its lockfile, replacing dst"""
+    for src_path, dst_path in ((src, dst), (src + ".lock", dst + ".lock")):
+        if not os.path.exists(src_path):
+            continue
+        if os.path.isdir(dst_path):
+            shutil.rmtree(dst_path)
+        elif os.path.exists(dst_path):
+            os.remove(dst_path)
+        os.rename(src_path, dst_path)
+
+def rebuild_environment(env_dir, lock_file):
+    """Recreate an environment from its lockfile using only the wheel cache"""
+    if os.path.exists(env_dir):
+        shutil.rmtree(env_dir)
+    venv.create(env_dir, system_site_packages=True, with_pip=False)
+    return wheel_cache.install_offline(env_python(env_dir), lock_file)
+
+def promote_candidate():
+    """Make the tested candidate the current environment, keeping the old one as previous"""
+    move_environment(CURRENT_ENV, PREVIOUS_ENV)
+    move_environment(CANDIDATE_ENV, CURRENT_ENV)
+    print("[+] Candidate environment promoted to current.")
+
+def rollback_environment():
+    """
+    Swap the previous environment back in after a promoted upgrade misbehaves.
+    If the previous directory is gone it is rebuilt offline from its lockfile.
+    """
+    if not os.path.exists(PREVIOUS_ENV):
+        if not os.path.exists(PREVIOUS_LOCK) or not rebuild_environment(PREVIOUS_ENV, PREVIOUS_LOCK):
+            print("[-] No previous environment to roll back to.")
+            return False
+    swap_env = os.path.join(VENV_DIR, "swap")
+    move_environment(CURRENT_ENV, swap_env)
+    move_environment(PREVIOUS_ENV, CURRENT_ENV)
+    move_environment(swap_env, PREVIOUS_ENV)
+    print("[+] Previous environment restored.")
+    return True
+
+def reapply_candidate():
+    """Rebuild the last candidate offline from its lockfile and promote it"""
+    if not os.path.exists(CANDIDATE_LOCK):
+        print("[-] No candidate lockfile to re-apply.")
+        return False
+    if not rebuild_environment(CANDIDATE_ENV, CANDIDATE_LOCK):
+        print("[-] Candidate wheels missing from the cache.")
+        return False
+    promote_candidate()
+    return True
+
 def restore_backup():
     print("[+] Restoring from backup...")
     shutil.copy(BACKUP_FILE, REQ_FILE)
-    install_requirements(REQ_FILE)
+    # The current environment was never touched: discarding the candidate is the rollback.
+    # Its lockfile stays so the upgrade can be re-applied offline with --reapply.
+    if os.path.exists(CANDIDATE_ENV):
+        shutil.rmtree(CANDIDATE_ENV)
     print("[+] Old versions restored successfully.")
 
+def upgrade_compatible_subset():
+    """
+    Bisect the failed upgrade set, keep every upgrade that works and retry with that subset.
+    Returns True if a (partial) upgrade was promoted.
+    """
+    import upgrade_bisect
+    import fleet_check
+
+    print("[+] Bisecting the upgrade set to isolate breaking packages...")
+    current = upgrade_bisect.read_pins(BACKUP_FILE)
+    pins, culprits = upgrade_bisect.bisect_upgrades(current, upgrade_bisect.read_pins(REQ_FILE), known_failing=True)
+    print("[+] Upgrade impact (package x service):")
+    fleet_check.print_matrix(fleet_check.build_matrix(upgrade_bisect.TESTED))
+    for name, version in culprits.items():
+        print(f"[-] {name}=={version} breaks the service (keeping {current.get(name, 'not installed')})")
+    if pins == current:
+        return False
+
+    upgrade_bisect.write_pins(REQ_FILE, pins)
+    # Install the subset exactly as it was tested: everything else stays at the baseline
+    upgrades = {name: ver for name, ver in pins.items() if current.get(name) != ver}
+    constraints = upgrade_bisect.write_constraints(CANDIDATE_ENV + ".constraints", upgrades, service_python())
+    if not run_test(upgrade_libraries(constraints)):
+        return False
+    promote_candidate()
+    return True
+
 def main():
     print("=== MCP LIBRARY UPDATE SYSTEM ===")
     backup_requirements()
-    upgrade_libraries()
-    success = run_test()
-    if not success:
+    candidate_python = upgrade_libraries()
+    success = run_test(candidate_python)
+    if success:
+        promote_candidate()
+    elif not upgrade_compatible_subset():
         restore_backup()
         print("[+] Re-running test with old versions...")
         run_test()
     print("=== PROCESS COMPLETE ===")
 
 if __name__ == "__main__":
-    main()
+    if "--rollback" in sys.argv:
+        rollback_environment()
+    elif "--reapply" in sys.argv:
+        reapply_candidate()
+    else:
+        main()
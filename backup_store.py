@@ -0,0 +1,142 @@
+"""
+backup_store.py
+Versioned backup store for files changed by automated remediation
+File contents are stored once per unique content hash (sha256) under .backups/objects
+Each tracked file keeps its own history index under .backups/index
+Any recorded version can be restored by ID without scanning the directory tree
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+
+from datetime import datetime
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(SCRIPT_DIR, os.getenv("BACKUP_STORE", ".backups"))
+OBJECTS_DIR = os.path.join(STORE_DIR, "objects")
+INDEX_DIR = os.path.join(STORE_DIR, "index")
+
+
+def _atomic_write(path, data):
+    """Write bytes to path via a temp file + rename so readers never see partial files."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _relative_name(path):
+    """Key files by their path relative to the project directory (e.g. '2.py')."""
+    full_path = os.path.abspath(os.path.join(SCRIPT_DIR, path))
+    return os.path.relpath(full_path, SCRIPT_DIR).replace(os.sep, "/")
+
+
+def _object_path(digest):
+    return os.path.join(OBJECTS_DIR, digest[:2], digest)
+
+
+def _index_path(filename):
+    return os.path.join(INDEX_DIR, _relative_name(filename).replace("/", "%2F") + ".json")
+
+
+def put_object(data):
+    """Store content once and return its sha256 digest."""
+    digest = hashlib.sha256(data).hexdigest()
+    object_path = _object_path(digest)
+    if not os.path.exists(object_path):
+        _atomic_write(object_path, data)
+    return digest
+
+
+def read_object(digest):
+    with open(_object_path(digest), "rb") as f:
+        return f.read()
+
+
+def list_versions(filename):
+    """Return the recorded history of a single file, oldest first."""
+    index_path = _index_path(filename)
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def tracked_files():
+    """Return every file that has at least one recorded version."""
+    if not os.path.isdir(INDEX_DIR):
+        return []
+    return sorted(name[:-len(".json")].replace("%2F", "/")
+                  for name in os.listdir(INDEX_DIR) if name.endswith(".json"))
+
+
+def save_version(path, reason=""):
+    """
+    Record the current content of path as a new version.
+    Returns the history entry; an unchanged file returns its latest entry instead of a duplicate.
+    """
+    full_path = os.path.join(SCRIPT_DIR, path)
+    with open(full_path, "rb") as f:
+        data = f.read()
+
+    digest = put_object(data)
+    history = list_versions(path)
+    if history and history[-1]["sha256"] == digest:
+        return history[-1]
+
+    entry = {
+        "id": len(history) + 1,
+        "sha256": digest,
+        "size": len(data),
+        "reason": reason,
+        "timestamp": datetime.now().isoformat()
+    }
+    history.append(entry)
+    _atomic_write(_index_path(path), json.dumps(history, indent=2).encode("utf-8"))
+    return entry
+
+
+def get_version(filename, version_id):
+    """
+    Look up a version by its numeric ID or by a unique content-hash prefix.
+    Returns None when nothing matches.
+    """
+    history = list_versions(filename)
+    version_id = str(version_id).strip()
+    if version_id.isdigit():
+        for entry in history:
+            if entry["id"] == int(version_id):
+                return entry
+        return None
+
+    matches = {entry["sha256"]: entry for entry in history if entry["sha256"].startswith(version_id)}
+    if len(matches) == 1:
+        # Newest entry wins when the same content appears more than once
+        return [entry for entry in history if entry["sha256"] in matches][-1]
+    return None
+
+
+def restore_version(filename, version_id):
+    """
+    Replace filename with the content of the given version.
+    The content being replaced is recorded first, so a rollback can itself be rolled back.
+    Returns the restored entry, or None if the version does not exist.
+    """
+    entry = get_version(filename, version_id)
+    if entry is None:
+        return None
+
+    full_path = os.path.join(SCRIPT_DIR, filename)
+    if os.path.exists(full_path):
+        save_version(filename, reason=f"pre-rollback to v{entry['id']}")
+
+    _atomic_write(full_path, read_object(entry["sha256"]))
+    return entry
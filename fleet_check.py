@@ -0,0 +1,166 @@
+"""
+fleet_check.py
+Validates an environment against every registered service instead of only 3.py
+Runs the smoke check of each service (see "smoke" in supervisor.SERVICES) concurrently,
+each with its own timeout, so a pass takes as long as the slowest service
+Checks run in isolation: each service gets a scratch working directory seeded with its smoke
+files, and the services talk to a stub orchestrator on ephemeral ports, so no real instance is
+registered, no ERROR line reaches the AI agent and parallel runs share no state files
+Builds a package x service matrix from the upgrade sets tested by upgrade_bisect.py
+"""
+
+import os
+import sys
+import uuid
+import shutil
+import asyncio
+import tempfile
+import time
+
+import websockets
+
+from supervisor import SERVICES, SCRIPT_DIR
+
+
+def smoke_services():
+    """Services that define a smoke check"""
+    return [name for name, spec in SERVICES.items() if "smoke" in spec]
+
+
+async def stub_orchestrator():
+    """
+    Registration, stream and heartbeat ports that accept everything and act on nothing.
+    Returns (servers, environment pointing service_client.py at them)
+    """
+    async def register(ws):
+        await ws.recv()
+        await ws.send(str(uuid.uuid4()))
+
+    async def drain(ws):
+        async for _ in ws:
+            pass
+
+    servers, env = [], dict()
+    for handler, prefix in ((register, "APP"), (drain, "WS"), (drain, "HB")):
+        server = await websockets.serve(handler, "127.0.0.1", 0)
+        servers.append(server)
+        env[f"{prefix}_HOST"] = "127.0.0.1"
+        env[f"{prefix}_PORT"] = str(server.sockets[0].getsockname()[1])
+    return servers, env
+
+
+def scratch_env(workdir, stub_env):
+    """Environment of a smoke run: stub orchestrator, state and logs inside the scratch directory"""
+    return dict(os.environ, PYTHONUNBUFFERED="1", **stub_env,
+                STATE_DIR=os.path.join(workdir, ".state"), LOG_ARCHIVE_DIR=os.path.join(workdir, ".logs"),
+                METRICS_DIR=os.path.join(workdir, ".metrics"))
+
+
+async def smoke_check(name, python, stub_env):
+    """Run one service with the given interpreter in a scratch directory: {"ok", "reason", "seconds"}"""
+    spec = SERVICES[name]
+    smoke = spec["smoke"]
+    started = time.monotonic()
+    returncode = 0
+    workdir = tempfile.mkdtemp(prefix=f"smoke-{name}-")
+    for filename, content in smoke.get("files", {}).items():
+        with open(os.path.join(workdir, filename), "w") as f:
+            f.write(content)
+    try:
+        for script in spec["scripts"]:
+            proc = await asyncio.create_subprocess_exec(
+                python, os.path.join(SCRIPT_DIR, script),
+                cwd=workdir,
+                env=scratch_env(workdir, stub_env),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                _, stderr = await asyncio.wait_for(
+                    proc.communicate(smoke.get("stdin", "").encode()), smoke["timeout"])
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                ok = smoke.get("pass_on_timeout", False)
+                reason = "still running" if ok else f"timed out after {smoke['timeout']}s"
+                return {"ok": ok, "reason": reason, "seconds": time.monotonic() - started}
+            returncode = proc.returncode
+            if returncode != 0:
+                last_line = stderr.decode("utf-8", errors="replace").strip().splitlines()[-1:]
+                return {"ok": False, "reason": f"exit {returncode}: {''.join(last_line)}",
+                        "seconds": time.monotonic() - started}
+    except Exception as e:
+        return {"ok": False, "reason": str(e), "seconds": time.monotonic() - started}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {"ok": True, "reason": "exit 0", "seconds": time.monotonic() - started}
+
+
+async def smoke_fleet(python):
+    names = smoke_services()
+    servers, stub_env = await stub_orchestrator()
+    try:
+        results = await asyncio.gather(*(smoke_check(name, python, stub_env) for name in names))
+    finally:
+        for server in servers:
+            server.close()
+    return dict(zip(names, results))
+
+
+def run_fleet(python=None):
+    """Smoke check every registered service concurrently: 'service' : result"""
+    return asyncio.run(smoke_fleet(python or sys.executable))
+
+
+def print_results(results):
+    print(f"{'Service':<12} {'Result':<8} {'Time':<8} Detail")
+    print("-" * 60)
+    for name, result in results.items():
+        print(f"{name:<12} {'PASS' if result['ok'] else 'FAIL':<8} {result['seconds']:<8.1f} {result['reason']}")
+
+
+def build_matrix(tested):
+    """
+    Attribute fleet results of tested upgrade sets to single packages.
+    tested: list of ({package: version}, {service: result}).
+    A package passes for a service when any set containing it passed there; it fails when a
+    failing set contains it and every other package of that set passes. Anything else is unknown.
+    Returns 'package' : {'service' : "pass" | "fail" | "?"}
+    """
+    packages = sorted({name for upgrades, _ in tested for name in upgrades})
+    services = sorted({service for _, results in tested for service in results})
+    matrix = {package: {service: "?" for service in services} for package in packages}
+
+    for upgrades, results in tested:
+        for service, result in results.items():
+            if result["ok"]:
+                for package in upgrades:
+                    matrix[package][service] = "pass"
+
+    changed = True
+    while changed:
+        changed = False
+        for upgrades, results in tested:
+            for service, result in results.items():
+                if result["ok"]:
+                    continue
+                unknown = [p for p in upgrades if matrix[p][service] != "pass"]
+                if len(unknown) == 1 and matrix[unknown[0]][service] != "fail":
+                    matrix[unknown[0]][service] = "fail"
+                    changed = True
+    return matrix
+
+
+def print_matrix(matrix):
+    if not matrix:
+        return
+    services = list(next(iter(matrix.values())))
+    print(f"{'Package':<30} " + " ".join(f"{s:<8}" for s in services))
+    print("-" * (31 + 9 * len(services)))
+    for package, row in matrix.items():
+        print(f"{package:<30} " + " ".join(f"{row[s]:<8}" for s in services))
+
+
+if __name__ == "__main__":
+    print_results(run_fleet(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -0,0 +1,119 @@
+"""
+health_monitor.py
+Health monitor websocket server: receives the orchestrator's (or shard router's) health reports
+Runs inside the admin panel's event loop (start() / stop()), or on its own with `python health_monitor.py`
+The latest report is kept in memory (latest()) for /api/health-status; every report is also
+written to the "ws_server" log stream, buffered and flushed at most every HEALTH_LOG_FLUSH seconds
+"""
+
+import os
+import asyncio
+import time
+
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import websockets
+
+import log_archive
+import perf_backend
+
+HS_HM_HOST = os.getenv("HS_HM_HOST", "localhost")
+HS_HM_PORT = os.getenv("HS_HM_PORT", "9001")
+HEALTH_LOG_FLUSH = float(os.getenv("HEALTH_LOG_FLUSH", "1.0"))  # seconds between log flushes
+HEALTH_LOG_BUFFER = 256  # buffered log records that force an early flush
+LOG_STREAM = "ws_server"
+
+# Latest health report: {"report": parsed report, "received": epoch, "client": "host:port", "version": reports seen}
+LATEST = {"report": None, "received": None, "client": None, "version": 0}
+# (ts, line) records waiting to be written to the log stream
+BUFFER = []
+server = None
+flusher = None
+
+
+def log(message):
+    """Buffer one line for the health monitor log"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    BUFFER.append((time.time(), f"[{timestamp}] {message}"))
+    if len(BUFFER) >= HEALTH_LOG_BUFFER:
+        flush()
+
+
+def flush():
+    global BUFFER
+    records, BUFFER = BUFFER, []
+    try:
+        log_archive.append_many(LOG_STREAM, records)
+    except Exception as e:
+        print(f"Error writing to log: {e}")
+
+
+async def _flush_loop():
+    while True:
+        await asyncio.sleep(HEALTH_LOG_FLUSH)
+        if BUFFER:
+            flush()
+
+
+async def health_handler(ws):
+    client = "{}:{}".format(*ws.remote_address[:2]) if ws.remote_address else "unknown"
+    try:
+        async for msg in ws:
+            received = time.time()
+            log(f"Received from {client}: {msg}")
+            try:
+                report = perf_backend.loads(msg)
+            except Exception as e:
+                log(f"Invalid health report from {client}: {e}")
+                continue
+            LATEST.update(report=report, received=received, client=client, version=LATEST["version"] + 1)
+    except websockets.exceptions.ConnectionClosed:
+        pass
+    except Exception as e:
+        log(f"Error handling client {client}: {e}")
+
+
+def latest():
+    """(report, epoch received, version) of the newest health report; report is None before the first one"""
+    return LATEST["report"], LATEST["received"], LATEST["version"]
+
+
+async def start(host=HS_HM_HOST, port=HS_HM_PORT):
+    """Listen on the running event loop; returns once the port accepts connections"""
+    global server, flusher
+    log_archive.clear(LOG_STREAM)
+    log("=" * 60)
+    log("WebSocket Health Monitor Server Starting...")
+    log("=" * 60)
+    server = await websockets.serve(health_handler, host, int(port))
+    flusher = asyncio.create_task(_flush_loop())
+    log(f"WebSocket server started on ws://{host}:{port}")
+    print(f"Health monitor listening on ws://{host}:{port}")
+    return server
+
+
+async def stop():
+    global server, flusher
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+        server = None
+    if flusher is not None:
+        flusher.cancel()
+        flusher = None
+    flush()
+
+
+async def main():
+    await start()
+    try:
+        await asyncio.Future()
+    finally:
+        await stop()
+
+
+if __name__ == "__main__":
+    perf_backend.run(main())
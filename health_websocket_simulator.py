@@ -1,2 +1,182 @@
-""" New service integration PoC, currently unused """
-Tmp
\ No newline at end of file
+"""
+health_websocket_simulator.py
+Synthetic fleet load generator for the orchestrator
+Simulates N services in one process: each registers on the app ID port (following the shard
+router's reply when sharded), sends heartbeats and streams log lines at a configurable rate
+ERROR / FATAL bursts are opt-in (--error-every): every ERROR starts an AI agent run
+Usage: python health_websocket_simulator.py [--services 100] [--rate 1] [--duration 60]
+                                            [--error-every 0] [--burst 3] [--fatal]
+load_bench.py drives it to benchmark the orchestrator end to end
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import websockets
+
+from datetime import datetime
+from websockets.exceptions import WebSocketException
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import tracing
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows: no per-process descriptor limit to raise
+
+APPSOCKET_URI = "ws://" + os.getenv("APP_HOST") + ":" + os.getenv("APP_PORT")
+WEBSOCKET_URI = "ws://" + os.getenv("WS_HOST") + ":" + os.getenv("WS_PORT")
+HB_URI = "ws://" + os.getenv("HB_HOST") + ":" + os.getenv("HB_PORT")
+
+CONNECTION_ERRORS = (OSError, WebSocketException, asyncio.TimeoutError)
+
+MESSAGES = ["request served", "cache miss for user", "database query finished", "connection reused",
+            "payload validated", "session refreshed", "job queued", "upstream responded"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate a fleet of services against the orchestrator")
+    parser.add_argument("--services", type=int, default=100, help="simulated services")
+    parser.add_argument("--rate", type=float, default=1, help="log lines per second per service (0: as fast as possible)")
+    parser.add_argument("--hb-interval", type=float, default=float(os.getenv("HB_INTERVAL", "1")),
+                        help="seconds between heartbeats")
+    parser.add_argument("--duration", type=float, default=60, help="seconds each service runs")
+    parser.add_argument("--ramp", type=float, default=5, help="seconds over which services register")
+    parser.add_argument("--error-every", type=float, default=0,
+                        help="seconds between ERROR bursts per service (0: no errors)")
+    parser.add_argument("--burst", type=int, default=3, help="ERROR lines per burst")
+    parser.add_argument("--fatal", action="store_true", help="end every burst with a FATAL (the service stops streaming)")
+    parser.add_argument("--prefix", default="sim", help="app name prefix")
+    return parser.parse_args(argv)
+
+
+def new_stats():
+    return {"registered": 0, "lines": 0, "errors": 0, "heartbeats": 0, "failures": 0,
+            "first_heartbeat": dict()}  # app ID : wall time its first heartbeat was sent
+
+
+def raise_fd_limit():
+    """Every service holds a log stream open; allow as many sockets as the hard limit does"""
+    if resource is None:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def log_line(name, sev, text):
+    # Traced like service_client.py's lines
+    return f"[{name}] [{sev}] [{datetime.now().isoformat()}] {tracing.stamp()}{text}\n"
+
+
+async def register(name):
+    """Returns (app ID, log stream URI, heartbeat URI)"""
+    async with websockets.connect(APPSOCKET_URI, open_timeout=30) as ws:
+        await ws.send(name)
+        reply = await ws.recv()
+    if reply.startswith("{"):
+        shard = json.loads(reply)
+        return shard["id"], shard["ws"], shard["hb"]
+    return reply, WEBSOCKET_URI, HB_URI
+
+
+async def send_heartbeats(app_id, hb_uri, interval, until, stats):
+    while time.monotonic() < until:
+        try:
+            async with websockets.connect(hb_uri, open_timeout=30) as ws:
+                sent = time.time()
+                await ws.send(f"[{app_id}] [INFO] [{datetime.now().isoformat()}] Heartbeat")
+            stats["first_heartbeat"].setdefault(app_id, sent)
+            stats["heartbeats"] += 1
+        except CONNECTION_ERRORS:
+            stats["failures"] += 1
+        await asyncio.sleep(interval)
+    try:
+        async with websockets.connect(hb_uri, open_timeout=30) as ws:
+            await ws.send(f"[{app_id}] [INFO] [{datetime.now().isoformat()}] Exit")
+    except CONNECTION_ERRORS:
+        stats["failures"] += 1
+
+
+async def stream_logs(name, ws_uri, config, until, stats):
+    delay = 1 / config.rate if config.rate > 0 else 0
+    next_burst = time.monotonic() + random.uniform(0, config.error_every) if config.error_every > 0 else None
+    i = 0
+    try:
+        async with websockets.connect(ws_uri, open_timeout=30) as ws:
+            # Spread the lines of different services over the interval
+            await asyncio.sleep(random.uniform(0, delay))
+            while time.monotonic() < until:
+                i += 1
+                await ws.send(log_line(name, "INFO", f"{MESSAGES[i % len(MESSAGES)]} {i}"))
+                stats["lines"] += 1
+                if next_burst is not None and time.monotonic() >= next_burst:
+                    next_burst += config.error_every
+                    for n in range(config.burst):
+                        sev = "FATAL" if config.fatal and n == config.burst - 1 else "ERROR"
+                        await ws.send(log_line(name, sev, f"simulated failure {n + 1}/{config.burst} after line {i}"))
+                        stats["lines"] += 1
+                        stats["errors"] += 1
+                    if config.fatal:
+                        return  # the orchestrator closes the stream on FATAL
+                await asyncio.sleep(delay)
+    except CONNECTION_ERRORS:
+        stats["failures"] += 1
+
+
+async def simulate_service(index, config, until, stats):
+    name = f"{config.prefix}-{index:05d}.py"
+    await asyncio.sleep(random.uniform(0, config.ramp))
+    try:
+        app_id, ws_uri, hb_uri = await register(name)
+    except CONNECTION_ERRORS:
+        stats["failures"] += 1
+        return
+    stats["registered"] += 1
+    await asyncio.gather(send_heartbeats(app_id, hb_uri, config.hb_interval, until, stats),
+                         stream_logs(name, ws_uri, config, until, stats))
+
+
+async def run_fleet(config, stats=None):
+    """Run every simulated service to the end of the ramp plus duration; returns the stats"""
+    stats = stats if stats is not None else new_stats()
+    until = time.monotonic() + config.ramp + config.duration
+    await asyncio.gather(*(simulate_service(index, config, until, stats) for index in range(config.services)))
+    return stats
+
+
+async def report_progress(stats, every=5):
+    started = time.monotonic()
+    last = 0
+    while True:
+        await asyncio.sleep(every)
+        print(f"[{time.monotonic() - started:6.0f}s] registered {stats['registered']}, "
+              f"{(stats['lines'] - last) / every:,.0f} lines/s, {stats['heartbeats']} heartbeats, "
+              f"{stats['errors']} errors, {stats['failures']} connection failures")
+        last = stats["lines"]
+
+
+async def main(config):
+    stats = new_stats()
+    progress = asyncio.create_task(report_progress(stats))
+    try:
+        await run_fleet(config, stats)
+    finally:
+        progress.cancel()
+    print(f"Done: {stats['registered']}/{config.services} services, {stats['lines']} lines "
+          f"({stats['errors']} ERROR/FATAL), {stats['heartbeats']} heartbeats, {stats['failures']} connection failures")
+
+
+if __name__ == "__main__":
+    config = parse_args()
+    raise_fd_limit()
+    print(f"Simulating {config.services} services: {config.rate} lines/s each, heartbeat every "
+          f"{config.hb_interval}s, {config.duration}s after a {config.ramp}s ramp")
+    asyncio.run(main(config))
@@ -0,0 +1,81 @@
+"""
+http_cache.py
+Conditional GET and compression for the admin panel's polled read endpoints
+Each endpoint passes a cheap version of the data it serves (file sizes / mtimes, log archive
+fingerprint); the body is built, encoded and compressed once per version and shared by every
+client, a client that already has it gets 304 Not Modified (ETag / If-None-Match, Last-Modified /
+If-Modified-Since), and large bodies are sent brotli (when installed) or gzip compressed
+"""
+
+import os
+import gzip
+import hashlib
+
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Response
+
+import perf_backend
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+
+# 'name' : {"version", "etag", "last_modified", "body", "encoded": {encoding: bytes}}
+CACHE = dict()
+ENCODERS = {"gzip": lambda body: gzip.compress(body, compresslevel=6)}
+if brotli:
+    ENCODERS = {"br": lambda body: brotli.compress(body, quality=5), **ENCODERS}
+
+
+def etag(version):
+    return '"' + hashlib.blake2b(repr(version).encode("utf-8"), digest_size=12).hexdigest() + '"'
+
+
+def _not_modified(request, entry):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return entry["etag"] in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")) \
+            or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and entry["last_modified"]:
+        try:
+            return int(entry["last_modified"]) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _encoding(request, body):
+    if len(body) < COMPRESS_MIN_BYTES:
+        return None
+    accepted = {part.split(";")[0].strip() for part in request.headers.get("accept-encoding", "").split(",")}
+    return next((encoding for encoding in ENCODERS if encoding in accepted), None)
+
+
+def respond(request, name, version, build, last_modified=None):
+    """
+    JSON response of build() for this version of `name`: 304 when the client already has it,
+    otherwise the cached body, compressed when the client accepts it
+    """
+    entry = CACHE.get(name)
+    if entry is None or entry["version"] != version:
+        entry = CACHE[name] = {"version": version, "etag": etag(version), "last_modified": last_modified,
+                               "body": perf_backend.dumps_bytes(build()), "encoded": dict()}
+    headers = {"ETag": entry["etag"], "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if last_modified:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+
+    body = entry["body"]
+    encoding = _encoding(request, body)
+    if encoding:
+        if encoding not in entry["encoded"]:
+            entry["encoded"][encoding] = ENCODERS[encoding](body)
+        body = entry["encoded"][encoding]
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,121 @@
+"""
+jobs.py
+Scripts launched from the admin panel (/run/<script>) as jobs
+submit() returns a job ID at once; the job waits for the services it depends on, starts the
+script under the supervisor (asyncio subprocess, no shell) and follows that run until the
+supervisor is done with it (exit, crash loop or stop), keeping its stdout/stderr and exit code
+Clients read a job's status with get() and stream its output with subscribe()
+"""
+
+import os
+import asyncio
+
+from collections import deque
+from datetime import datetime
+
+import supervisor
+
+JOB_LIMIT = int(os.getenv("JOB_LIMIT", "200"))  # finished jobs kept, oldest dropped first
+
+# 'job id' : {"id", "script", "status", "pid", "created", "finished", "exit_code",
+#             "output": deque of (stream, line), "subscribers": set of asyncio.Queue, "task"}
+JOBS = dict()
+FINISHED = ("exited", "crashed", "crash-loop", "stopped", "failed")
+
+
+def _emit(job, stream, line):
+    job["output"].append((stream, line))
+    for queue in job["subscribers"]:
+        queue.put_nowait((stream, line))
+
+
+def _finish(job, status, exit_code=None):
+    job.update(status=status, exit_code=exit_code, pid=None, finished=datetime.now().isoformat())
+    for queue in job["subscribers"]:
+        queue.put_nowait(None)
+
+
+async def _follow(job, script, queue):
+    """Copy the service's output into the job until its supervision ends"""
+    ended = asyncio.create_task(supervisor.wait_exit(script))
+    while True:
+        getter = asyncio.create_task(queue.get())
+        done, _ = await asyncio.wait({getter, ended}, return_when=asyncio.FIRST_COMPLETED)
+        if getter not in done:
+            getter.cancel()
+            break
+        _emit(job, *getter.result())
+        job["pid"] = supervisor.service_status(script)["pid"] or job["pid"]
+    while not queue.empty():
+        _emit(job, *queue.get_nowait())
+    return ended.result()
+
+
+async def _run(job, wait_for):
+    script = job["script"]
+    queue = supervisor.subscribe(script)
+    try:
+        for name in wait_for:
+            if supervisor.service_status(name)["status"] == "running":
+                _emit(job, "job", f"waiting for {name} to accept connections")
+                await supervisor.wait_ready(name)
+        status = await supervisor.start(script)
+        job.update(status="running", pid=status["pid"])
+        if status["status"] == "running" and status["started"] and status["started"] < job["created"]:
+            _emit(job, "job", f"{script} was already running (pid {status['pid']}); following it")
+        status = await _follow(job, script, queue)
+        _finish(job, status["status"], status["exit_code"])
+    except Exception as e:
+        _emit(job, "job", f"failed: {e}")
+        _finish(job, "failed")
+    finally:
+        supervisor.unsubscribe(script, queue)
+
+
+def submit(script, wait_for=()):
+    """Start a job for a supervised service and return it right away; the launch happens in the background"""
+    job_id = os.urandom(8).hex()
+    job = JOBS[job_id] = {"id": job_id, "script": script, "status": "pending", "pid": None,
+                          "created": datetime.now().isoformat(), "finished": None, "exit_code": None,
+                          "output": deque(maxlen=supervisor.OUTPUT_LINES), "subscribers": set()}
+    job["task"] = asyncio.create_task(_run(job, wait_for))
+    _prune()
+    return job
+
+
+def _prune():
+    finished = [job_id for job_id, job in JOBS.items() if job["status"] in FINISHED]
+    for job_id in finished[:max(0, len(JOBS) - JOB_LIMIT)]:
+        del JOBS[job_id]
+
+
+def get(job_id, lines=0):
+    """Status of a job (None if unknown), with its last `lines` output lines"""
+    job = JOBS.get(job_id)
+    if job is None:
+        return None
+    info = {key: job[key] for key in ("id", "script", "status", "pid", "created", "finished", "exit_code")}
+    if lines:
+        info["output"] = [{"stream": stream, "line": line} for stream, line in list(job["output"])[-lines:]]
+    return info
+
+
+def list_jobs():
+    return [get(job_id) for job_id in reversed(list(JOBS))]
+
+
+def subscribe(job_id):
+    """(output so far, queue of lines from now on) of a job; the queue receives None when the job ends"""
+    job = JOBS[job_id]
+    queue = asyncio.Queue()
+    if job["status"] in FINISHED:
+        queue.put_nowait(None)
+    else:
+        job["subscribers"].add(queue)
+    return list(job["output"]), queue
+
+
+def unsubscribe(job_id, queue):
+    job = JOBS.get(job_id)
+    if job:
+        job["subscribers"].discard(queue)
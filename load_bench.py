@@ -0,0 +1,311 @@
+"""
+load_bench.py
+End-to-end benchmark of the orchestrator under a simulated fleet (health_websocket_simulator.py)
+Starts a fresh orchestrator (or the shard router with --shards > 1), listens as the health
+monitor and runs the fleet, then reports:
+  ingest throughput (lines indexed per second, read back through the query port)
+  heartbeat-to-health-visible latency: first heartbeat of an instance until a health report lists it healthy
+  orchestrator CPU and peak RSS from /proc (Linux; all worker processes when sharded)
+  event-loop lag and blocking callbacks, from the orchestrator's loop watchdog
+Results are compared with bench_baseline.json (written with --save-baseline); a metric that is
+worse by more than --tolerance is a regression and the exit code is 1
+Stop any running orchestrator and health monitor first: the benchmark uses the ports from .env
+Usage: python load_bench.py [--services 1000] [--rate 2] [--duration 20] [--shards 1] [--processes 1]
+                            [--save-baseline]
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import websockets
+
+from datetime import datetime
+from multiprocessing import Process, Queue
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import health_websocket_simulator as simulator
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(SCRIPT_DIR, "bench_baseline.json")
+
+QS_URI = "ws://" + os.getenv("QS_HOST", "127.0.0.1") + ":" + os.getenv("QS_PORT", "3806")
+HS_HM_HOST = os.getenv("HS_HM_HOST")
+HS_HM_PORT = os.getenv("HS_HM_PORT")
+
+# Result : +1 when higher is better, -1 when lower is better
+DIRECTIONS = {
+    "ingest_lines_per_s": +1,
+    "hb_visible_p50_ms": -1,
+    "hb_visible_p95_ms": -1,
+    "hb_visible_p99_ms": -1,
+    "cpu_percent": -1,
+    "peak_rss_mb": -1,
+    "loop_lag_p99_ms": -1,
+}
+
+
+async def query(request):
+    async with websockets.connect(QS_URI) as ws:
+        await ws.send(json.dumps(request))
+        return json.loads(await ws.recv())
+
+
+async def wait_for_orchestrator(timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if (await query({"op": "search_stats"})).get("ok"):
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Orchestrator did not start")
+
+
+async def ingested():
+    """Documents indexed so far (summed over shards behind the router)"""
+    result = (await query({"op": "search_stats"}))["result"]
+    if "documents" in result:
+        return result["documents"]
+    return sum(stats["documents"] for stats in result.values())
+
+
+async def loop_report():
+    """Worst p99 lag of the main event loops and the blocking episodes (over shards behind the router)"""
+    result = (await query({"op": "loop"}))["result"]
+    reports = [result] if "loops" in result else list(result.values())
+    lag = max((report["loops"]["main"]["p99_ms"] for report in reports if "main" in report["loops"]), default=None)
+    offenders = [offender for report in reports for offender in report["offenders"]]
+    return lag, offenders
+
+
+def health_listener(visible):
+    """Stands in for the health monitor: remembers when each instance was first reported healthy"""
+    async def handler(ws):
+        async for msg in ws:
+            now = time.time()
+            for app in json.loads(msg).get("apps", []):
+                for ids in app.values():
+                    for app_id, healthy in ids.items():
+                        if healthy:
+                            visible.setdefault(app_id, now)
+    return handler
+
+
+def fleet_process(config, results):
+    results.put(asyncio.run(simulator.run_fleet(config)))
+
+
+async def run_fleets(config):
+    """The fleet split over config.processes generator processes, with their stats combined"""
+    if config.processes <= 1:
+        return await simulator.run_fleet(config)
+    results = Queue()
+    procs = []
+    for index in range(config.processes):
+        part = argparse.Namespace(**vars(config))
+        part.services = config.services // config.processes + (index < config.services % config.processes)
+        part.prefix = f"{config.prefix}{index}"
+        procs.append(Process(target=fleet_process, args=(part, results)))
+        procs[-1].start()
+    stats = simulator.new_stats()
+    loop = asyncio.get_running_loop()
+    for _ in procs:
+        part_stats = await loop.run_in_executor(None, results.get)
+        for key, value in part_stats.items():
+            if key == "first_heartbeat":
+                stats[key].update(value)
+            else:
+                stats[key] += value
+    for proc in procs:
+        proc.join()
+    return stats
+
+
+def process_tree(pid):
+    pids = [pid]
+    for child in pids:
+        try:
+            with open(f"/proc/{child}/task/{child}/children", "r") as f:
+                pids.extend(int(p) for p in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def cpu_seconds(pids):
+    """User + system CPU time of the processes, from /proc/<pid>/stat"""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", "r") as f:
+                fields = f.read().rpartition(")")[2].split()
+            total += int(fields[11]) + int(fields[12])  # utime, stime
+        except OSError:
+            pass
+    return total / os.sysconf("SC_CLK_TCK")
+
+
+def peak_rss_mb(pids):
+    """Sum of the processes' high-water resident set size (VmHWM)"""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total / 1024
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def run_bench(config):
+    has_proc = os.path.isdir("/proc/self")
+    visible = dict()
+    health_server = await websockets.serve(health_listener(visible), HS_HM_HOST, HS_HM_PORT)
+    workdir = tempfile.mkdtemp(prefix="load-bench-")
+    if config.shards > 1:
+        command = [sys.executable, os.path.join(SCRIPT_DIR, "shard_router.py"), "--shards", str(config.shards)]
+    else:
+        command = [sys.executable, os.path.join(SCRIPT_DIR, "orchestrator.py")]
+    # Child processes inherit the raised descriptor limit
+    simulator.raise_fd_limit()
+    proc = subprocess.Popen(command, cwd=SCRIPT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            env=dict(os.environ, STATE_DIR=os.path.join(workdir, "state"), REPLICATION_PORT=""))
+    try:
+        await wait_for_orchestrator()
+        pids = process_tree(proc.pid) if has_proc else []
+        before = await ingested()
+        cpu_before = cpu_seconds(pids)
+        started = time.perf_counter()
+
+        stats = await run_fleets(config)
+        sent = time.perf_counter()
+        # Lines still queued in the orchestrator when the fleet stops count towards the run
+        deadline = sent + config.drain_timeout
+        while (count := await ingested() - before) < stats["lines"] and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        cpu = cpu_seconds(pids) - cpu_before
+        rss = peak_rss_mb(pids)
+        loop_lag, offenders = await loop_report()
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+        health_server.close()
+
+    latencies = [(visible[app_id] - first) * 1000 for app_id, first in stats["first_heartbeat"].items()
+                 if app_id in visible]
+    results = {"ingest_lines_per_s": round(count / elapsed)}
+    if latencies:
+        for p in (50, 95, 99):
+            results[f"hb_visible_p{p}_ms"] = round(percentile(latencies, p), 1)
+    if has_proc:
+        results["cpu_percent"] = round(cpu / elapsed * 100, 1)
+        results["peak_rss_mb"] = round(rss, 1)
+    if loop_lag is not None:
+        results["loop_lag_p99_ms"] = loop_lag
+    details = {
+        "registered": stats["registered"],
+        "lines_sent": stats["lines"],
+        "lines_ingested": count,
+        "drain_seconds": round(time.perf_counter() - sent, 2),
+        "heartbeats": stats["heartbeats"],
+        "instances_visible": len(latencies),
+        "connection_failures": stats["failures"],
+        "loop_blocks": sum(offender["count"] for offender in offenders),
+    }
+    for offender in sorted(offenders, key=lambda offender: offender["total_ms"], reverse=True)[:5]:
+        print(f"Event loop blocked {offender['count']} time(s), {offender['total_ms']:,.0f} ms in total, "
+              f"in {offender['site']}")
+    return results, details
+
+
+def bench_config(config):
+    """The parameters a baseline is only comparable under"""
+    return {"services": config.services, "rate": config.rate, "hb_interval": config.hb_interval,
+            "duration": config.duration, "ramp": config.ramp, "error_every": config.error_every,
+            "shards": config.shards, "processes": config.processes, "cpus": os.cpu_count()}
+
+
+def compare(results, baseline, tolerance):
+    """Lines of the report and the names of regressed metrics"""
+    lines, regressions = [], []
+    for name, direction in DIRECTIONS.items():
+        if name not in results:
+            continue
+        value = results[name]
+        old = baseline.get(name)
+        if not old:
+            lines.append(f"  {name:<20} {value:>12,}")
+            continue
+        change = (value - old) / old
+        worse = -change * direction > tolerance
+        if worse:
+            regressions.append(name)
+        lines.append(f"  {name:<20} {value:>12,}  baseline {old:>12,}  {change:+7.1%}{'  REGRESSION' if worse else ''}")
+    return lines, regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the orchestrator under a simulated fleet")
+    parser.add_argument("--services", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=2, help="log lines per second per service (0: as fast as possible)")
+    parser.add_argument("--hb-interval", type=float, default=1)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--ramp", type=float, default=5)
+    parser.add_argument("--error-every", type=float, default=0,
+                        help="ERROR bursts per service every N seconds (starts AI agent runs)")
+    parser.add_argument("--shards", type=int, default=1, help="run the shard router with N workers")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="generator processes (one process tops out at a few thousand services)")
+    parser.add_argument("--drain-timeout", type=float, default=60,
+                        help="seconds to wait for the orchestrator to catch up after the fleet stops")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative change before a regression")
+    parser.add_argument("--save-baseline", action="store_true", help=f"store the results in {os.path.basename(BASELINE_FILE)}")
+    args = parser.parse_args()
+    config = simulator.parse_args(["--services", str(args.services), "--rate", str(args.rate),
+                                   "--hb-interval", str(args.hb_interval), "--duration", str(args.duration),
+                                   "--ramp", str(args.ramp), "--error-every", str(args.error_every)])
+    config.shards = args.shards
+    config.processes = args.processes
+    config.drain_timeout = args.drain_timeout
+
+    print(f"{os.cpu_count()} CPU(s); {args.services} services x {args.rate} lines/s, heartbeat every "
+          f"{args.hb_interval}s, {args.duration}s + {args.ramp}s ramp, {args.shards} shard(s)")
+    results, details = asyncio.run(run_bench(config))
+    print(", ".join(f"{key} {value:,}" for key, value in details.items()))
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, "r") as f:
+            stored = json.load(f)
+        if stored.get("config") == bench_config(config):
+            baseline = stored["results"]
+            print(f"Baseline recorded {stored['recorded']}")
+        else:
+            print(f"Baseline was recorded with {stored.get('config')}; not comparing")
+    lines, regressions = compare(results, baseline, args.tolerance)
+    print("\n".join(lines))
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump({"recorded": datetime.now().isoformat(), "config": bench_config(config), "results": results},
+                      f, indent=2)
+        print(f"Baseline saved to {BASELINE_FILE}")
+    elif regressions:
+        print(f"Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
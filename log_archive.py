@@ -0,0 +1,277 @@
+"""
+log_archive.py
+Segmented on-disk log archive replacing the unbounded log.txt / _ws_server_log.txt / _orchestrator_log.txt
+Each stream is split into time-bucketed segments (.logs/<stream>/<start epoch>.log)
+Segments are compressed once sealed (zstd when installed, gzip otherwise) and each keeps a sparse
+timestamp -> offset index, so a time-range query only opens and seeks the segments it needs
+Old segments are dropped by age and by total size
+Every stream has a single writer process; any process can read
+"""
+
+import os
+import io
+import sys
+import json
+import gzip
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.path.join(SCRIPT_DIR, os.getenv("LOG_ARCHIVE_DIR", ".logs"))
+SEGMENT_SECONDS = int(os.getenv("LOG_SEGMENT_SECONDS", "3600"))
+INDEX_EVERY = 256  # records between sparse index entries
+RETENTION_HOURS = float(os.getenv("LOG_RETENTION_HOURS", "168"))
+ARCHIVE_MAX_MB = float(os.getenv("LOG_ARCHIVE_MAX_MB", "512"))  # per stream
+
+SEALED_EXT = ".log.zst" if zstandard else ".log.gz"
+
+# Open segment per stream written by this process: 'stream' : {"start", "file", "count"}
+WRITERS = dict()
+
+
+def _stream_dir(stream):
+    return os.path.join(ARCHIVE_DIR, stream)
+
+
+def _segments(stream):
+    """(start, path) of every segment of a stream, oldest first"""
+    directory = _stream_dir(stream)
+    if not os.path.isdir(directory):
+        return []
+    segments = []
+    for name in os.listdir(directory):
+        start, _, ext = name.partition(".")
+        if start.isdigit() and ext in ("log", "log.gz", "log.zst"):
+            segments.append((int(start), os.path.join(directory, name)))
+    return sorted(segments)
+
+
+def _open_sealed(path):
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+    return gzip.open(path, "rb")
+
+
+def _seal(path):
+    """Compress a finished segment; its index keeps pointing at uncompressed offsets"""
+    sealed_path = path[:-len(".log")] + SEALED_EXT
+    tmp_path = sealed_path + ".tmp"
+    with open(path, "rb") as src:
+        if zstandard:
+            with open(tmp_path, "wb") as dst:
+                zstandard.ZstdCompressor().copy_stream(src, dst)
+        else:
+            with gzip.open(tmp_path, "wb") as dst:
+                dst.writelines(src)
+    os.replace(tmp_path, sealed_path)
+    os.remove(path)
+
+
+def enforce_retention(stream):
+    """Drop sealed segments older than the retention period, then oldest first until under the size cap"""
+    sealed = [(start, path) for start, path in _segments(stream) if not path.endswith(".log")]
+    cutoff = time.time() - RETENTION_HOURS * 3600
+    total = sum(os.path.getsize(path) for _, path in sealed)
+    for start, path in sealed:
+        if start + SEGMENT_SECONDS >= cutoff and total <= ARCHIVE_MAX_MB * 1024 * 1024:
+            break
+        total -= os.path.getsize(path)
+        os.remove(path)
+        index_path = os.path.join(_stream_dir(stream), f"{start}.idx")
+        if os.path.exists(index_path):
+            os.remove(index_path)
+
+
+def _open_writer(stream, start):
+    os.makedirs(_stream_dir(stream), exist_ok=True)
+    # Seal segments left open by an earlier run or an earlier bucket
+    for other_start, path in _segments(stream):
+        if path.endswith(".log") and other_start != start:
+            _seal(path)
+    enforce_retention(stream)
+
+    path = os.path.join(_stream_dir(stream), f"{start}.log")
+    count = 0
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            count = sum(1 for _ in f)
+    return {"start": start, "file": open(path, "ab"), "count": count}
+
+
+def _write(stream, line, ts):
+    start = int(ts // SEGMENT_SECONDS * SEGMENT_SECONDS)
+    writer = WRITERS.get(stream)
+    if writer is None or writer["start"] != start:
+        if writer:
+            writer["file"].close()
+        writer = WRITERS[stream] = _open_writer(stream, start)
+
+    f = writer["file"]
+    if writer["count"] % INDEX_EVERY == 0:
+        with open(os.path.join(_stream_dir(stream), f"{start}.idx"), "a") as index:
+            index.write(f"{ts:.6f} {f.tell()} {writer['count']}\n")
+    f.write(f"{ts:.6f} {json.dumps(line)}\n".encode("utf-8"))
+    writer["count"] += 1
+    return f
+
+
+def append(stream, line, ts=None):
+    """Append one record (any text, newlines included) to a stream"""
+    _write(stream, line, ts or time.time()).flush()
+
+
+def append_many(stream, records):
+    """Append (ts, line) records, oldest first, with a single flush"""
+    f = None
+    for ts, line in records:
+        f = _write(stream, line, ts)
+    if f is not None:
+        f.flush()
+
+
+def _read_index(stream, start):
+    """Sparse index of a segment: list of (ts, offset, record number)"""
+    entries = []
+    try:
+        with open(os.path.join(_stream_dir(stream), f"{start}.idx"), "r") as f:
+            for line in f:
+                ts, offset, count = line.split()
+                entries.append((float(ts), int(offset), int(count)))
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _read_segment(stream, start, path, since=None, skip_records=0):
+    """Yield (ts, line) records of a segment, seeking via the sparse index when possible"""
+    index = _read_index(stream, start)
+    offset = 0
+    for entry_ts, entry_offset, entry_count in index:
+        if (since is not None and entry_ts <= since) or (skip_records and entry_count <= skip_records):
+            offset = entry_offset
+        else:
+            break
+
+    try:
+        f = open(path, "rb") if path.endswith(".log") else _open_sealed(path)
+    except FileNotFoundError:
+        if not path.endswith(".log"):
+            return
+        # Sealed by the writer while we were listing: read the compressed copy instead
+        f = _open_sealed(path[:-len(".log")] + SEALED_EXT)
+    with f:
+        if offset:
+            f.seek(offset)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break  # record still being written
+            ts, _, line = raw.decode("utf-8").partition(" ")
+            yield float(ts), json.loads(line)
+
+
+def cleared_at(stream):
+    """Records before this time are hidden by the admin panel's clear buttons"""
+    try:
+        with open(os.path.join(_stream_dir(stream), "CLEARED"), "r") as f:
+            return float(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return 0.0
+
+
+def clear(stream):
+    """Hide everything logged so far without deleting it (retention removes it later)"""
+    os.makedirs(_stream_dir(stream), exist_ok=True)
+    with open(os.path.join(_stream_dir(stream), "CLEARED"), "w") as f:
+        f.write(f"{time.time():.6f}")
+
+
+def query(stream, since=None, until=None):
+    """Yield (ts, line) records of a stream in [since, until], opening only overlapping segments"""
+    since = max(since or 0.0, cleared_at(stream))
+    for start, path in _segments(stream):
+        if start + SEGMENT_SECONDS < since or (until is not None and start > until):
+            continue
+        for ts, line in _read_segment(stream, start, path, since=since):
+            if ts < since:
+                continue
+            if until is not None and ts > until:
+                break
+            yield ts, line
+
+
+def tail(stream, lines=100):
+    """Last records of a stream, newest last; reads the newest segments only"""
+    since = cleared_at(stream)
+    collected = []
+    for start, path in reversed(_segments(stream)):
+        if start + SEGMENT_SECONDS < since:
+            break
+        index = _read_index(stream, start)
+        # Start at an index entry that still leaves at least `lines` records before the end
+        skip = max(0, index[-1][2] - lines) if index else 0
+        records = [(ts, line) for ts, line in _read_segment(stream, start, path, skip_records=skip) if ts >= since]
+        collected = records[-(lines - len(collected)):] + collected if records else collected
+        if len(collected) >= lines:
+            break
+    return collected[-lines:]
+
+
+def streams(prefix=""):
+    """Names of the archived streams starting with prefix"""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    return sorted(name for name in os.listdir(ARCHIVE_DIR)
+                  if name.startswith(prefix) and os.path.isdir(os.path.join(ARCHIVE_DIR, name)))
+
+
+def version(stream):
+    """
+    (last modified epoch, fingerprint) of a stream, or of a list of streams, from file metadata only;
+    the fingerprint changes whenever a record is appended or the stream is cleared
+    """
+    names = stream if isinstance(stream, list) else [stream]
+    modified, parts = 0.0, []
+    for name in names:
+        segments = _segments(name)
+        try:
+            stat = os.stat(segments[-1][1]) if segments else None
+        except FileNotFoundError:
+            stat = None  # sealed while listing; the next call sees the compressed segment
+        cleared = cleared_at(name)
+        modified = max(modified, cleared, stat.st_mtime if stat else 0.0)
+        parts.append(f"{name}:{cleared}:{segments[-1][0] if segments else 0}:"
+                     f"{stat.st_size if stat else 0}:{stat.st_mtime_ns if stat else 0}")
+    return modified, ";".join(parts)
+
+
+def read_records(stream, lines=None):
+    """(ts, line) records of a stream, or of a list of streams merged by timestamp; the last `lines` if given"""
+    names = stream if isinstance(stream, list) else [stream]
+    records = sorted(record for name in names for record in (tail(name, lines) if lines else query(name)))
+    return records[-lines:] if lines else records
+
+
+def as_text(records):
+    return "".join(line if line.endswith("\n") else line + "\n" for _, line in records)
+
+
+def read_text(stream, lines=None):
+    """
+    Records of a stream joined as plain text, like the old log files.
+    A list of streams is merged by timestamp.
+    """
+    return as_text(read_records(stream, lines))
+
+
+if __name__ == "__main__":
+    # python log_archive.py <stream> [since ISO] [until ISO]
+    from datetime import datetime
+    bounds = [datetime.fromisoformat(arg).timestamp() for arg in sys.argv[2:4]]
+    for ts, line in query(sys.argv[1], *bounds):
+        print(f"{datetime.fromtimestamp(ts).isoformat()} {line}", end="" if line.endswith("\n") else "\n")
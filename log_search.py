@@ -0,0 +1,228 @@
+"""
+log_search.py
+Inverted index over the log records seen by the orchestrator, built incrementally on ingest
+Supports term and "quoted phrase" queries, filtered by app, severity and time range,
+with newest-first paginated hits
+The index is capped by document count and by bytes (record text plus posting entries);
+the oldest documents are dropped first
+Document IDs grow with arrival time, so every posting list is sorted and a time range
+maps to a contiguous ID range found by binary search
+Run `python log_search.py --bench` to index a million lines and time some queries
+"""
+
+import os
+import re
+import sys
+import time
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+SEARCH_MAX_DOCS = int(os.getenv("SEARCH_MAX_DOCS", "2000000"))
+SEARCH_MAX_BYTES = int(os.getenv("SEARCH_MAX_BYTES", str(256 * 1024 * 1024)))
+POSTING_BYTES = 8  # one array("q") entry
+TOKEN_RE = re.compile(r"\w+(?:\.\w+)*")
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+# Documents: (received, app, severity, line, body); DOCS[i] has ID first_doc + i
+# body is the indexed message text (the same object as line when no separate line was given)
+DOCS = []
+DOC_TIMES = array("d")
+DOC_BYTES = array("q")  # accounted size of each document, see add()
+# 'term' : ascending document IDs. Apps and severities are indexed as 'app:<name>' and 'sev:<severity>'
+POSTINGS = dict()
+first_doc = 0
+doc_bytes = 0
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def _post(term, doc_id):
+    posting = POSTINGS.get(term)
+    if posting is None:
+        posting = POSTINGS[term] = array("q")
+    posting.append(doc_id)
+
+
+def _compact():
+    """Forget the oldest quarter of the documents once a cap is reached, more if still over the byte cap"""
+    global DOCS, DOC_TIMES, DOC_BYTES, first_doc, doc_bytes
+    drop = max(1, len(DOCS) // 4)
+    dropped = sum(DOC_BYTES[:drop])
+    while drop < len(DOCS) - 1 and doc_bytes - dropped > SEARCH_MAX_BYTES * 3 // 4:
+        dropped += DOC_BYTES[drop]
+        drop += 1
+    first_doc += drop
+    doc_bytes -= dropped
+    DOCS = DOCS[drop:]
+    DOC_TIMES = DOC_TIMES[drop:]
+    DOC_BYTES = DOC_BYTES[drop:]
+    for term in list(POSTINGS):
+        posting = POSTINGS[term]
+        cut = bisect_left(posting, first_doc)
+        if cut == len(posting):
+            del POSTINGS[term]
+        elif cut:
+            POSTINGS[term] = posting[cut:]
+
+
+def add(app, severity, text, line=None, received=None):
+    """Index one record; text is the message body, line the full record shown in hits"""
+    global doc_bytes
+    if len(DOCS) >= SEARCH_MAX_DOCS or doc_bytes > SEARCH_MAX_BYTES:
+        _compact()
+    received = received or time.time()
+    doc_id = first_doc + len(DOCS)
+    if line is None:
+        line = text
+    DOCS.append((received, app, severity, line, text))
+    DOC_TIMES.append(received)
+    terms = set(tokenize(text))
+    for term in terms:
+        _post(term, doc_id)
+    _post("app:" + app, doc_id)
+    _post("sev:" + severity, doc_id)
+    size = len(line) + (len(text) if text is not line else 0) + POSTING_BYTES * (len(terms) + 2)
+    DOC_BYTES.append(size)
+    doc_bytes += size
+
+
+def parse_query(q):
+    """Split a query into (terms, phrases); phrases are lists of terms"""
+    terms, phrases = [], []
+    for phrase, word in QUERY_RE.findall(q or ""):
+        if phrase:
+            tokens = tokenize(phrase)
+            terms.extend(tokens)
+            if len(tokens) > 1:
+                phrases.append(tokens)
+        else:
+            terms.extend(tokenize(word))
+    return terms, phrases
+
+
+def _contains_phrase(tokens, phrase):
+    n = len(phrase)
+    return any(tokens[i:i + n] == phrase for i in range(len(tokens) - n + 1))
+
+
+def _to_epoch(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return datetime.fromisoformat(value).timestamp()
+
+
+def search(q="", app=None, severity=None, since=None, until=None, offset=0, limit=50):
+    """
+    Newest-first hits for a query. Every term must match; phrases must appear in order.
+    Returns {"hits": [...], "offset", "limit", "has_more", "took_ms"}.
+    """
+    started = time.perf_counter()
+    terms, phrases = parse_query(q)
+    keys = list(dict.fromkeys(terms))
+    if app:
+        keys.append("app:" + app)
+    if severity:
+        keys.append("sev:" + severity)
+
+    # Time range -> document ID range [low, high)
+    low = first_doc + (bisect_left(DOC_TIMES, _to_epoch(since)) if since is not None else 0)
+    high = first_doc + (bisect_right(DOC_TIMES, _to_epoch(until)) if until is not None else len(DOCS))
+
+    hits = []
+    wanted = offset + limit + 1  # one extra hit tells whether there is another page
+    postings = [POSTINGS.get(key) for key in keys]
+    if all(posting is not None for posting in postings) and low < high:
+        candidates = _matches(postings, low, high) if postings else range(high - 1, low - 1, -1)
+        for doc_id in candidates:
+            record = DOCS[doc_id - first_doc]
+            if phrases:
+                # Verify against the body, the same text the postings were built from
+                tokens = tokenize(record[4])
+                if not all(_contains_phrase(tokens, phrase) for phrase in phrases):
+                    continue
+            hits.append((doc_id, record))
+            if len(hits) >= wanted:
+                break
+
+    page = hits[offset:offset + limit]
+    return {
+        "hits": [
+            {
+                "id": doc_id,
+                "received": datetime.fromtimestamp(received).isoformat(),
+                "app": record_app,
+                "severity": sev,
+                "line": line,
+            }
+            for doc_id, (received, record_app, sev, line, _) in page
+        ],
+        "offset": offset,
+        "limit": limit,
+        "has_more": len(hits) > offset + limit,
+        "took_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def _matches(postings, low, high):
+    """
+    IDs in [low, high) present in every posting, newest first.
+    Walks back in doubling windows and intersects the posting slices of each window as sets,
+    so dense matches return after the first window and sparse ones still run at C speed.
+    """
+    window = 4096
+    while high > low:
+        start = max(low, high - window)
+        slices = sorted((p[bisect_left(p, start):bisect_left(p, high)] for p in postings), key=len)
+        common = set(slices[0])
+        for ids in slices[1:]:
+            if not common:
+                break
+            common.intersection_update(ids)
+        yield from sorted(common, reverse=True)
+        high = start
+        window *= 2
+
+
+def reset():
+    global DOCS, DOC_TIMES, DOC_BYTES, first_doc, doc_bytes
+    DOCS, DOC_TIMES, DOC_BYTES, first_doc, doc_bytes = [], array("d"), array("q"), 0, 0
+    POSTINGS.clear()
+
+
+def stats():
+    return {"documents": len(DOCS), "terms": len(POSTINGS), "first_doc": first_doc, "bytes": doc_bytes}
+
+
+def benchmark(lines=1000000):
+    """Index `lines` synthetic records and time a few representative queries"""
+    words = ["connection", "timeout", "division", "zero", "user", "entered", "heartbeat", "numpy",
+             "version", "detected", "restarted", "request", "failed", "database", "cache", "miss"]
+    severities = ["INFO"] * 8 + ["WARN", "ERROR"]
+    started = time.perf_counter()
+    now = time.time() - lines / 1000
+    for i in range(lines):
+        text = f"{words[i % 16]} {words[(i * 7) % 16]} {words[(i * 13) % 16]} id{i % 5000}"
+        add(f"{i % 3 + 1}.py", severities[i % 10], text, received=now + i / 1000)
+    elapsed = time.perf_counter() - started
+    print(f"indexed {lines} lines in {elapsed:.1f}s ({lines / elapsed:,.0f} lines/s), {len(POSTINGS)} terms")
+
+    for label, kwargs in [
+        ("common term", {"q": "timeout"}),
+        ("two terms + app", {"q": "division zero", "app": "2.py"}),
+        ("phrase", {"q": '"user failed"'}),
+        ("rare term + severity", {"q": "id4321", "severity": "ERROR"}),
+        ("page 20 of a term", {"q": "cache", "offset": 1000, "limit": 50}),
+        ("time range", {"q": "heartbeat", "since": now + 100, "until": now + 200}),
+        ("no match", {"q": "database id7"}),
+    ]:
+        result = search(**kwargs)
+        print(f"{label:<22} {len(result['hits']):>3} hits  {result['took_ms']:>8.2f} ms")
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        benchmark()
@@ -0,0 +1,187 @@
+"""
+log_store.py
+Bounded in-memory store of structured log records kept by the orchestrator
+Each app has its own ring buffer capped by record count and bytes, so a noisy app
+cannot evict another app's lines
+Records are indexed by severity and by arrival time, so "last 200 lines of 2.py"
+or "ERRORs of the last 5 minutes" never scan unrelated records
+Run `python log_store.py --bench` to measure ingest throughput
+"""
+
+import os
+import sys
+import time
+import heapq
+
+from collections import deque
+from datetime import datetime
+
+LOG_STORE_MAX_RECORDS = int(os.getenv("LOG_STORE_MAX_RECORDS", "10000"))  # per app
+LOG_STORE_MAX_BYTES = int(os.getenv("LOG_STORE_MAX_BYTES", str(4 * 1024 * 1024)))  # per app
+
+# 'app' : ring buffer (see new_store)
+STORES = dict()
+
+
+def new_store(capacity=LOG_STORE_MAX_RECORDS):
+    """
+    Ring buffer of (seq, received, severity, ts, line) records.
+    Sequence numbers are contiguous, so a seq maps straight to its slot in the ring.
+    """
+    return {
+        "ring": [None] * capacity,
+        "start": 0,          # slot of the oldest record
+        "count": 0,
+        "first_seq": 1,      # seq of the oldest record
+        "bytes": 0,
+        "by_severity": {},   # 'severity' : deque of seqs, oldest first
+    }
+
+
+def _record(store, seq):
+    return store["ring"][(store["start"] + seq - store["first_seq"]) % len(store["ring"])]
+
+
+def _evict_oldest(store):
+    ring = store["ring"]
+    record = ring[store["start"]]
+    ring[store["start"]] = None
+    store["start"] = (store["start"] + 1) % len(ring)
+    store["count"] -= 1
+    store["first_seq"] += 1
+    store["bytes"] -= len(record[4])
+    store["by_severity"][record[2]].popleft()
+
+
+def ingest(app, severity, ts, line, received=None):
+    """Append one log line for app, evicting its oldest records past the caps"""
+    store = STORES.get(app)
+    if store is None:
+        store = STORES[app] = new_store()
+    ring = store["ring"]
+    if store["count"] == len(ring):
+        _evict_oldest(store)
+
+    seq = store["first_seq"] + store["count"]
+    record = (seq, received or time.time(), severity, ts, line)
+    ring[(store["start"] + store["count"]) % len(ring)] = record
+    store["count"] += 1
+    store["bytes"] += len(line)
+
+    index = store["by_severity"].get(severity)
+    if index is None:
+        index = store["by_severity"][severity] = deque()
+    index.append(seq)
+
+    while store["bytes"] > LOG_STORE_MAX_BYTES and store["count"] > 1:
+        _evict_oldest(store)
+
+
+def _newest_before(store, until):
+    """Seq of the newest record received at or before until (binary search over the ring)"""
+    low, high = store["first_seq"], store["first_seq"] + store["count"]
+    while low < high:
+        middle = (low + high) // 2
+        if _record(store, middle)[1] <= until:
+            low = middle + 1
+        else:
+            high = middle
+    return low - 1
+
+
+def _scan_app(store, severity, since, until):
+    """Yield records of one app newest first, restricted to severity and [since, until]"""
+    if severity:
+        index = store["by_severity"].get(severity, ())
+        seqs = reversed(index)
+    else:
+        newest = store["first_seq"] + store["count"] - 1
+        if until is not None:
+            newest = _newest_before(store, until)
+        seqs = range(newest, store["first_seq"] - 1, -1)
+
+    for seq in seqs:
+        record = _record(store, seq)
+        if until is not None and record[1] > until:
+            continue
+        if since is not None and record[1] < since:
+            break
+        yield record
+
+
+def _to_epoch(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return datetime.fromisoformat(value).timestamp()
+
+
+def query(app=None, severity=None, since=None, until=None, limit=200):
+    """
+    Newest records matching the filters, returned oldest first.
+    since / until are ISO timestamps or epoch seconds of when the orchestrator received the line.
+    """
+    since, until = _to_epoch(since), _to_epoch(until)
+    apps = [app] if app else list(STORES)
+    scans = [
+        ((-record[1], -record[0], name, record) for record in _scan_app(STORES[name], severity, since, until))
+        for name in apps if name in STORES
+    ]
+    results = []
+    for _, _, name, record in heapq.merge(*scans):
+        if len(results) >= limit:
+            break
+        seq, received, sev, ts, line = record
+        results.append({
+            "app": name,
+            "seq": seq,
+            "received": datetime.fromtimestamp(received).isoformat(),
+            "ts": ts,
+            "severity": sev,
+            "line": line,
+        })
+    results.reverse()
+    return results
+
+
+def stats():
+    """Per-app record count, bytes held and severity breakdown"""
+    return {
+        name: {
+            "records": store["count"],
+            "bytes": store["bytes"],
+            "severities": {sev: len(seqs) for sev, seqs in store["by_severity"].items()},
+        }
+        for name, store in STORES.items()
+    }
+
+
+def benchmark(lines=200000, apps=3):
+    """Measure single-threaded ingest and query speed; prints lines/s"""
+    STORES.clear()
+    severities = ["INFO"] * 8 + ["WARN", "ERROR"]
+    payload = [
+        (f"{i % apps + 1}.py", severities[i % len(severities)],
+         f"[{i % apps + 1}.py] [{severities[i % len(severities)]}] [2025-01-01T00:00:00] message number {i}")
+        for i in range(lines)
+    ]
+    started = time.perf_counter()
+    for app, sev, line in payload:
+        ingest(app, sev, "2025-01-01T00:00:00", line)
+    elapsed = time.perf_counter() - started
+    rate = lines / elapsed
+    print(f"ingest: {lines} lines in {elapsed:.3f}s = {rate:,.0f} lines/s "
+          f"({'OK' if rate >= 10000 else 'BELOW'} 10k lines/s target)")
+
+    for label, kwargs in [("last 200 of 2.py", {"app": "2.py"}),
+                          ("last 200 ERROR, all apps", {"severity": "ERROR"}),
+                          ("last minute, all apps", {"since": time.time() - 60})]:
+        started = time.perf_counter()
+        result = query(**kwargs)
+        print(f"query {label}: {len(result)} records in {(time.perf_counter() - started) * 1000:.2f} ms")
+    STORES.clear()
+    return rate
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        benchmark()
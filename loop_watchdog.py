@@ -0,0 +1,133 @@
+"""
+loop_watchdog.py
+Event-loop lag and blocking-call detector
+watch() runs as a task on an event loop: it wakes every LOOP_LAG_INTERVAL seconds and records
+how late it woke up (the loop's lag). A checker thread looks at every watched loop; when one has
+not woken up LOOP_BLOCK_THRESHOLD seconds past its timer, whatever is running on the loop's
+thread is blocking it, and that thread's stack is captured
+Blocking episodes are grouped by offender (the innermost frame in this project), counted and
+printed with their stack; lag and blocks are exported as metrics and through summary()
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+
+from collections import deque
+
+import metrics
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.05"))
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))
+LAG_SAMPLES = 2000  # recent lag samples kept per loop
+STACK_DEPTH = 12  # innermost frames kept of a blocking stack
+
+LOOP_LAG = metrics.histogram("event_loop_lag_seconds", "How late the event loop ran a timer", ("loop",),
+                             buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5))
+LOOP_BLOCKED = metrics.counter("event_loop_blocked_total", "Callbacks that blocked the event loop past the threshold",
+                               ("loop", "site"))
+LOOP_BLOCKED_SECONDS = metrics.counter("event_loop_blocked_seconds_total", "Time the event loop spent blocked",
+                                       ("loop", "site"))
+
+# 'loop name' : {"thread": ident, "last_tick": monotonic, "lags": deque, "blocked": None or {"site", "stack"}}
+LOOPS = dict()
+# ('loop name', 'site') : {"count", "total_seconds", "max_seconds", "stack"}
+OFFENDERS = dict()
+checker = None
+lock = threading.Lock()
+
+
+def _site(stack):
+    """
+    Innermost frame of this project's code (library frames only say where it ended up blocking);
+    the leaf frame when only the script's top level (asyncio.run) is on the stack
+    """
+    for frame in reversed(stack):
+        if frame.filename.startswith(SCRIPT_DIR) and frame.filename != __file__ and frame.name != "<module>":
+            return f"{os.path.basename(frame.filename)}:{frame.name}:{frame.lineno}"
+    leaf = stack[-1]
+    return f"{os.path.basename(leaf.filename)}:{leaf.name}:{leaf.lineno}"
+
+
+def _check():
+    while True:
+        time.sleep(LOOP_BLOCK_THRESHOLD / 2)
+        now = time.monotonic()
+        frames = None
+        for state in list(LOOPS.values()):
+            if state["blocked"] is not None or now - state["last_tick"] - LOOP_LAG_INTERVAL < LOOP_BLOCK_THRESHOLD:
+                continue
+            frames = frames or sys._current_frames()
+            frame = frames.get(state["thread"])
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            with lock:
+                state["blocked"] = {"site": _site(stack), "stack": "".join(traceback.format_list(stack[-STACK_DEPTH:]))}
+
+
+def _start_checker():
+    global checker
+    with lock:
+        if checker is None:
+            checker = threading.Thread(target=_check, name="loop-watchdog", daemon=True)
+            checker.start()
+
+
+def _record(name, blocked, seconds):
+    offender = OFFENDERS.setdefault((name, blocked["site"]), {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+    offender["count"] += 1
+    offender["total_seconds"] += seconds
+    offender["max_seconds"] = max(offender["max_seconds"], seconds)
+    offender["stack"] = blocked["stack"]
+    metrics.inc(LOOP_BLOCKED, (name, blocked["site"]))
+    metrics.inc(LOOP_BLOCKED_SECONDS, (name, blocked["site"]), seconds)
+    print(f"Event loop '{name}' blocked for {seconds * 1000:.0f} ms in {blocked['site']} "
+          f"({offender['count']} time(s) so far):\n{blocked['stack']}", end="")
+
+
+async def watch(name="main"):
+    """Measure the lag of the running loop until cancelled; blocking episodes are reported when the loop resumes"""
+    state = LOOPS[name] = {"thread": threading.get_ident(), "last_tick": time.monotonic(),
+                           "lags": deque(maxlen=LAG_SAMPLES), "blocked": None}
+    _start_checker()
+    try:
+        while True:
+            expected = time.monotonic() + LOOP_LAG_INTERVAL
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            state["last_tick"] = now
+            state["lags"].append(lag)
+            if metrics.ENABLED:
+                metrics.observe(LOOP_LAG, lag, (name,))
+            with lock:
+                blocked, state["blocked"] = state["blocked"], None
+            # The checker may have caught the loop just as it resumed
+            if blocked is not None and lag >= LOOP_BLOCK_THRESHOLD:
+                _record(name, blocked, lag)
+    finally:
+        LOOPS.pop(name, None)
+
+
+def summary(request=None):
+    """Lag percentiles per loop and the blocking offenders, worst first"""
+    loops = dict()
+    for name, state in list(LOOPS.items()):
+        lags = sorted(state["lags"])
+        if not lags:
+            continue
+        loops[name] = {"samples": len(lags), "max_ms": round(lags[-1] * 1000, 2)}
+        for p in (50, 99):
+            loops[name][f"p{p}_ms"] = round(lags[min(len(lags) - 1, int(round(p / 100 * (len(lags) - 1))))] * 1000, 2)
+    offenders = [{"loop": name, "site": site, "count": offender["count"],
+                  "total_ms": round(offender["total_seconds"] * 1000, 1),
+                  "max_ms": round(offender["max_seconds"] * 1000, 1), "stack": offender["stack"]}
+                 for (name, site), offender in list(OFFENDERS.items())]
+    offenders.sort(key=lambda offender: offender["total_ms"], reverse=True)
+    return {"threshold_ms": LOOP_BLOCK_THRESHOLD * 1000, "loops": loops, "offenders": offenders}
@@ -3,26 +3,93 @@ main.py
 Entry point to PoC
 Creates and starts web server to serve APIs
 Start Orchestrator and Health Monitor after initializing respective web sockets
+Services are started and supervised in-process by supervisor.py
 """
 
 # main.py - Admin Panel with Script Execution
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, PlainTextResponse
+from fastapi.responses import JSONResponse as BaseJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-import subprocess
-import sys
+from contextlib import asynccontextmanager
+from typing import Optional
 import os
+import asyncio
+import time
+import websockets
+from datetime import datetime
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# WebSocket Health Monitor Configuration
-HS_HM_HOST = os.getenv("HS_HM_HOST", "localhost")
-HS_HM_PORT = os.getenv("HS_HM_PORT", "9001")
-
-app = FastAPI(title="Admin Panel", description="Admin control panel for system management")
+import supervisor
+import jobs
+import log_archive
+import metrics
+import tracing
+import profiler
+import perf_backend
+import http_cache
+import health_monitor
+
+class JSONResponse(BaseJSONResponse):
+    """JSONResponse encoded with the fastest available codec (perf_backend.py)"""
+    def render(self, content):
+        return perf_backend.dumps_bytes(content)
+
+
+# Records returned by the plain-text log endpoints
+LOG_TAIL_RECORDS = 1000
+
+# /api/scripts re-reads the scripts' size and mtime at most this often (seconds)
+SCRIPT_STAT_SECONDS = 2.0
+scripts_checked = 0.0
+scripts_info_cache = None
+
+# ERROR/FATAL log streams: "log", or one per worker when the orchestrator runs sharded
+def error_log_streams():
+    return ['log'] + log_archive.streams('log-shard-')
+
+# Orchestrator query websocket (log queries, stats)
+QS_URI = "ws://" + os.getenv("QS_HOST", "127.0.0.1") + ":" + os.getenv("QS_PORT", "3806")
+
+# Admin panel metrics (the orchestrator's and AiAgent's are merged in at /metrics)
+HTTP_REQUESTS = metrics.counter("admin_http_requests_total", "Admin panel requests", ("method", "route", "status"))
+HTTP_SECONDS = metrics.histogram("admin_http_request_seconds", "Admin panel request latency", ("route",))
+SERVICES_RUNNING = metrics.gauge("admin_services_running", "Supervised services currently running")
+
+# Newest archive records already counted in tracing's dashboard stages (older ones predate this process)
+logs_served_until = time.time()
+health_served_until = time.time()
+# Health view last served by /api/health-status and when it last changed (its Last-Modified)
+health_view = {'content': None, 'changed': None}
+
+# Services started together with the admin panel (set when run as __main__)
+AUTOSTART = []
+# Run the health monitor (health_monitor.py) in this event loop (set when run as __main__)
+HEALTH_MONITOR = False
+# Services that talk to the orchestrator; their jobs start them only once it accepts connections
+ORCHESTRATOR_CLIENTS = ('1.py', '2.py', '3.py', 'health_websocket_simulator.py')
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Listening before the orchestrator starts, so its first health report is not lost
+    if HEALTH_MONITOR:
+        await health_monitor.start()
+    for name in AUTOSTART:
+        status = await supervisor.start(name)
+        print(f"Started {name} (pid {status['pid']})")
+    yield
+    await supervisor.stop_all()
+    if HEALTH_MONITOR:
+        await health_monitor.stop()
+
+
+app = FastAPI(title="Admin Panel", description="Admin control panel for system management", lifespan=lifespan,
+              default_response_class=JSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -33,6 +100,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_metrics(request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Route templates (not raw paths) keep the label set bounded
+    route = getattr(request.scope.get("route"), "path", "other")
+    metrics.inc(HTTP_REQUESTS, (request.method, route, str(response.status_code)))
+    metrics.observe(HTTP_SECONDS, time.perf_counter() - started, (route,))
+    return response
+
+
 # Mount static files directory
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -56,12 +134,13 @@ async def get_health():
 @app.get("/run/{script_name}")
 async def run_script(script_name: str):
     """
-    Execute a Python script in a new PowerShell terminal
+    Start a script under the supervisor (no shell, output captured) as a job
+    Returns at once with the job ID; follow the job at /api/jobs/<id> and its output at /ws/jobs/<id>
     Allowed scripts: 1.py, 2.py, 3.py, upgrade_checker.py, orchestrator.py, health_websocket_simulator.py
-    Special case: 1.py runs Code1.bat instead
+    Special case: 1.py is restarted automatically whenever it exits (replaces Code1.bat)
     """
-        # Validate script name to prevent security issues
-    # Allow specific .py and .bat files only to avoid command injection
+    # Validate script name to prevent security issues
+    # Only services known to the supervisor can be started
     allowed_scripts = [
         '1.py', '2.py', '3.py', 'upgrade_checker.py', 'orchestrator.py', 'health_websocket_simulator.py',
         'UpdateChecker.bat'
@@ -74,41 +153,26 @@ async def run_script(script_name: str):
         )
     
     try:
-        # Special handling: run batch files directly (including Code1.bat for 1.py)
-        if script_name == '1.py':
-            script_path = os.path.abspath('Code1.bat')
-            command_to_run = f'"{script_path}"'
-        elif script_name.lower().endswith('.bat'):
-            # Run the provided .bat file directly
-            script_path = os.path.abspath(script_name)
-            command_to_run = f'"{script_path}"'
-        else:
-            # Default: run Python scripts
-            script_path = os.path.abspath(script_name)
-            command_to_run = f'python "{script_path}"'
-        
-        # Check if the file exists
-        if not os.path.exists(script_path):
-            raise HTTPException(
-                status_code=404,
-                detail=f"File {script_name} not found"
-            )
+        # Check that every script of the service exists
+        for script in supervisor.SERVICES[script_name]["scripts"]:
+            if not os.path.exists(os.path.join(supervisor.SCRIPT_DIR, script)):
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"File {script} not found"
+                )
         
-        # Open a new PowerShell terminal and run the command
-        # The -NoExit flag keeps the terminal open after execution
-        command = f'start pwsh -NoExit -Command "{command_to_run}"'
-        
-        subprocess.Popen(
-            command,
-            shell=True,
-            creationflags=subprocess.CREATE_NEW_CONSOLE if sys.platform == 'win32' else 0
-        )
+        # Right after the admin panel starts the orchestrator may still be coming up; the job waits for it
+        wait_for = ('orchestrator.py', 'shard_router.py') if script_name in ORCHESTRATOR_CLIENTS else ()
+        job = jobs.submit(script_name, wait_for)
         
         return JSONResponse(
             content={
                 'success': True,
-                'message': f'Opened new terminal to run {script_name}',
-                'script': script_name
+                'message': f'Started {script_name} (job {job["id"]})',
+                'script': script_name,
+                'job': job['id'],
+                'status_url': f'/api/jobs/{job["id"]}',
+                'stream_url': f'/ws/jobs/{job["id"]}'
             }
         )
     
@@ -118,19 +182,119 @@ async def run_script(script_name: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/jobs")
+async def get_jobs():
+    """
+    Jobs started with /run, newest first
+    """
+    return JSONResponse(content={'jobs': jobs.list_jobs()})
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, lines: int = 0):
+    """
+    Status, pid and exit code of a job, with its last `lines` output lines
+    """
+    job = jobs.get(job_id, lines)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return JSONResponse(content=job)
+
+
+@app.websocket("/ws/jobs/{job_id}")
+async def stream_job(websocket: WebSocket, job_id: str):
+    """
+    Output of a job as {"stream", "line"} messages (everything captured so far, then live),
+    followed by its final status as {"job": ...} once it ends
+    Text sent by the client is written to the job's stdin (interactive services such as 2.py)
+    """
+    await websocket.accept()
+    job = jobs.get(job_id)
+    if job is None:
+        await websocket.close(code=4404, reason=f"Unknown job {job_id}")
+        return
+    
+    async def forward_input():
+        while True:
+            text = await websocket.receive_text()
+            try:
+                await supervisor.send_input(job['script'], text)
+            except ValueError as e:
+                await websocket.send_text(perf_backend.dumps({'stream': 'job', 'line': f'input rejected: {e}'}))
+    
+    backlog, queue = jobs.subscribe(job_id)
+    reader = asyncio.create_task(forward_input())
+    try:
+        for stream, line in backlog:
+            await websocket.send_text(perf_backend.dumps({'stream': stream, 'line': line}))
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            await websocket.send_text(perf_backend.dumps({'stream': item[0], 'line': item[1]}))
+        await websocket.send_text(perf_backend.dumps({'job': jobs.get(job_id)}))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        jobs.unsubscribe(job_id, queue)
+
+
+@app.get("/api/services")
+async def get_services():
+    """
+    Status of every supervised service (pid, restarts, last exit code)
+    """
+    return JSONResponse(content={'services': supervisor.status()})
+
+
+@app.get("/api/services/{name}/output")
+async def get_service_output(name: str, lines: int = 200):
+    """
+    Last captured stdout/stderr lines of a supervised service
+    """
+    if name not in supervisor.SERVICES:
+        raise HTTPException(status_code=404, detail=f"Unknown service {name}")
+    output = [{'stream': stream, 'line': line} for stream, line in supervisor.recent_output(name, lines)]
+    return JSONResponse(content={'name': name, 'output': output})
+
+
+@app.post("/api/services/{name}/input")
+async def service_input(name: str, text: str):
+    """
+    Send a line to the stdin of a running interactive service (2.py asks for input)
+    """
+    if name not in supervisor.SERVICES:
+        raise HTTPException(status_code=404, detail=f"Unknown service {name}")
+    try:
+        await supervisor.send_input(name, text)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return JSONResponse(content={'success': True, 'name': name})
+
+
+@app.post("/api/services/{name}/{action}")
+async def control_service(name: str, action: str):
+    """
+    Start, stop or restart a supervised service
+    """
+    if name not in supervisor.SERVICES:
+        raise HTTPException(status_code=404, detail=f"Unknown service {name}")
+    actions = {'start': supervisor.start, 'stop': supervisor.stop, 'restart': supervisor.restart}
+    if action not in actions:
+        raise HTTPException(status_code=400, detail=f"Invalid action. Allowed actions: {', '.join(actions)}")
+    return JSONResponse(content={'success': True, 'service': await actions[action](name)})
+
+
 @app.post("/clear-logs")
 async def clear_logs():
     """
-    Clear the log.txt file
+    Clear the ERROR/FATAL log (archived records are hidden, retention removes them later)
     """
     try:
-        # Ensure log file is in the same directory as this script
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        log_path = os.path.join(script_dir, 'log.txt')
-
-        # Truncate the file (create if not exists)
-        with open(log_path, 'w', encoding='utf-8') as f:
-            f.truncate(0)
+        for stream in error_log_streams():
+            log_archive.clear(stream)
 
         return JSONResponse(
             content={
@@ -146,71 +310,270 @@ async def clear_logs():
 
 
 @app.get("/api/scripts")
-async def get_scripts():
+async def get_scripts(request: Request):
     """
     Get list of available scripts with their status
     """
+    scripts_info = script_stats()
+    last_modified = max((info.get('modified', 0) for info in scripts_info), default=0)
+    return http_cache.respond(request, 'scripts', tuple((info['name'], info.get('size'), info.get('modified'))
+                                                        for info in scripts_info),
+                              lambda: {'scripts': scripts_info}, last_modified)
+
+
+def script_stats():
+    """Existence, size and mtime of the allowed scripts; the files are stat-ed at most every SCRIPT_STAT_SECONDS"""
+    global scripts_checked, scripts_info_cache
+    if scripts_info_cache is not None and time.monotonic() - scripts_checked < SCRIPT_STAT_SECONDS:
+        return scripts_info_cache
     allowed_scripts = ['1.py', '2.py', '3.py', 'upgrade_checker.py', 'orchestrator.py', 'health_websocket_simulator.py']
     scripts_info = []
     
     for script in allowed_scripts:
         script_path = os.path.abspath(script)
-        exists = os.path.exists(script_path)
+        try:
+            stat = os.stat(script_path)
+        except FileNotFoundError:
+            stat = None
         
         info = {
             'name': script,
-            'exists': exists,
-            'path': script_path if exists else None
+            'exists': stat is not None,
+            'path': script_path if stat else None
         }
         
-        if exists:
+        if stat:
             # Get file size
-            info['size'] = os.path.getsize(script_path)
+            info['size'] = stat.st_size
             # Get last modified time
-            info['modified'] = os.path.getmtime(script_path)
+            info['modified'] = stat.st_mtime
         
         scripts_info.append(info)
     
-    return JSONResponse(content={'scripts': scripts_info})
+    scripts_checked, scripts_info_cache = time.monotonic(), scripts_info
+    return scripts_info
 
 
 @app.get("/api/logs")
-async def get_logs():
+async def get_logs(request: Request):
     """
-    Retrieve the contents of log.txt
+    Retrieve the most recent ERROR/FATAL records from the log archive
+    Answered from the response cache until an ERROR/FATAL stream changes
     """
-    try:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        log_path = os.path.join(script_dir, 'log.txt')
-        
-        if not os.path.exists(log_path):
-            return JSONResponse(content={'logs': '', 'message': 'Log file does not exist'})
+    def build():
+        records = log_archive.read_records(streams, lines=LOG_TAIL_RECORDS)
+        trace_logs_served(records)
+        logs = log_archive.as_text(records)
         
-        with open(log_path, 'r', encoding='utf-8') as f:
-            logs = f.read()
+        if not logs:
+            return {'logs': '', 'message': 'No logs available'}
         
-        return JSONResponse(content={'logs': logs, 'size': len(logs)})
+        return {'logs': logs, 'size': len(logs)}
+    
+    try:
+        streams = error_log_streams()
+        last_modified, version = log_archive.version(streams)
+        return http_cache.respond(request, 'logs', version, build, last_modified)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def trace_logs_served(records):
+    """Time from archiving to the first time a traced ERROR/FATAL record reaches the dashboard"""
+    global logs_served_until
+    now = time.time()
+    for ts, line in records:
+        if ts <= logs_served_until:
+            continue
+        match = tracing.TRACE_FIELD.search(line)
+        if match:
+            tracing.observe("dashboard", now - ts)
+            tracing.hop(match.group(1), "served", now)
+    if records:
+        logs_served_until = max(logs_served_until, records[-1][0])
+
+
+def trace_health_served(received, report):
+    """Health monitor and dashboard hops of a health report, counted the first time it is served"""
+    global health_served_until
+    if received <= health_served_until or 'timestamp' not in report:
+        return
+    health_served_until = received
+    tracing.observe("monitor", received - datetime.fromisoformat(report['timestamp']).timestamp())
+    tracing.observe("dashboard_health", time.time() - received)
+
+
+async def orchestrator_request(payload):
+    """Send one request to the orchestrator's query websocket and return its result"""
+    try:
+        async with websockets.connect(QS_URI, open_timeout=2) as ws:
+            await ws.send(perf_backend.dumps(payload))
+            response = perf_backend.loads(await ws.recv())
+    except (OSError, websockets.exceptions.WebSocketException) as e:
+        raise HTTPException(status_code=503, detail=f"Orchestrator not reachable: {e}")
+    if not response.get("ok"):
+        raise HTTPException(status_code=400, detail=response.get("error"))
+    return response["result"]
+
+
+@app.get("/api/logs/query")
+async def query_logs(app: Optional[str] = None, severity: Optional[str] = None,
+                     since: Optional[str] = None, until: Optional[str] = None, limit: int = 200):
+    """
+    Query the orchestrator's in-memory log store by app, severity and time range
+    since / until are ISO timestamps; records are returned oldest first
+    """
+    records = await orchestrator_request({
+        'op': 'logs', 'app': app, 'severity': severity, 'since': since, 'until': until, 'limit': limit
+    })
+    return JSONResponse(content={'records': records, 'count': len(records)})
+
+
+@app.get("/api/logs/search")
+async def search_logs(q: str = "", app: Optional[str] = None, severity: Optional[str] = None,
+                      since: Optional[str] = None, until: Optional[str] = None,
+                      offset: int = 0, limit: int = 50):
+    """
+    Full-text search over every log line seen by the orchestrator, newest first
+    q holds terms and "quoted phrases"; all of them must match
+    Page through results with offset / limit while has_more is true
+    """
+    if limit < 1 or limit > 500 or offset < 0:
+        raise HTTPException(status_code=400, detail="limit must be 1-500 and offset >= 0")
+    return JSONResponse(content=await orchestrator_request({
+        'op': 'search', 'q': q, 'app': app, 'severity': severity,
+        'since': since, 'until': until, 'offset': offset, 'limit': limit
+    }))
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus metrics of the admin panel, the orchestrator and the last AI agent runs
+    """
+    metrics.set_gauge(SERVICES_RUNNING, sum(1 for s in supervisor.status().values() if s['status'] == 'running'))
+    texts = [metrics.render(), metrics.read_textfiles()]
+    try:
+        texts.append(await orchestrator_request({'op': 'metrics'}))
+    except HTTPException:
+        pass  # orchestrator down: still serve the rest
+    return PlainTextResponse(metrics.merge_texts(texts), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/traces")
+async def get_traces(limit: int = 50):
+    """
+    Latency percentiles of every hop from a service's log() call to the dashboard,
+    and the hops of the latest traced log lines (see tracing.py)
+    """
+    exports = [tracing.export()]
+    try:
+        exports.append(await orchestrator_request({'op': 'traces'}))
+    except HTTPException:
+        pass  # orchestrator down: dashboard stages only
+    merged = tracing.merge(exports)
+    traces = merged['traces'][-limit:] if limit > 0 else []
+    for trace in traces:
+        if 'sent' in trace and 'served' in trace:
+            trace['end_to_end_ms'] = round((trace['served'] - trace['sent']) * 1000, 2)
+    return JSONResponse(content={'stages': tracing.summary(merged['samples']), 'traces': traces})
+
+
+async def profile_request(target, request):
+    """Run a profiler action in the admin panel itself or in the orchestrator"""
+    if target == 'admin':
+        try:
+            return profiler.control(request)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if target == 'orchestrator':
+        return await orchestrator_request(dict(request, op='profile'))
+    raise HTTPException(status_code=404, detail="Unknown profile target. Allowed targets: admin, orchestrator")
+
+
+@app.get("/api/profile/{target}")
+async def profile_status(target: str):
+    """
+    State of the sampling profiler of the admin panel or the orchestrator
+    """
+    return JSONResponse(content=await profile_request(target, {'action': 'status'}))
+
+
+@app.post("/api/profile/{target}/start")
+async def profile_start(target: str, interval: float = profiler.PROFILE_INTERVAL,
+                        duration: float = profiler.PROFILE_MAX_SECONDS, idle: bool = False):
+    """
+    Start sampling stacks every `interval` seconds; stops by itself after `duration` (capped at PROFILE_MAX_SECONDS)
+    """
+    return JSONResponse(content=await profile_request(target, {
+        'action': 'start', 'interval': interval, 'duration': duration, 'idle': idle
+    }))
+
+
+@app.post("/api/profile/{target}/stop")
+async def profile_stop(target: str):
+    return JSONResponse(content=await profile_request(target, {'action': 'stop'}))
+
+
+@app.get("/api/profile/{target}/collapsed")
+async def profile_collapsed(target: str):
+    """
+    Collapsed stacks of the current or last run (flamegraph.pl / speedscope input)
+    """
+    result = await profile_request(target, {'action': 'collapsed'})
+    if isinstance(result, dict):
+        # Sharded orchestrator: one profile per worker, told apart by a root frame
+        result = "".join(f"{shard};{line}\n" for shard, text in result.items() for line in text.splitlines())
+    return PlainTextResponse(result)
+
+
+@app.get("/api/profile/{target}/top")
+async def profile_top(target: str, limit: int = 20):
+    """
+    Functions with the most samples at the top of the stack
+    """
+    return JSONResponse(content={'top': await profile_request(target, {'action': 'top', 'limit': limit})})
+
+
+@app.post("/api/profile/{target}/memory/{action}")
+async def profile_memory_control(target: str, action: str, frames: int = 1):
+    """
+    Start or stop tracemalloc (it slows allocations down while tracing)
+    """
+    if action not in ('start', 'stop'):
+        raise HTTPException(status_code=400, detail="Invalid action. Allowed actions: start, stop")
+    return JSONResponse(content=await profile_request(target, {'action': f'memory_{action}', 'frames': frames}))
+
+
+@app.get("/api/profile/{target}/memory")
+async def profile_memory(target: str, limit: int = 20):
+    """
+    Top allocation sites since tracemalloc was started
+    """
+    return JSONResponse(content=await profile_request(target, {'action': 'memory', 'limit': limit}))
+
+
+@app.get("/api/logs/stats")
+async def log_stats():
+    """
+    Records and bytes held per app by the orchestrator's in-memory log store
+    """
+    return JSONResponse(content={'apps': await orchestrator_request({'op': 'log_stats'})})
+
+
 @app.get("/api/ws-logs")
-async def get_ws_logs():
+async def get_ws_logs(request: Request):
     """
-    Retrieve the WebSocket server logs
+    Retrieve the most recent WebSocket server logs
     """
     try:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        log_path = os.path.join(script_dir, '_ws_server_log.txt')
+        def build():
+            logs = log_archive.read_text('ws_server', lines=LOG_TAIL_RECORDS)
+            return {'logs': logs if logs else 'No logs yet...', 'size': len(logs)}
         
-        if not os.path.exists(log_path):
-            return JSONResponse(content={'logs': 'WebSocket server not started yet or no logs available.', 'size': 0})
-        
-        with open(log_path, 'r', encoding='utf-8') as f:
-            logs = f.read()
-        
-        return JSONResponse(content={'logs': logs if logs else 'No logs yet...', 'size': len(logs)})
+        last_modified, version = log_archive.version('ws_server')
+        return http_cache.respond(request, 'ws-logs', version, build, last_modified)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -219,14 +582,10 @@ async def get_ws_logs():
 @app.post("/api/clear-ws-logs")
 async def clear_ws_logs():
     """
-    Clear the WebSocket server log file
+    Clear the WebSocket server logs
     """
     try:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        log_path = os.path.join(script_dir, '_ws_server_log.txt')
-        
-        with open(log_path, 'w', encoding='utf-8') as f:
-            f.truncate(0)
+        log_archive.clear('ws_server')
         
         return JSONResponse(content={'success': True, 'message': 'WebSocket logs cleared successfully.'})
     
@@ -235,21 +594,17 @@ async def clear_ws_logs():
 
 
 @app.get("/api/orchestrator-logs")
-async def get_orchestrator_logs():
+async def get_orchestrator_logs(request: Request):
     """
-    Retrieve the Orchestrator logs
+    Retrieve the most recent Orchestrator logs
     """
     try:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        log_path = os.path.join(script_dir, '_orchestrator_log.txt')
-        
-        if not os.path.exists(log_path):
-            return JSONResponse(content={'logs': 'Orchestrator not started yet or no logs available.', 'size': 0})
+        def build():
+            logs = log_archive.read_text('orchestrator', lines=LOG_TAIL_RECORDS)
+            return {'logs': logs if logs else 'No logs yet...', 'size': len(logs)}
         
-        with open(log_path, 'r', encoding='utf-8') as f:
-            logs = f.read()
-        
-        return JSONResponse(content={'logs': logs if logs else 'No logs yet...', 'size': len(logs)})
+        last_modified, version = log_archive.version('orchestrator')
+        return http_cache.respond(request, 'orchestrator-logs', version, build, last_modified)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -258,14 +613,10 @@ async def get_orchestrator_logs():
 @app.post("/api/clear-orchestrator-logs")
 async def clear_orchestrator_logs():
     """
-    Clear the Orchestrator log file
+    Clear the Orchestrator logs
     """
     try:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        log_path = os.path.join(script_dir, '_orchestrator_log.txt')
-        
-        with open(log_path, 'w', encoding='utf-8') as f:
-            f.truncate(0)
+        log_archive.clear('orchestrator')
         
         return JSONResponse(content={'success': True, 'message': 'Orchestrator logs cleared successfully.'})
     
@@ -274,189 +625,66 @@ async def clear_orchestrator_logs():
 
 
 @app.get("/api/health-status")
-async def get_health_status():
+async def get_health_status(request: Request):
     """
-    Parse WebSocket logs to get health status of 1.py, 2.py, 3.py
-    Reads only the last 2 lines for performance
+    Health status of 1.py, 2.py, 3.py from the health monitor's latest report
     """
-    try:
-        import json
-        import re
-        
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        log_path = os.path.join(script_dir, '_ws_server_log.txt')
-        
-        # Default status: all unhealthy
-        health_status = {
-            '1.py': {'healthy': False, 'status': 'Unhealthy'},
-            '2.py': {'healthy': False, 'status': 'Unhealthy'},
-            '3.py': {'healthy': False, 'status': 'Unhealthy'}
-        }
-        
-        if not os.path.exists(log_path):
-            return JSONResponse(content={'health': health_status})
-        
-        # Read last 2 lines of the file
-        with open(log_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        if not lines:
-            return JSONResponse(content={'health': health_status})
-        
-        # Get last 2 lines (or less if file has fewer lines)
-        last_lines = lines[-2:] if len(lines) >= 2 else lines
-        
-        # Try to parse JSON from the last lines
-        for line in reversed(last_lines):
-            try:
-                # Extract JSON from log line - look for pattern after "Received from ..."
-                if 'Received from' in line and '{' in line:
-                    # Find the JSON part (everything after the IP address)
-                    json_start = line.find('{')
-                    json_str = line[json_start:].strip()
-                    
-                    # Parse JSON
-                    data = json.loads(json_str)
-                    
-                    # Extract apps data
-                    if 'apps' in data and isinstance(data['apps'], list) and len(data['apps']) > 0:
-                        # Iterate through ALL items in the apps array
-                        for app_item in data['apps']:
-                            # Each item is a dict like {"2.py": {"uuid": true}}
-                            if isinstance(app_item, dict):
-                                # Check each app we're interested in
-                                for app_name in ['1.py', '2.py', '3.py']:
-                                    if app_name in app_item:
-                                        app_data = app_item[app_name]
-                                        # Get the first value (which should be the boolean health status)
-                                        if isinstance(app_data, dict):
-                                            # Get first value from the dict
-                                            health_value = next(iter(app_data.values()), False)
-                                            health_status[app_name]['healthy'] = bool(health_value)
-                                            health_status[app_name]['status'] = 'Healthy' if health_value else 'Unhealthy'
-                        
-                        # If we found valid data, break
-                        break
-            except json.JSONDecodeError:
-                continue
-            except Exception as e:
-                print(f"Error parsing line: {e}")
-                continue
-        
-        return JSONResponse(content={'health': health_status})
-    
-    except Exception as e:
-        print(f"Error in get_health_status: {e}")
-        return JSONResponse(content={
-            'health': {
-                '1.py': {'healthy': False, 'status': 'Error'},
-                '2.py': {'healthy': False, 'status': 'Error'},
-                '3.py': {'healthy': False, 'status': 'Error'}
-            }
-        })
+    report, received, _ = health_monitor.latest()
+    content = health_status_content(report, received)
+    # Reports arrive every second: the served view is the version, so the ETag only changes with a status
+    if content != health_view['content']:
+        health_view.update(content=content, changed=received)
+    return http_cache.respond(request, 'health-status', content, lambda: content, health_view['changed'])
 
 
-if __name__ == '__main__':
-    import uvicorn
+def health_status_content(report, received):
+    """
+    Health of 1.py, 2.py, 3.py in a health report
+    Each item of report['apps'] is a dict like {"2.py": {"uuid": true}}
+    """
+    # Default status: all unhealthy
+    health_status = {
+        '1.py': {'healthy': False, 'status': 'Unhealthy'},
+        '2.py': {'healthy': False, 'status': 'Unhealthy'},
+        '3.py': {'healthy': False, 'status': 'Unhealthy'}
+    }
     
-    # Start WebSocket server in a new PowerShell terminal
-    print("Launching Health Monitor WebSocket Server in new terminal...")
+    if not isinstance(report, dict):
+        return {'health': health_status}
+    trace_health_served(received, report)
     
-    # Create a Python script to run the WebSocket server
-    ws_log_path = os.path.join(os.path.dirname(__file__), "_ws_server_log.txt")
-    ws_script = f"""
-import asyncio
-import websockets
-import os
-import sys
-from datetime import datetime
-from dotenv import load_dotenv
-
-load_dotenv()
-
-HS_HM_HOST = os.getenv("HS_HM_HOST", "localhost")
-HS_HM_PORT = os.getenv("HS_HM_PORT", "9001")
+    for app_item in report.get('apps') or []:
+        if not isinstance(app_item, dict):
+            continue
+        # Check each app we're interested in
+        for app_name in ['1.py', '2.py', '3.py']:
+            app_data = app_item.get(app_name)
+            if isinstance(app_data, dict):
+                # The first value is the boolean health status
+                health_value = next(iter(app_data.values()), False)
+                health_status[app_name]['healthy'] = bool(health_value)
+                health_status[app_name]['status'] = 'Healthy' if health_value else 'Unhealthy'
+    
+    return {'health': health_status}
 
-# Log file path
-LOG_FILE = r"{ws_log_path}"
 
-def log(message):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_message = f"[{{timestamp}}] {{message}}"
-    print(log_message)
-    try:
-        with open(LOG_FILE, 'a', encoding='utf-8') as f:
-            f.write(log_message + "\\n")
-    except Exception as e:
-        print(f"Error writing to log: {{e}}")
-
-async def health_websocket_handler(ws):
-    client_addr = ws.remote_address
-    #log(f"Client connected: {{client_addr}}")
-    try:
-        async for msg in ws:
-            log(f"Received from {{client_addr}}: {{msg}}")
-            # Echo back or handle message
-            await ws.send(f"Echo: {{msg}}")
-            #log(f"Sent to {{client_addr}}: Echo: {{msg}}")
-    except websockets.exceptions.ConnectionClosed:
-        #log(f"Client disconnected: {{client_addr}}")
-        pass
-    except Exception as e:
-        log(f"Error handling client {{client_addr}}: {{e}}")
-
-async def start_websocket_server():
-    log("=" * 60)
-    log("WebSocket Health Monitor Server Starting...")
-    log("=" * 60)
-    server = await websockets.serve(health_websocket_handler, HS_HM_HOST, int(HS_HM_PORT))
-    log(f"WebSocket server started on ws://{{HS_HM_HOST}}:{{HS_HM_PORT}}")
-    log("Waiting for connections...")
-    await asyncio.Future()
-
-if __name__ == "__main__":
-    # Clear log file on startup
-    try:
-        with open(LOG_FILE, 'w', encoding='utf-8') as f:
-            f.write("")
-    except:
-        pass
-    asyncio.run(start_websocket_server())
-"""
-    
-    # Write temporary WebSocket script
-    ws_script_path = os.path.join(os.path.dirname(__file__), "_ws_server_temp.py")
-    with open(ws_script_path, 'w') as f:
-        f.write(ws_script)
-    
-    # Launch WebSocket server in new terminal
-    command = f'start pwsh -NoExit -Command "python {ws_script_path}"'
-    subprocess.Popen(command, shell=True)
+if __name__ == '__main__':
+    import uvicorn
     
-    print("WebSocket server launched in separate terminal")
+    # Health Monitor WebSocket server, run in the admin panel's event loop
+    HEALTH_MONITOR = True
     
-    # Launch orchestrator.py in a new PowerShell terminal with output redirection
-    print("Launching Orchestrator in new terminal...")
+    # Launch orchestrator.py under the supervisor; its output goes to the "orchestrator" log stream
+    # ORCHESTRATOR_SHARDS > 1 runs it as sharded workers behind shard_router.py instead
     orchestrator_path = os.path.join(os.path.dirname(__file__), "orchestrator.py")
-    orchestrator_log_path = os.path.join(os.path.dirname(__file__), "_orchestrator_log.txt")
     
     if os.path.exists(orchestrator_path):
-        # Clear log file
-        with open(orchestrator_log_path, 'w', encoding='utf-8') as f:
-            f.write("")
-        
-        # Use PowerShell to run Python and capture output with Tee-Object (shows in terminal AND saves to file)
-        ps_command = f"$env:PYTHONUNBUFFERED='1'; python '{orchestrator_path}' 2>&1 | Tee-Object -FilePath '{orchestrator_log_path}'"
-        command = f'start pwsh -NoExit -Command "{ps_command}"'
-        subprocess.Popen(command, shell=True)
-        print("Orchestrator launched in separate terminal")
+        # Clear log
+        log_archive.clear("orchestrator")
+        AUTOSTART.append("shard_router.py" if int(os.getenv("ORCHESTRATOR_SHARDS", "1")) > 1 else "orchestrator.py")
     else:
         print("Warning: orchestrator.py not found, skipping...")
     
-    # Give services time to start
-    import time
-    time.sleep(2)
-    
     # Start FastAPI server
     print("Starting Admin Panel on http://localhost:8000")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop=perf_backend.uvicorn_loop())
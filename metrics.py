@@ -0,0 +1,235 @@
+"""
+metrics.py
+Minimal Prometheus-style metrics registry: counters, gauges and fixed-bucket histograms
+Label values are passed as a tuple in the order the metric was defined with, so an update is
+a couple of dict operations and no allocation beyond the tuple
+Updates take a lock: the orchestrator updates metrics from its AI-agent and health threads too
+Long-running processes export render() (the admin panel serves it at /metrics); short-lived
+ones such as AiAgent.py dump a textfile into METRICS_DIR that the admin panel picks up
+Run `python metrics.py --bench` to measure the cost of the instrumentation on the ingest path (exits 1 above OVERHEAD_BUDGET)
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import statistics
+
+from bisect import bisect_left
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICS_DIR = os.path.join(SCRIPT_DIR, os.getenv("METRICS_DIR", ".metrics"))
+ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+OVERHEAD_BUDGET = 2.0  # percent of ingest time the instrumentation may cost (see benchmark())
+
+# Seconds; suits everything from a parsed log line to an LLM call
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120)
+
+# 'name' : {"type", "help", "labels", "buckets", "values": {label values: value}}
+# Histogram values are [bucket counts..., +Inf count, sum]
+REGISTRY = dict()
+lock = threading.Lock()
+
+
+def define(name, kind, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    if name not in REGISTRY:
+        REGISTRY[name] = {"type": kind, "help": help_text, "labels": tuple(labels),
+                          "buckets": tuple(buckets), "values": {}}
+    return name
+
+
+def counter(name, help_text, labels=()):
+    return define(name, "counter", help_text, labels)
+
+
+def gauge(name, help_text, labels=()):
+    return define(name, "gauge", help_text, labels)
+
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    return define(name, "histogram", help_text, labels, buckets)
+
+
+def inc(name, labels=(), value=1):
+    values = REGISTRY[name]["values"]
+    with lock:
+        values[labels] = values.get(labels, 0) + value
+
+
+def set_gauge(name, value, labels=()):
+    REGISTRY[name]["values"][labels] = value
+
+
+def observe(name, value, labels=()):
+    metric = REGISTRY[name]
+    index = bisect_left(metric["buckets"], value)
+    with lock:
+        state = metric["values"].get(labels)
+        if state is None:
+            state = metric["values"][labels] = [0] * (len(metric["buckets"]) + 2)
+        state[index] += 1
+        state[-1] += value
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render(const_labels=""):
+    """
+    All metrics in the Prometheus text exposition format.
+    const_labels (e.g. 'shard="1"') is added to every sample.
+    """
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        with lock:
+            samples = [(labels, list(value) if isinstance(value, list) else value)
+                       for labels, value in metric["values"].items()]
+        for labels, value in samples:
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_label_text(metric['labels'], labels, const_labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric["buckets"] + ("+Inf",), value[:-1]):
+                cumulative += count
+                le = ",".join(filter(None, [const_labels, f'le="{bound}"']))
+                lines.append(f"{name}_bucket{_label_text(metric['labels'], labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(metric['labels'], labels, const_labels)} {value[-1]}")
+            lines.append(f"{name}_count{_label_text(metric['labels'], labels, const_labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def merge_texts(texts):
+    """Combine expositions of several processes, keeping one HELP / TYPE header per metric"""
+    families = dict()
+    for text in texts:
+        name = None
+        for line in text.splitlines():
+            if line.startswith("# HELP "):
+                name = line.split()[2]
+                if name in families:
+                    continue
+                families[name] = [line]
+            elif line.startswith("# TYPE ") and name in families and len(families[name]) > 1:
+                continue
+            elif name is not None and line:
+                families[name].append(line)
+    return "".join("\n".join(lines) + "\n" for lines in families.values())
+
+
+def write_textfile(job):
+    """
+    Dump the registry to METRICS_DIR/<job>.prom (atomically) for processes that exit quickly.
+    The raw values go to <job>.json so the next run continues the counts (see load_textfile).
+    """
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, job)
+    raw = {name: [[list(labels), value] for labels, value in metric["values"].items()]
+           for name, metric in REGISTRY.items()}
+    for ext, content in ((".json", json.dumps(raw)), (".prom", render())):
+        with open(path + ext + ".tmp", "w") as f:
+            f.write(content)
+        os.replace(path + ext + ".tmp", path + ext)
+
+
+def load_textfile(job):
+    """Continue from the values a previous run of job wrote (metrics must be defined first)"""
+    try:
+        with open(os.path.join(METRICS_DIR, f"{job}.json"), "r") as f:
+            raw = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return
+    for name, values in raw.items():
+        if name in REGISTRY:
+            REGISTRY[name]["values"].update((tuple(labels), value) for labels, value in values)
+
+
+def read_textfiles():
+    text = []
+    if os.path.isdir(METRICS_DIR):
+        for name in sorted(os.listdir(METRICS_DIR)):
+            if name.endswith(".prom"):
+                with open(os.path.join(METRICS_DIR, name), "r") as f:
+                    text.append(f.read())
+    return "".join(text)
+
+
+def benchmark(lines=20000, per_connection=(20000, 60, 1), rounds=9, repeats=7):
+    """
+    Feed the same log lines through orchestrator.stream_handler with metrics on and off, over connections
+    of each size in per_connection: one long stream, a simulator-like 60 lines, and service_client's one line.
+    Runs alternate to cancel out drift and are timed in CPU time, so other processes do not count;
+    each repeat compares the best of `rounds` runs of each, and the median over the repeats is reported.
+    Returns the highest median overhead of the connection sizes.
+    """
+    import gc
+    import asyncio
+    import contextlib
+    # The orchestrator's own import of this module, not __main__
+    import metrics
+    import orchestrator
+
+    class FakeSocket:
+        def __init__(self, messages):
+            self.messages = messages
+
+        def __aiter__(self):
+            return self._iterate()
+
+        async def _iterate(self):
+            for msg in self.messages:
+                yield msg
+
+    async def feed(size):
+        for start in range(0, lines, size):
+            await orchestrator.stream_handler(FakeSocket(messages[start:start + size]))
+
+    def samples():
+        state = metrics.REGISTRY[orchestrator.INGEST_SECONDS]["values"].get(())
+        return sum(state[:-1]) if state else 0
+
+    messages = [f"[bench.py] [{'WARN' if i % 10 == 0 else 'INFO'}] [2025-01-01T00:00:00] request {i} served\n"
+                for i in range(lines)]
+    worst = float("-inf")
+    with open(os.devnull, "w") as devnull:
+        for size in per_connection:
+            overheads = []
+            for repeat in range(repeats):
+                best = {True: float("inf"), False: float("inf")}
+                sampled = samples()
+                with contextlib.redirect_stdout(devnull):
+                    for round_number in range(rounds):
+                        for enabled in ((False, True) if round_number % 2 else (True, False)):
+                            metrics.ENABLED = enabled
+                            orchestrator.log_store.STORES.clear()
+                            orchestrator.log_search.reset()
+                            gc.collect()
+                            started = time.process_time()
+                            asyncio.run(feed(size))
+                            best[enabled] = min(best[enabled], time.process_time() - started)
+                overheads.append((best[True] - best[False]) / best[False] * 100)
+                print(f"{size} line(s)/connection, run {repeat + 1}: {lines / best[False]:,.0f} lines/s without "
+                      f"metrics, {lines / best[True]:,.0f} with ({overheads[-1]:+.2f}%), "
+                      f"{(samples() - sampled) // rounds} latency samples per run")
+            overhead = statistics.median(overheads)
+            worst = max(worst, overhead)
+            print(f"{size} line(s)/connection overhead: median {overhead:.2f}% over {repeats} runs "
+                  f"({'OK' if overhead < OVERHEAD_BUDGET else 'ABOVE'} {OVERHEAD_BUDGET:g}% budget)")
+    metrics.ENABLED = True
+    return worst
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        if benchmark() >= OVERHEAD_BUDGET:
+            sys.exit(f"metrics overhead above the {OVERHEAD_BUDGET:g}% budget")
@@ -5,6 +5,12 @@ Each service when starting requests for an ID provided by orchestrator
 ID used to track health of the service
 Invokes AI agent on Critical Failure logs are seen
 Collects heartbeat logs and sends health status to health monitor
+Keeps recent log records in memory (log_store.py) and answers queries on the query websocket
+Indexes every log message for full-text search (log_search.py)
+Exposes counters and latency histograms of its hot paths (metrics.py) on the query websocket
+Registered services survive a restart: state is snapshotted with a write-ahead log (state_store.py)
+With REPLICATION_PORT set, a standby (replication.py) mirrors that state and takes over on failure
+Runs on uvloop and encodes JSON with orjson when they are installed (perf_backend.py)
 """
 
 import asyncio
@@ -15,15 +21,27 @@ import os
 import threading
 import subprocess
 import sys
-import shutil
-import json
+import signal
 import time
 
+from collections import deque
 from datetime import datetime, timedelta
 from threading import Thread
 from dotenv import load_dotenv
 load_dotenv()
 
+import backup_store
+import log_store
+import log_search
+import log_archive
+import state_store
+import metrics
+import tracing
+import profiler
+import loop_watchdog
+import perf_backend
+from venvs import service_python
+
 WS_HOST = os.getenv("WS_HOST")
 WS_PORT = os.getenv("WS_PORT")
 
@@ -42,37 +60,109 @@ HS_HM_PORT = os.getenv("HS_HM_PORT")
 
 HS_HM_URI = "ws://" + HS_HM_HOST + ":" + HS_HM_PORT
 
+QS_HOST = os.getenv("QS_HOST", "127.0.0.1")
+QS_PORT = os.getenv("QS_PORT", "3806")
+
+# Archive stream receiving ERROR/FATAL blocks (each shard of shard_router.py has its own)
+ERROR_LOG_STREAM = os.getenv("ERROR_LOG_STREAM", "log")
+
+# Seconds between state snapshots (registrations and exits are in the WAL in between)
+STATE_SNAPSHOT_SECONDS = float(os.getenv("STATE_SNAPSHOT_SECONDS", "30"))
+
+# Instance IDs are dropped this many seconds after an exit or the last heartbeat
+INSTANCE_GRACE_SECONDS = float(os.getenv("INSTANCE_GRACE_SECONDS", "30"))
+# Expired instances remembered for inspection
+TOMBSTONE_LIMIT = int(os.getenv("TOMBSTONE_LIMIT", "1000"))
+
+# Admin panel hosting the service supervisor (main.py)
+ADMIN_URL = os.getenv("ADMIN_URL", "http://127.0.0.1:8000")
+
+# Automatic restarts after a fix allowed per app within the window (seconds); further fixes are applied
+# but the service is left for an operator to restart
+AUTO_RESTART_LIMIT = int(os.getenv("AUTO_RESTART_LIMIT", "3"))
+AUTO_RESTART_WINDOW = float(os.getenv("AUTO_RESTART_WINDOW", "600"))
+
 # Dict: 'app_id' : (last_health_ts, current_health)
 HEALTH = dict()
 
 LOG_FORMAT = r'\[[^\]]*\] '
 
+# AiAgent.py's output files. Under shard_router.py every worker keeps them in its own STATE_DIR,
+# so remediations running on two shards at once never read each other's fix
+AI_AGENT_DIR = state_store.STATE_DIR if os.getenv("SHARD") else os.path.dirname(os.path.abspath(__file__))
+FIXED_OUTPUT_PATH = os.path.join(AI_AGENT_DIR, "fixed_output.py")
+AI_AGENT_ENV = dict(os.environ, FIXED_OUTPUT=FIXED_OUTPUT_PATH,
+                    KB_PATH=os.path.join(AI_AGENT_DIR, "knowledge_base.json"),
+                    METRICS_JOB=f"ai_agent-shard-{os.getenv('SHARD')}") if os.getenv("SHARD") else None
+
+# Metrics; samples carry shard="<n>" when running under shard_router.py
+METRICS_LABELS = f'shard="{os.getenv("SHARD")}"' if os.getenv("SHARD") else ""
+INGEST_SAMPLE_EVERY = 128  # one ingest latency sample per this many lines, over all connections
+LOG_LINES = metrics.counter("orchestrator_log_lines_total", "Log lines received", ("app", "severity"))
+INGEST_SECONDS = metrics.histogram("orchestrator_ingest_seconds", "Time to ingest one log line (sampled)")
+HEARTBEATS = metrics.counter("orchestrator_heartbeats_total", "Heartbeats received")
+HEARTBEAT_LAG = metrics.histogram("orchestrator_heartbeat_lag_seconds", "Delay between a heartbeat being sent and received")
+HEALTH_TICK = metrics.histogram("orchestrator_health_tick_seconds", "Duration of one health_handler tick")
+REGISTRATIONS = metrics.counter("orchestrator_registrations_total", "Registrations by kind", ("kind",))
+LIVE_INSTANCES = metrics.gauge("orchestrator_live_instances", "Registered instances not yet expired")
+EXPIRED_INSTANCES = metrics.counter("orchestrator_expired_instances_total", "Instances expired by GC", ("reason",))
+REMEDIATION_WAIT = metrics.histogram("orchestrator_remediation_wait_seconds", "Time from error detection to the AI agent starting")
+REMEDIATION_SECONDS = metrics.histogram("orchestrator_remediation_seconds", "AI agent run time", ("result",))
+RECOVERY_SECONDS = metrics.histogram("orchestrator_recovery_seconds", "Time from error detection to the fixed service's first heartbeat")
+
 app_name_to_id = dict()
 
+# Live instances: 'app_id' : {"app": name, "registered": epoch, "last_seen": epoch, "exited": epoch or None}
+INSTANCES = dict()
+# Expired instances, oldest dropped first: {"id", "app", "reason", "registered", "expired"}
+tombstones = deque(maxlen=TOMBSTONE_LIMIT)
+
 connection_app_map = {}  # Maps websocket connections to app IDs
 ai_agent_running = False  # Flag to prevent multiple simultaneous AI agent executions
+ai_agent_app = None  # App the running AI agent is fixing
 ai_agent_lock = threading.Lock()  # Thread lock for AI agent execution
 
+# Services restarted by the orchestrator after a fix: 'app_name' : subprocess.Popen
+service_procs = dict()
+# Open incidents: 'app_name' : {"detected": datetime, "restarted": datetime, "app_id": new id}
+incidents = dict()
+# Closed incidents: (app_name, seconds from detection to first heartbeat of the fixed service)
+recovery_times = []
+incident_lock = threading.Lock()
+# Recent automatic restarts: 'app_name' : deque of monotonic timestamps
+auto_restarts = dict()
+
+# 'app_id' : epoch of its oldest heartbeat not yet sent to the health monitor (tracing's publish stage)
+# Filled by the event loop and swapped out by the health reporter thread, both under unpublished_lock
+unpublished = dict()
+unpublished_lock = threading.Lock()
+
 def parse_log(msg):
-    app_id, sev, ts = [x.lstrip('[').rstrip('] ') for x in re.findall(LOG_FORMAT, msg)]
+    # Only the first three fields: a trace field or brackets in the text may follow
+    app_id, sev, ts = [x.lstrip('[').rstrip('] ') for x in re.findall(LOG_FORMAT, msg)[:3]]
     txt = re.split(LOG_FORMAT, msg)[-1]
     return app_id, sev, ts
 
-def apply_fixed_code(original_filename=None):
+def apply_fixed_code(original_filename=None, since=None):
     """
     After AI agent completes, this function:
     1. Reads fixed_output.py
     2. Determines the original faulty filename from app_name
-    3. Creates a backup of the original file as <filename>.py.bkp
-    4. Replaces the original file with the fixed code
+    3. Records the original file as a new version in the backup store
+    4. Replaces the original file with the fixed code and records the fix as a version
+    Fixed code that does not compile, that is identical to the current file, or that was written
+    before `since` (a stale fixed_output.py of an earlier run) is rejected and the original is left untouched.
     """
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    fixed_output_path = os.path.join(script_dir, "fixed_output.py")
+    fixed_output_path = FIXED_OUTPUT_PATH
     
     # Check if fixed_output.py exists
     if not os.path.exists(fixed_output_path):
         print("fixed_output.py not found. AI agent may not have completed successfully.")
         return False
+    if since is not None and os.path.getmtime(fixed_output_path) < since:
+        print("fixed_output.py was not written by this AI agent run; ignoring it.")
+        return False
     
     # Use provided filename or default
     if not original_filename:
@@ -86,37 +176,37 @@ def apply_fixed_code(original_filename=None):
         print(f"Original file '{original_filename}' not found at {original_path}")
         return False
     
+    # Read the fixed code
+    with open(fixed_output_path, "r", encoding="utf-8") as f:
+        fixed_code = f.read()
+
+    # Validate the fix before it replaces a running service
     try:
-        # Create backup filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_filename = f"{original_filename}.bkp"
-        backup_path = os.path.join(script_dir, backup_filename)
-        
-        # If a backup already exists, add timestamp to avoid overwriting
-        if os.path.exists(backup_path):
-            base_name = original_filename.rsplit('.', 1)[0]
-            backup_filename = f"{base_name}_{timestamp}.py.bkp"
-            backup_path = os.path.join(script_dir, backup_filename)
-        
-        # Create backup of original file
-        print(f"\nCreating backup: {backup_filename}")
-        shutil.copy2(original_path, backup_path)
-        print(f"Backup created successfully at {backup_path}")
-        
-        # Read the fixed code
-        with open(fixed_output_path, "r", encoding="utf-8") as f:
-            fixed_code = f.read()
+        compile(fixed_code, original_filename, "exec")
+    except SyntaxError as e:
+        print(f"Fixed code for {original_filename} does not compile: {e}")
+        return False
+
+    try:
+        # Record the current code before touching it
+        backup = backup_store.save_version(original_filename, reason="pre-fix")
+        print(f"\nBacked up {original_filename} as version {backup['id']} ({backup['sha256'][:12]})")
+        if backup_store.read_object(backup["sha256"]) == fixed_code.encode("utf-8"):
+            print(f"Fixed code is identical to {original_filename}; nothing to apply.")
+            return False
         
         # Replace original file with fixed code
         print(f"\nReplacing {original_filename} with fixed code...")
         with open(original_path, "w", encoding="utf-8") as f:
             f.write(fixed_code)
+        fixed = backup_store.save_version(original_filename, reason="ai-fix")
         print(f"{original_filename} has been updated with the fixed code!")
         
         print(f"\n{'='*60}")
         print("Code fix applied successfully!")
-        print(f"Original backed up to: {backup_filename}")
-        print(f"Fixed code applied to: {original_filename}")
+        print(f"Original backed up as version: {backup['id']}")
+        print(f"Fixed code applied to: {original_filename} (version {fixed['id']})")
+        print(f"Rollback with: python restore.py --rollback {original_filename} {backup['id']}")
         print(f"{'='*60}\n")
         
         return True
@@ -127,15 +217,30 @@ def apply_fixed_code(original_filename=None):
 
 
 def run_ai_agent(original_filename=None):
-    """Run AiAgent.py in a separate thread to analyze and fix errors."""
-    global ai_agent_running
+    """
+    Run AiAgent.py in a separate thread to analyze and fix errors.
+    The app's incident is closed on every path that does not restart it.
+    """
+    global ai_agent_running, ai_agent_app
     
     with ai_agent_lock:
         if ai_agent_running:
             print("AI Agent is already running. Skipping duplicate execution.")
+            # The running agent owns this app's incident; another app's would never be resolved
+            if ai_agent_app != original_filename:
+                close_incident(original_filename)
             return
         ai_agent_running = True
+        ai_agent_app = original_filename
     
+    with incident_lock:
+        incident = incidents.get(original_filename)
+    if incident:
+        metrics.observe(REMEDIATION_WAIT, (datetime.now() - incident["detected"]).total_seconds())
+    started = time.perf_counter()
+    run_started = time.time()
+    outcome = "error"
+    restarted = False
     try:
         print("\n" + "="*60)
         print("Starting AI Agent to analyze and fix the error...")
@@ -150,8 +255,10 @@ def run_ai_agent(original_filename=None):
             return
         
         # Run AiAgent.py as a subprocess
+        os.makedirs(AI_AGENT_DIR, exist_ok=True)
         result = subprocess.run(
             [sys.executable, ai_agent_path],
+            env=AI_AGENT_ENV,
             capture_output=True,
             text=True,
             timeout=120  # 2 minute timeout
@@ -168,13 +275,16 @@ def run_ai_agent(original_filename=None):
         
         if result.returncode == 0:
             print("\nAI Agent completed successfully!")
+            outcome = "fixed"
             
             # Apply the fixed code automatically
             print("\nAttempting to apply the fixed code...")
-            if apply_fixed_code(original_filename):
+            if apply_fixed_code(original_filename, since=run_started):
                 print("Fixed code has been applied and original backed up!")
+                restarted = restart_service(original_filename)
             else:
                 print("Could not automatically apply fixed code. Please check manually.")
+                outcome = "rejected"
         else:
             print(f"\nAI Agent exited with code {result.returncode}")
         
@@ -182,20 +292,203 @@ def run_ai_agent(original_filename=None):
         
     except subprocess.TimeoutExpired:
         print("\nAI Agent execution timed out after 2 minutes")
+        outcome = "timeout"
     except Exception as e:
         print(f"\nError running AI Agent: {e}")
     finally:
+        if not restarted:
+            close_incident(original_filename)
+        metrics.observe(REMEDIATION_SECONDS, time.perf_counter() - started, (outcome,))
         with ai_agent_lock:
             ai_agent_running = False
+            ai_agent_app = None
+
+def open_incident(app_name):
+    """Start the recovery clock for app_name unless an incident is already open."""
+    with incident_lock:
+        if app_name not in incidents:
+            incidents[app_name] = {"detected": datetime.now(), "restarted": None, "app_id": None}
+
+def close_incident(app_name):
+    """Drop an incident that will not be recovered automatically (no fix was applied)."""
+    with incident_lock:
+        if incidents.pop(app_name, None):
+            print(f"Incident for {app_name} closed without automatic recovery")
+
+def restart_service(app_name):
+    """
+    Restart a service right after a validated fix has been applied.
+    The admin panel's supervisor restarts it when available; otherwise the orchestrator
+    starts it itself, stopping any instance it started earlier.
+    The incident stays open until the new instance sends its first heartbeat.
+    Returns False (nothing restarted) when the service is missing or AUTO_RESTART_LIMIT is reached.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    service_path = os.path.join(script_dir, app_name)
+    if not os.path.exists(service_path):
+        print(f"Cannot restart {app_name}: {service_path} not found")
+        return False
+
+    # The supervisor's crash-loop guard is reset by every restart, so the orchestrator keeps its own count
+    now = time.monotonic()
+    recent = auto_restarts.setdefault(app_name, deque())
+    while recent and now - recent[0] > AUTO_RESTART_WINDOW:
+        recent.popleft()
+    if len(recent) >= AUTO_RESTART_LIMIT:
+        print(f"{app_name} was restarted automatically {len(recent)} times in the last "
+              f"{AUTO_RESTART_WINDOW:.0f}s; leaving it for an operator")
+        return False
+    recent.append(now)
+
+    open_incident(app_name)
+    with incident_lock:
+        incidents[app_name]["restarted"] = datetime.now()
+        incidents[app_name]["app_id"] = None
+
+    print(f"Restarting {app_name} with the fixed code...")
+    import urllib.request  # only needed here; kept out of the orchestrator's startup
+    try:
+        request = urllib.request.Request(f"{ADMIN_URL}/api/services/{app_name}/restart", method="POST")
+        with urllib.request.urlopen(request, timeout=10) as response:
+            restarted = response.status == 200
+    except Exception as e:
+        print(f"Supervisor not reachable ({e}); starting {app_name} directly")
+        restarted = False
+
+    if not restarted:
+        start_service_process(app_name, service_path)
+    return True
+
+def start_service_process(app_name, service_path):
+    """Start a service as a child of the orchestrator (used when no supervisor is running)."""
+    old_proc = service_procs.get(app_name)
+    if old_proc and old_proc.poll() is None:
+        print(f"Stopping previous instance of {app_name} (pid {old_proc.pid})")
+        old_proc.terminate()
+        try:
+            old_proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            old_proc.kill()
+
+    service_procs[app_name] = subprocess.Popen(
+        [service_python(), service_path],
+        cwd=os.path.dirname(service_path),
+        creationflags=subprocess.CREATE_NEW_CONSOLE if sys.platform == 'win32' else 0
+    )
+
+def mark_registered(app_name, app_id):
+    """Remember the ID of a restarted service so its first heartbeat closes the incident."""
+    with incident_lock:
+        incident = incidents.get(app_name)
+        if incident and incident["restarted"] and not incident["app_id"]:
+            incident["app_id"] = app_id
+
+def mark_ready(app_id):
+    """Close the incident whose restarted instance just sent its first heartbeat."""
+    with incident_lock:
+        for app_name, incident in incidents.items():
+            if incident["app_id"] == app_id:
+                break
+        else:
+            return
+        del incidents[app_name]
+        now = datetime.now()
+        recovery = (now - incident["detected"]).total_seconds()
+        restart = (now - incident["restarted"]).total_seconds()
+        recovery_times.append((app_name, recovery))
+        metrics.observe(RECOVERY_SECONDS, recovery)
+        mttr = sum(t for _, t in recovery_times) / len(recovery_times)
+    print(f"{app_name} recovered in {recovery:.2f}s (ready {restart:.2f}s after restart). "
+          f"MTTR over {len(recovery_times)} incident(s): {mttr:.2f}s")
+
+def restore_state():
+    """Reload registrations and last heartbeats saved by a previous run"""
+    state, stats = state_store.load()
+    app_name_to_id.update(state["apps"])
+    HEALTH.update(state["health"])
+    # Restored instances get a full grace period to heartbeat or re-attach
+    now = time.time()
+    for name, ids in app_name_to_id.items():
+        for app_id in ids:
+            INSTANCES[app_id] = {"app": name, "registered": now, "last_seen": now, "exited": None}
+    print(f"Restored {sum(len(ids) for ids in app_name_to_id.values())} service instance(s) "
+          f"in {stats['ms']} ms ({stats['replayed']} WAL entries replayed)")
+
+def current_state():
+    return {"apps": app_name_to_id, "health": HEALTH}
+
+async def snapshot_loop():
+    while True:
+        await asyncio.sleep(STATE_SNAPSHOT_SECONDS)
+        state_store.snapshot(current_state())
+
+def expire_instance(app_id, reason):
+    """Forget a dead instance, keeping a tombstone of it"""
+    instance = INSTANCES.pop(app_id)
+    ids = app_name_to_id.get(instance["app"], [])
+    if app_id in ids:
+        ids.remove(app_id)
+    if not ids:
+        app_name_to_id.pop(instance["app"], None)
+    HEALTH.pop(app_id, None)
+    state_store.record("expire", id=app_id)
+    metrics.inc(EXPIRED_INSTANCES, (reason,))
+    tombstones.append({"id": app_id, "app": instance["app"], "reason": reason,
+                       "registered": instance["registered"], "expired": time.time()})
+
+def gc_instances():
+    """Expire instances that exited or stopped heartbeating more than the grace period ago"""
+    now = time.time()
+    expired = []
+    for app_id, instance in INSTANCES.items():
+        if instance["exited"] and now - instance["exited"] > INSTANCE_GRACE_SECONDS:
+            expired.append((app_id, "exit"))
+        elif now - instance["last_seen"] > HB_TIMEOUT + INSTANCE_GRACE_SECONDS:
+            expired.append((app_id, "heartbeat timeout"))
+    for app_id, reason in expired:
+        expire_instance(app_id, reason)
+    metrics.set_gauge(LIVE_INSTANCES, len(INSTANCES))
+    return len(expired)
+
+async def gc_loop():
+    while True:
+        await asyncio.sleep(1)
+        gc_instances()
+
+def list_instances(request=None):
+    return {"live": INSTANCES, "tombstones": list(tombstones)}
+
+def parse_registration(msg):
+    """'name' registers a new instance; 'name uuid' re-attaches an instance that already has an ID"""
+    name, _, app_id = msg.strip().partition(" ")
+    if app_id:
+        try:
+            app_id = str(uuid.UUID(app_id))
+        except ValueError:
+            app_id = ""
+    return name, app_id
 
 async def app_id_handler(ws):
     global app_name_to_id
     try:
         msg = await ws.recv()
-        app_id = str(uuid.uuid4())
-        if msg not in app_name_to_id.keys():
-            app_name_to_id[msg] = []
-        app_name_to_id[msg].append(app_id)
+        name, app_id = parse_registration(msg)
+        # New instance, or an instance re-attaching with the ID it already has
+        kind = "reattach" if app_id else "new"
+        if not app_id:
+            app_id = str(uuid.uuid4())
+        if name not in app_name_to_id.keys():
+            app_name_to_id[name] = []
+        if app_id not in app_name_to_id[name]:
+            state_store.record("register", name=name, id=app_id)
+            app_name_to_id[name].append(app_id)
+            INSTANCES[app_id] = {"app": name, "registered": time.time(), "last_seen": time.time(), "exited": None}
+            metrics.inc(REGISTRATIONS, (kind,))
+            mark_registered(name, app_id)
+        else:
+            INSTANCES[app_id]["last_seen"] = time.time()
+            metrics.inc(REGISTRATIONS, (kind,))
+            print(f"{name} re-attached with ID {app_id}")
         await ws.send(app_id)
     finally:
         pass
@@ -205,33 +498,54 @@ async def hb_handler(ws):
     try:
         msg = await ws.recv()
         app_id, sev, ts = parse_log(msg)
+        instance = INSTANCES.get(app_id)
+        if instance is None:
+            # Expired (or never registered): it has to register again to be tracked
+            return
         if "Heartbeat" in msg:
+            if app_id not in HEALTH:
+                mark_ready(app_id)
             HEALTH[app_id] = ts
+            instance["last_seen"] = time.time()
+            with unpublished_lock:
+                unpublished.setdefault(app_id, instance["last_seen"])
+            lag = max(0.0, (datetime.now() - datetime.fromisoformat(ts)).total_seconds())
+            tracing.observe("heartbeat", lag)
+            if metrics.ENABLED:
+                metrics.inc(HEARTBEATS)
+                metrics.observe(HEARTBEAT_LAG, lag)
         else:
-            del HEALTH[app_id]
+            state_store.record("exit", id=app_id)
+            HEALTH.pop(app_id, None)
+            instance["exited"] = time.time()
     finally:
         pass
 
-def is_healthy(ts, app_id):
-    global HEALTH
-    if app_id not in HEALTH.keys():
+def is_healthy(ts, last_heartbeat):
+    """last_heartbeat comes from a snapshot of HEALTH: the event loop may expire the instance meanwhile"""
+    if last_heartbeat is None:
         return False
 
     new_ts = datetime.fromisoformat(ts)
-    old_ts = datetime.fromisoformat(HEALTH[app_id])
+    old_ts = datetime.fromisoformat(last_heartbeat)
 
     if (new_ts - old_ts) >= timedelta(seconds=HB_TIMEOUT):
         return False
     return True
 
 def health_handler():
+    started = time.perf_counter()
     ts = datetime.now().isoformat()
     all_apps_health = {"timestamp": ts, "apps": []}
-    for app_name in app_name_to_id.keys():
+    # Runs on the health reporter thread: work on copies, the event loop keeps registering and expiring instances
+    health = dict(HEALTH)
+    for app_name, app_ids in list(app_name_to_id.items()):
         # {"id1": True, "id2": False}
         app_id_healths = {}
-        for app_id in set(app_name_to_id[app_name]) & set(HEALTH.keys()):
-            app_id_healths[app_id] = is_healthy(ts, app_id)
+        for app_id in list(app_ids):
+            last_heartbeat = health.get(app_id)
+            if last_heartbeat is not None:
+                app_id_healths[app_id] = is_healthy(ts, last_heartbeat)
 
         # {"name1": {"id1": True, "id2": False}}
         app_name_health = None
@@ -241,15 +555,36 @@ def health_handler():
         # {"timestamp": "now()", "apps": ["name1": {...}, "name2": {...}]}
         if app_name_health:
             all_apps_health["apps"].append(app_name_health)
-    return json.dumps(all_apps_health)
+    metrics.observe(HEALTH_TICK, time.perf_counter() - started)
+    return perf_backend.dumps(all_apps_health)
+
+# Sampling and line counts are process-wide: most clients send a few lines per connection
+# Lines left until the next ingest latency sample
+until_sample = INGEST_SAMPLE_EVERY
+# 'app' : {'severity' : lines not yet added to LOG_LINES}; flushed when the metrics are rendered,
+# on the event loop like stream_handler, so the hot path never takes the metrics lock
+UNFLUSHED_LINES = dict()
+
+def flush_line_counts():
+    for app_name, counts in UNFLUSHED_LINES.items():
+        for sev, count in counts.items():
+            metrics.inc(LOG_LINES, (app_name, sev), count)
+        counts.clear()
 
 async def stream_handler(ws):
+    global until_sample
     try:
         # Get app identifier from first message
         first_msg = True
         app_name = None
+        counting = metrics.ENABLED
+        unflushed = None  # this app's entry of UNFLUSHED_LINES
+        # Lines of this connection not counted in unflushed yet: all of them INFO but `others`.
+        # Other severities are counted right away; INFO lines whenever this connection takes the sample, and on close
+        lines = others = 0
         
         async for msg in ws:
+            received = time.time()
             # Check if first message contains app name/identifier
             if first_msg:
                 first_msg = False
@@ -259,20 +594,41 @@ async def stream_handler(ws):
                     app_name = match.group(1)
                 else:
                     app_name = f"App_{id(ws)}"  # Using connection ID as fallback
-                
-
-            sev=parse_log(msg)[1]
+                unflushed = UNFLUSHED_LINES.get(app_name)
+                if unflushed is None:
+                    unflushed = UNFLUSHED_LINES[app_name] = dict()
+
+            lines += 1
+            until_sample -= 1
+            sampled = counting and until_sample <= 0
+            if sampled:
+                started = time.perf_counter()
+            _, sev, ts = parse_log(msg)
+            trace_id, sent, text = tracing.parse(re.split(LOG_FORMAT, msg, maxsplit=3)[-1])
+            log_store.ingest(app_name, sev, ts, msg.rstrip('\n'))
+            log_search.add(app_name, sev, text, msg.rstrip('\n'))
+            if sev != "INFO" and counting:
+                unflushed[sev] = unflushed.get(sev, 0) + 1
+                others += 1
+            if sampled:
+                metrics.observe(INGEST_SECONDS, time.perf_counter() - started)
+                if lines > others:
+                    unflushed["INFO"] = unflushed.get("INFO", 0) + lines - others
+                lines = others = 0
+                until_sample = INGEST_SAMPLE_EVERY
             print(f"\n{'='*60}\nApplication: {app_name}\n{'='*60}\n")
             print(msg, end='')
             if sev == "ERROR" or sev == "FATAL":
-                with open('log.txt', 'a', encoding='utf-8') as log_file:
-                    log_file.write(f"{'='*60}\n")
-                    log_file.write(f"Application: {app_name}\n")
-                    log_file.write(f"{'='*60}\n")
-                    log_file.write(msg)
+                log_archive.append(ERROR_LOG_STREAM, f"{'='*60}\nApplication: {app_name}\n{'='*60}\n{msg}")
+            if trace_id:
+                stored = time.time()
+                tracing.observe("client", received - sent)
+                tracing.observe("ingest", stored - received)
+                tracing.hop(trace_id, "stored", stored, app=app_name, severity=sev, sent=sent, received=received)
             
             # Trigger AI Agent in a separate thread for ERROR or FATAL
             if sev == "ERROR" or sev == "FATAL":
+                open_incident(app_name)
                 print(f"{sev.strip()} detected! Triggering AI Agent...")
                 # Run AI Agent in a separate thread to avoid blocking
                 # Pass the app_name (which is the original filename) to the AI agent
@@ -285,7 +641,64 @@ async def stream_handler(ws):
             elif sev == "ERROR":
                 print(f"Application {app_name} has logged an ERROR.")
     finally:
-        pass
+        if counting and lines > others:
+            unflushed["INFO"] = unflushed.get("INFO", 0) + lines - others
+
+def render_metrics(request):
+    flush_line_counts()
+    return metrics.render(METRICS_LABELS)
+
+def query_logs(request):
+    return log_store.query(
+        app=request.get("app"),
+        severity=request.get("severity"),
+        since=request.get("since"),
+        until=request.get("until"),
+        limit=int(request.get("limit", 200)),
+    )
+
+def search_logs(request):
+    return log_search.search(
+        q=request.get("q", ""),
+        app=request.get("app"),
+        severity=request.get("severity"),
+        since=request.get("since"),
+        until=request.get("until"),
+        offset=int(request.get("offset", 0)),
+        limit=int(request.get("limit", 50)),
+    )
+
+# Operations served on the query websocket: 'op' : handler(request) -> JSON-serializable result
+QUERY_OPS = {
+    "logs": query_logs,
+    "log_stats": lambda request: log_store.stats(),
+    "search": search_logs,
+    "search_stats": lambda request: log_search.stats(),
+    "instances": list_instances,
+    "metrics": render_metrics,
+    "traces": lambda request: tracing.export(),
+    "profile": profiler.control,
+    "loop": loop_watchdog.summary,
+}
+
+async def query_handler(ws):
+    """Answer JSON requests like {"op": "logs", "app": "2.py", "limit": 200} from the admin panel"""
+    async for msg in ws:
+        try:
+            request = perf_backend.loads(msg)
+            handler = QUERY_OPS.get(request.get("op"))
+            if handler is None:
+                response = {"ok": False, "error": f"Unknown op. Allowed ops: {', '.join(QUERY_OPS)}"}
+            else:
+                response = {"ok": True, "result": handler(request)}
+        except Exception as e:
+            response = {"ok": False, "error": str(e)}
+        await ws.send(perf_backend.dumps(response))
+
+async def query_ws():
+    query_server = websockets.serve(query_handler, QS_HOST, QS_PORT)
+    async with query_server:
+        await asyncio.Future()
 
 async def appid_ws():
     app_server = websockets.serve(app_id_handler, APP_HOST, APP_PORT)
@@ -303,26 +716,50 @@ async def hb_ws():
         await asyncio.Future()
 
 async def report_health_ws():
-    while True:
-        all_health = health_handler()
-        try:
-            async with websockets.connect(HS_HM_URI) as ws:
-                await ws.send(all_health)
-        finally:
-            pass
-        time.sleep(1)
+    global unpublished
+    watchdog_task = asyncio.create_task(loop_watchdog.watch("health"))
+    try:
+        while True:
+            with unpublished_lock:
+                pending, unpublished = unpublished, dict()
+            all_health = health_handler()
+            try:
+                async with websockets.connect(HS_HM_URI) as ws:
+                    await ws.send(all_health)
+                published = time.time()
+                for received in pending.values():
+                    tracing.observe("publish", published - received)
+            except OSError:
+                pass  # health monitor (or shard router) not up yet
+            await asyncio.sleep(1)
+    finally:
+        watchdog_task.cancel()
 
 def hs_hm_thread():
-    asyncio.run(report_health_ws())
+    perf_backend.run(report_health_ws())
 
 async def main():
     print("I am Running")
+    restore_state()
+    snapshot_task = asyncio.create_task(snapshot_loop())
+    gc_task = asyncio.create_task(gc_loop())
     appid_task = asyncio.create_task(appid_ws())
     stream_task = asyncio.create_task(stream_ws())
     hb_task = asyncio.create_task(hb_ws())
+    query_task = asyncio.create_task(query_ws())
+    watchdog_task = asyncio.create_task(loop_watchdog.watch("main"))
+    tasks = [appid_task, stream_task, hb_task, query_task, snapshot_task, gc_task, watchdog_task]
+    if os.getenv("REPLICATION_PORT"):
+        import replication  # loaded only when a standby is configured
+        tasks.append(asyncio.create_task(replication.serve(current_state)))
     Thread(target=hs_hm_thread, daemon=True).start()
 
-    await asyncio.gather(appid_task, stream_task, hb_task)
+    await asyncio.gather(*tasks)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # Turn the supervisor's SIGTERM into a normal exit so the final snapshot is written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        perf_backend.run(main())
+    finally:
+        state_store.snapshot(current_state())
@@ -0,0 +1,156 @@
+"""
+perf_backend.py
+Optional fast event loop and JSON codec for the websocket servers and the admin panel
+uvloop replaces the asyncio loop and orjson (or msgspec) the stdlib json codec when they are
+installed; without them everything falls back to asyncio and json
+Force a choice with LOOP_BACKEND=uvloop|asyncio and JSON_BACKEND=orjson|msgspec|json
+Run `python perf_backend.py --bench` to compare the ingest and health paths under each backend
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+
+LOOP_BACKEND = os.getenv("LOOP_BACKEND", "auto")
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto")
+
+
+def _json_codec(choice):
+    """(name, dumps -> str, dumps_bytes -> bytes, loads) of the first available codec"""
+    for name in (("orjson", "msgspec") if choice == "auto" else (choice,)):
+        if name == "orjson":
+            try:
+                import orjson
+            except ImportError:
+                continue
+
+            def dumps_bytes(obj):
+                return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+            return name, lambda obj: dumps_bytes(obj).decode("utf-8"), dumps_bytes, orjson.loads
+        if name == "msgspec":
+            try:
+                import msgspec
+            except ImportError:
+                continue
+            encoder, decoder = msgspec.json.Encoder(), msgspec.json.Decoder()
+            return name, lambda obj: encoder.encode(obj).decode("utf-8"), encoder.encode, decoder.decode
+    return "json", json.dumps, lambda obj: json.dumps(obj).encode("utf-8"), json.loads
+
+
+def _loop_module(choice):
+    if choice in ("auto", "uvloop"):
+        try:
+            import uvloop
+            return "uvloop", uvloop
+        except ImportError:
+            pass
+    return "asyncio", None
+
+
+JSON_NAME, dumps, dumps_bytes, loads = _json_codec(JSON_BACKEND)
+LOOP_NAME, uvloop = _loop_module(LOOP_BACKEND)
+for setting, requested, selected in (("JSON_BACKEND", JSON_BACKEND, JSON_NAME), ("LOOP_BACKEND", LOOP_BACKEND, LOOP_NAME)):
+    if requested not in ("auto", selected):
+        print(f"{setting}={requested} is not available; using {selected}")
+
+
+def run(main):
+    """asyncio.run() on the selected event loop"""
+    if uvloop is None:
+        return asyncio.run(main)
+    if hasattr(uvloop, "run"):
+        return uvloop.run(main)
+    uvloop.install()
+    return asyncio.run(main)
+
+
+def uvicorn_loop():
+    """uvicorn's `loop` setting for the selected event loop"""
+    return LOOP_NAME
+
+
+def describe():
+    return {"loop": LOOP_NAME, "json": JSON_NAME}
+
+
+def _bench_worker(lines=50000, instances=2000, reports=300, queries=2000):
+    """One backend (chosen through the environment): ingest, health report and query throughput"""
+    import contextlib
+    import websockets
+    import orchestrator
+
+    async def ingest():
+        done = asyncio.Event()
+
+        async def handler(ws):
+            await orchestrator.stream_handler(ws)
+            done.set()
+        async with websockets.serve(handler, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            started = time.perf_counter()
+            async with websockets.connect(f"ws://127.0.0.1:{port}") as ws:
+                for i in range(lines):
+                    await ws.send(f"[bench.py] [INFO] [2025-01-01T00:00:00] request {i} served in {i % 97} ms\n")
+            await done.wait()
+            return lines / (time.perf_counter() - started)
+
+    async def query():
+        async with websockets.serve(orchestrator.query_handler, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            started = time.perf_counter()
+            async with websockets.connect(f"ws://127.0.0.1:{port}") as ws:
+                for _ in range(queries):
+                    await ws.send(dumps({"op": "search_stats"}))
+                    loads(await ws.recv())
+            return queries / (time.perf_counter() - started)
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        ingest_rate = run(ingest())
+        query_rate = run(query())
+
+    # Health path: the orchestrator's report (encode) and the admin panel's parse (decode)
+    now = time.time()
+    for i in range(instances):
+        app_id = f"{i:08d}-0000-4000-8000-000000000000"
+        orchestrator.app_name_to_id.setdefault(f"app-{i % 200}.py", []).append(app_id)
+        orchestrator.HEALTH[app_id] = "2025-01-01T00:00:00"
+        orchestrator.INSTANCES[app_id] = {"app": f"app-{i % 200}.py", "registered": now, "last_seen": now, "exited": None}
+    started = time.perf_counter()
+    for _ in range(reports):
+        loads(orchestrator.health_handler())
+    health_rate = reports / (time.perf_counter() - started)
+    return {"ingest_lines_per_s": round(ingest_rate), "health_reports_per_s": round(health_rate, 1),
+            "queries_per_s": round(query_rate)}
+
+
+def benchmark():
+    """Run the worker once per available loop / codec combination, each in a fresh interpreter"""
+    import itertools
+    import subprocess
+
+    loops = [name for name in ("asyncio", "uvloop") if _loop_module(name)[0] == name]
+    codecs = [name for name in ("json", "orjson", "msgspec") if _json_codec(name)[0] == name]
+    print(f"Backends available: loops {', '.join(loops)}; JSON codecs {', '.join(codecs)}")
+    baseline = None
+    for loop, codec in itertools.product(loops, codecs):
+        env = dict(os.environ, LOOP_BACKEND=loop, JSON_BACKEND=codec, METRICS_ENABLED="1")
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), "--bench-worker"], env=env,
+                                capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        if result.returncode != 0:
+            print(f"{loop:>8} + {codec:<8} failed: {result.stderr.strip().splitlines()[-1]}")
+            continue
+        rates = json.loads(result.stdout.strip().splitlines()[-1])
+        baseline = baseline or rates
+        print(f"{loop:>8} + {codec:<8} " + "   ".join(
+            f"{key} {value:>10,} ({value / baseline[key]:.2f}x)" for key, value in rates.items()))
+
+
+if __name__ == "__main__":
+    if "--bench-worker" in sys.argv:
+        print(json.dumps(_bench_worker()))
+    elif "--bench" in sys.argv:
+        benchmark()
+    else:
+        print(describe())
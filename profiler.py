@@ -0,0 +1,207 @@
+"""
+profiler.py
+On-demand sampling profiler for long-running processes (orchestrator.py, the admin panel)
+A daemon thread wakes every `interval` seconds, reads every other thread's current stack with
+sys._current_frames() and counts it; nothing is hooked into the profiled code, so the cost is
+the sampling thread's own CPU time and stops entirely when profiling stops
+Stacks are exported collapsed ("thread;file:function;... count"), the input format of
+flamegraph.pl and speedscope; tracemalloc snapshots give the top allocation sites
+Safe to leave reachable in production: runs stop on their own after PROFILE_MAX_SECONDS and
+the number of distinct stacks is capped
+Controlled through control(request), served as the orchestrator's "profile" query op and the
+admin panel's /api/profile endpoints
+Run `python profiler.py --bench` to measure the sampling overhead
+"""
+
+import os
+import sys
+import time
+import threading
+import tracemalloc
+
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.01"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+MAX_STACKS = 20000  # distinct stacks kept; later ones are counted under OTHER_STACK
+OTHER_STACK = "[other]"
+# Leaf frames of threads parked in a wait; left out unless idle stacks are requested
+IDLE_LEAVES = ("selectors.py:select", "threading.py:wait", "queue.py:get", "socket.py:accept")
+
+# The current (or last) run: {"started", "stopped", "interval", "idle", "samples", "stacks": {stack: count}}
+run = None
+sampler = None
+stop_event = threading.Event()
+lock = threading.Lock()
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+def _sample(current, idle):
+    own = threading.get_ident()
+    threads = {thread.ident: thread.name for thread in threading.enumerate()}
+    for ident, frame in sys._current_frames().items():
+        if ident == own:
+            continue
+        names = _collapse(frame)
+        if not idle and names and names[-1] in IDLE_LEAVES:
+            continue
+        stack = ";".join([threads.get(ident, str(ident))] + names)
+        stacks = current["stacks"]
+        if stack not in stacks and len(stacks) >= MAX_STACKS:
+            stack = OTHER_STACK
+        stacks[stack] = stacks.get(stack, 0) + 1
+    current["samples"] += 1
+
+
+def _sampling_loop(current, deadline):
+    while not stop_event.wait(current["interval"]):
+        with lock:
+            _sample(current, current["idle"])
+        if time.monotonic() >= deadline:
+            break
+    current["stopped"] = time.time()
+
+
+def start(interval=PROFILE_INTERVAL, duration=PROFILE_MAX_SECONDS, idle=False):
+    """Start a new run; a run already in progress is restarted"""
+    global run, sampler
+    stop()
+    interval = max(0.001, float(interval))
+    duration = min(float(duration), PROFILE_MAX_SECONDS)
+    run = {"started": time.time(), "stopped": None, "interval": interval, "duration": duration,
+           "idle": bool(idle), "samples": 0, "stacks": dict()}
+    stop_event.clear()
+    sampler = threading.Thread(target=_sampling_loop, args=(run, time.monotonic() + duration),
+                               name="profiler", daemon=True)
+    sampler.start()
+    return status()
+
+
+def stop():
+    if sampler is not None and sampler.is_alive():
+        stop_event.set()
+        sampler.join()
+    return status()
+
+
+def status():
+    if run is None:
+        return {"running": False}
+    return {"running": run["stopped"] is None, "started": run["started"], "stopped": run["stopped"],
+            "interval": run["interval"], "duration": run["duration"], "idle": run["idle"],
+            "samples": run["samples"], "stacks": len(run["stacks"]),
+            "memory_tracing": tracemalloc.is_tracing()}
+
+
+def collapsed():
+    """Stacks of the current (or last) run, one "frames count" line each"""
+    if run is None:
+        return ""
+    with lock:
+        stacks = sorted(run["stacks"].items(), key=lambda item: item[1], reverse=True)
+    return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+
+def top(limit=20):
+    """Functions by self samples (the leaf frame of a stack)"""
+    if run is None:
+        return []
+    counts = dict()
+    with lock:
+        for stack, count in run["stacks"].items():
+            leaf = stack.rpartition(";")[2]
+            counts[leaf] = counts.get(leaf, 0) + count
+    total = max(1, sum(counts.values()))
+    return [{"function": leaf, "samples": count, "percent": round(count / total * 100, 2)}
+            for leaf, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]]
+
+
+def memory_start(frames=1):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(max(1, int(frames)))
+    return memory(limit=0)
+
+
+def memory_stop():
+    tracemalloc.stop()
+    return {"tracing": False}
+
+
+def memory(limit=20):
+    """Top allocation sites since memory_start"""
+    if not tracemalloc.is_tracing():
+        return {"tracing": False}
+    current, peak = tracemalloc.get_traced_memory()
+    stats = tracemalloc.take_snapshot().statistics("lineno")[:max(0, int(limit))]
+    return {
+        "tracing": True,
+        "current_bytes": current,
+        "peak_bytes": peak,
+        "top": [{"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                 "bytes": stat.size, "count": stat.count} for stat in stats],
+    }
+
+
+# 'action' : handler(request) -> JSON-serializable result
+ACTIONS = {
+    "start": lambda request: start(request.get("interval", PROFILE_INTERVAL),
+                                   request.get("duration", PROFILE_MAX_SECONDS), request.get("idle", False)),
+    "stop": lambda request: stop(),
+    "status": lambda request: status(),
+    "collapsed": lambda request: collapsed(),
+    "top": lambda request: top(int(request.get("limit", 20))),
+    "memory_start": lambda request: memory_start(request.get("frames", 1)),
+    "memory": lambda request: memory(request.get("limit", 20)),
+    "memory_stop": lambda request: memory_stop(),
+}
+
+
+def control(request):
+    """Handle {"action": ..., options}; raises ValueError for unknown actions"""
+    handler = ACTIONS.get(request.get("action", "status"))
+    if handler is None:
+        raise ValueError(f"Unknown profiler action. Allowed actions: {', '.join(ACTIONS)}")
+    return handler(request)
+
+
+def benchmark(seconds=2.0, rounds=5):
+    """CPU-bound work with and without sampling at PROFILE_INTERVAL; the best round of each is compared"""
+    def work():
+        total = 0
+        deadline = time.perf_counter() + seconds
+        iterations = 0
+        while time.perf_counter() < deadline:
+            for i in range(1000):
+                total += i * i
+            iterations += 1
+        return iterations
+
+    best = {True: 0, False: 0}
+    for _ in range(rounds):
+        for profiling in (False, True):
+            if profiling:
+                start()
+            best[profiling] = max(best[profiling], work())
+            if profiling:
+                stop()
+    overhead = (best[False] - best[True]) / best[False] * 100
+    print(f"without profiler: {best[False] / seconds:,.0f} iterations/s")
+    print(f"with profiler:    {best[True] / seconds:,.0f} iterations/s ({run['samples']} samples in the last round)")
+    print(f"overhead at {PROFILE_INTERVAL * 1000:g} ms interval: {overhead:.2f}%")
+    return overhead
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        benchmark()
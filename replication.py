@@ -0,0 +1,209 @@
+"""
+replication.py
+Active/standby pair for the orchestrator on one host
+The primary (orchestrator.py with REPLICATION_PORT set) streams its state to the standby:
+a snapshot on connect, then every WAL entry (registrations, exits, expiries) and the
+heartbeat table a few times per second
+The standby keeps that state on disk; when the primary's connection drops and its ports stop
+answering, it takes the ports over and runs as the orchestrator with the replicated state
+Services keep their IDs: service_client.py retries while the ports change hands
+Usage: python replication.py --standby   |   python replication.py --test (measures failover time)
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import websockets
+
+from datetime import datetime
+from websockets.exceptions import WebSocketException
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import state_store
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+APP_URI = "ws://" + os.getenv("APP_HOST") + ":" + os.getenv("APP_PORT")
+HB_URI = "ws://" + os.getenv("HB_HOST") + ":" + os.getenv("HB_PORT")
+QS_URI = "ws://" + os.getenv("QS_HOST", "127.0.0.1") + ":" + os.getenv("QS_PORT", "3806")
+
+REPLICATION_HOST = os.getenv("REPLICATION_HOST", "127.0.0.1")
+REPLICATION_PORT = os.getenv("REPLICATION_PORT", "")
+HEALTH_SYNC_SECONDS = 0.25
+# Seconds without a primary before the standby takes over
+TAKEOVER_AFTER = float(os.getenv("TAKEOVER_AFTER", "0.5"))
+
+# One queue per connected standby
+standby_queues = set()
+
+
+def on_record(entry):
+    for queue in standby_queues:
+        queue.put_nowait({"type": "wal", "entry": entry})
+
+
+def standby_handler(get_state):
+    async def handler(ws):
+        queue = asyncio.Queue()
+        standby_queues.add(queue)
+        try:
+            await ws.send(json.dumps({"type": "snapshot", "state": get_state()}))
+            print("Standby orchestrator attached")
+            while True:
+                try:
+                    msg = await asyncio.wait_for(queue.get(), HEALTH_SYNC_SECONDS)
+                except asyncio.TimeoutError:
+                    msg = {"type": "health", "health": get_state()["health"]}
+                await ws.send(json.dumps(msg))
+        finally:
+            standby_queues.discard(queue)
+    return handler
+
+
+async def serve(get_state):
+    """Primary side: stream state to standbys on REPLICATION_PORT"""
+    state_store.LISTENERS.append(on_record)
+    async with websockets.serve(standby_handler(get_state), REPLICATION_HOST, REPLICATION_PORT):
+        await asyncio.Future()
+
+
+async def primary_alive():
+    try:
+        async with websockets.connect(APP_URI, open_timeout=0.5):
+            return True
+    except (OSError, WebSocketException, asyncio.TimeoutError):
+        return False
+
+
+async def follow():
+    """Standby side: mirror the primary's state until it is gone; returns the state to take over with"""
+    state = state_store.empty_state()
+    lost = time.monotonic()
+    while True:
+        try:
+            async with websockets.connect(f"ws://{REPLICATION_HOST}:{REPLICATION_PORT}",
+                                          ping_interval=0.5, ping_timeout=1) as ws:
+                print("Following the primary orchestrator")
+                lost = None
+                async for raw in ws:
+                    msg = json.loads(raw)
+                    if msg["type"] == "snapshot":
+                        state = msg["state"]
+                        state_store.snapshot(state)
+                    elif msg["type"] == "wal":
+                        entry = msg["entry"]
+                        state_store.apply(state, entry)
+                        state_store.record(entry["op"], **{key: value for key, value in entry.items()
+                                                           if key not in ("seq", "op", "ts")})
+                    else:
+                        state["health"] = msg["health"]
+        except (OSError, WebSocketException):
+            pass
+        if lost is None:
+            print("Lost the primary orchestrator")
+            lost = time.monotonic()
+        if time.monotonic() - lost >= TAKEOVER_AFTER and not await primary_alive():
+            return state
+        await asyncio.sleep(0.05)
+
+
+def run_standby():
+    if "STATE_DIR" not in os.environ:
+        state_store.use_dir(os.path.join(SCRIPT_DIR, ".state-standby"))
+    state = asyncio.run(follow())
+    state_store.snapshot(state)
+    print(f"Taking over as the primary orchestrator at {datetime.now().isoformat()}")
+
+    import orchestrator
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        asyncio.run(orchestrator.main())
+    finally:
+        state_store.snapshot(orchestrator.current_state())
+
+
+async def wait_until(check, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            result = await check()
+            if result:
+                return result
+        except (OSError, WebSocketException, asyncio.TimeoutError):
+            pass
+        await asyncio.sleep(0.01)
+    raise RuntimeError("Timed out")
+
+
+async def failover_test():
+    """Kill the primary while a service is registered; time until the standby answers with its state"""
+    async def register(msg):
+        async with websockets.connect(APP_URI, open_timeout=0.5) as ws:
+            await ws.send(msg)
+            return await ws.recv()
+
+    async def live_instances():
+        async with websockets.connect(QS_URI, open_timeout=0.5) as ws:
+            await ws.send(json.dumps({"op": "instances"}))
+            return json.loads(await ws.recv())["result"]["live"]
+
+    async def standby_synced():
+        # The standby stores the primary's snapshot as soon as it has connected
+        return os.path.exists(os.path.join(workdir, "standby", "snapshot.json"))
+
+    workdir = tempfile.mkdtemp(prefix="ha-test-")
+    env = dict(os.environ, PYTHONUNBUFFERED="1", REPLICATION_PORT=REPLICATION_PORT or "3906")
+    logs = [open(os.path.join(workdir, name), "w") for name in ("primary.txt", "standby.txt")]
+    primary = subprocess.Popen([sys.executable, os.path.join(SCRIPT_DIR, "orchestrator.py")], cwd=SCRIPT_DIR,
+                               env=dict(env, STATE_DIR=os.path.join(workdir, "primary")),
+                               stdout=logs[0], stderr=subprocess.STDOUT)
+    standby = None
+    try:
+        app_id = await wait_until(lambda: register("ha-test.py"))
+        standby = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--standby"], cwd=SCRIPT_DIR,
+                                   env=dict(env, STATE_DIR=os.path.join(workdir, "standby")),
+                                   stdout=logs[1], stderr=subprocess.STDOUT)
+        await wait_until(standby_synced)
+        async with websockets.connect(HB_URI) as ws:
+            await ws.send(f"[{app_id}] [INFO] [{datetime.now().isoformat()}] Heartbeat")
+        await asyncio.sleep(0.5)
+
+        primary.kill()
+        killed = time.monotonic()
+        live = await wait_until(live_instances)
+        failover = time.monotonic() - killed
+        reattached = await wait_until(lambda: register(f"ha-test.py {app_id}"))
+        print(f"Failover took {failover * 1000:.0f} ms (TAKEOVER_AFTER={TAKEOVER_AFTER}s)")
+        print(f"Registration replicated: {app_id in live}; service re-attached with the same ID: {reattached == app_id}")
+    finally:
+        for proc in (primary, standby):
+            if proc and proc.poll() is None:
+                proc.terminate()
+                proc.wait(timeout=10)
+        for log in logs:
+            log.close()
+        print(f"Process output in {workdir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Standby orchestrator and failover test")
+    parser.add_argument("--standby", action="store_true", help="follow the primary and take over when it fails")
+    parser.add_argument("--test", action="store_true", help="measure failover time with a local primary/standby pair")
+    args = parser.parse_args()
+
+    if not REPLICATION_PORT and not args.test:
+        sys.exit("REPLICATION_PORT is not set")
+    if args.standby:
+        run_standby()
+    elif args.test:
+        asyncio.run(failover_test())
+    else:
+        parser.print_help()
@@ -1,12 +1,54 @@
 """
 restore.py
 Removes some files / replaces them with the backed up code
+Rolls back files recorded in the backup store (see backup_store.py) non-interactively
 """
 
 import os
 import shutil
+import argparse
 from pathlib import Path
 
+import backup_store
+
+
+def print_history(filename):
+    """Print the recorded versions of a single file."""
+    history = backup_store.list_versions(filename)
+    if not history:
+        print(f"No versions recorded for {filename}.")
+        return
+    print(f"{'ID':<5} {'Hash':<14} {'Size':<8} {'Timestamp':<28} Reason")
+    print("-" * 70)
+    for entry in history:
+        print(f"{entry['id']:<5} {entry['sha256'][:12]:<14} {entry['size']:<8} {entry['timestamp']:<28} {entry['reason']}")
+
+
+def rollback(filename, version_id):
+    """Restore a single file to the given version. Returns True on success."""
+    entry = backup_store.restore_version(filename, version_id)
+    if entry is None:
+        print(f"  ✗ Version '{version_id}' not found for {filename}")
+        return False
+    print(f"  ✓ Restored: {filename} -> version {entry['id']} ({entry['sha256'][:12]})")
+    return True
+
+
+def restore_tracked_files():
+    """Restore every file in the backup store to its first (pre-remediation) version."""
+    files = backup_store.tracked_files()
+    if not files:
+        print("No files recorded in the backup store.")
+        return
+
+    print(f"Found {len(files)} tracked file(s):\n")
+    restored_count = sum(1 for filename in files if rollback(filename, 1))
+
+    print(f"\n{'='*50}")
+    print("Restoration complete!")
+    print(f"  Restored: {restored_count} file(s)")
+    print(f"{'='*50}")
+
 
 def restore_backup_files(directory='.'):
     """
@@ -58,35 +100,45 @@ def restore_backup_files(directory='.'):
             print(f"  ✗ Error restoring {backup_file.name}: {e}")
     
     print(f"\n{'='*50}")
-    print(f"Restoration complete!")
+    print("Restoration complete!")
     print(f"  Restored: {restored_count} file(s)")
     print(f"  Skipped: {skipped_count} file(s)")
     print(f"{'='*50}")
 
 
 if __name__ == "__main__":
-    import sys
-    print("Setting tmp1_py.txt to 'false' for testing purposes.")
-    with open("tmp1_py.txt", "w") as f:
-        f.write("false")
-    
-    # Allow specifying a directory as command-line argument
-    if len(sys.argv) > 1:
-        target_directory = sys.argv[1]
+    parser = argparse.ArgumentParser(description="Backup File Restoration Tool")
+    parser.add_argument("directory", nargs="?", default=".",
+                        help="directory to search for legacy .bkp files (with --legacy)")
+    parser.add_argument("--list", metavar="FILE", help="show the recorded versions of FILE")
+    parser.add_argument("--rollback", nargs=2, metavar=("FILE", "VERSION"),
+                        help="restore FILE to VERSION (numeric ID or hash prefix)")
+    parser.add_argument("--legacy", action="store_true",
+                        help="restore legacy .bkp files found under directory")
+    args = parser.parse_args()
+
+    if args.list:
+        print_history(args.list)
+    elif args.rollback:
+        rollback(*args.rollback)
     else:
-        target_directory = '.'
-    
-    print("=" * 50)
-    print("Backup File Restoration Tool")
-    print("=" * 50)
-    print(f"Searching for .bkp files in: {os.path.abspath(target_directory)}\n")
-    
-    restore_backup_files(target_directory)
+        print("Setting tmp1_py.txt to 'false' for testing purposes.")
+        with open("tmp1_py.txt", "w") as f:
+            f.write("false")
+
+        print("=" * 50)
+        print("Backup File Restoration Tool")
+        print("=" * 50)
+        if args.legacy:
+            print(f"Searching for .bkp files in: {os.path.abspath(args.directory)}\n")
+            restore_backup_files(args.directory)
+        else:
+            restore_tracked_files()
 
-    with open ("requirements.txt", "w") as f:
-        f.write("fastapi==0.120.4")
-        f.write("uvicorn==0.38.0")
-        f.write("packaging==25.0")
-        f.write("numpy==2.2.3")
+        with open ("requirements.txt", "w") as f:
+            f.write("fastapi==0.120.4")
+            f.write("uvicorn==0.38.0")
+            f.write("packaging==25.0")
+            f.write("numpy==2.2.3")
 
-    print("Restored req.txt")
\ No newline at end of file
+        print("Restored req.txt")
\ No newline at end of file
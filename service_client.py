@@ -0,0 +1,153 @@
+"""
+service_client.py
+Client side of the orchestrator protocol, shared by the services (1.py, 2.py, 3.py)
+Registers for an app ID, streams log lines and sends heartbeats in a background thread
+Keeps its ID across orchestrator restarts: once the orchestrator is reachable again the
+heartbeat thread re-attaches with 'name uuid' instead of registering as a new instance
+Connections are retried for CLIENT_RETRY_SECONDS, long enough for a standby orchestrator
+(replication.py) to take over the ports
+Log lines carry a trace field (tracing.py) so their latency can be followed hop by hop
+"""
+
+import os
+import json
+import time
+import asyncio
+import websockets
+
+from datetime import datetime
+from websockets.exceptions import WebSocketException
+from threading import Thread, Event
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import tracing
+
+WS_HOST = os.getenv("WS_HOST")
+WS_PORT = os.getenv("WS_PORT")
+
+APP_HOST = os.getenv("APP_HOST")
+APP_PORT = os.getenv("APP_PORT")
+
+HB_HOST = os.getenv("HB_HOST")
+HB_PORT = os.getenv("HB_PORT")
+
+APPSOCKET_URI = "ws://" + APP_HOST + ":" + APP_PORT
+WEBSOCKET_URI = "ws://" + WS_HOST + ":" + WS_PORT
+HB_URI = "ws://" + HB_HOST + ":" + HB_PORT
+
+HB_INTERVAL = float(os.getenv("HB_INTERVAL", "1"))
+CLIENT_RETRY_SECONDS = float(os.getenv("CLIENT_RETRY_SECONDS", "5"))
+
+APP_ID = "read-from-serv"
+APP_NAME = None
+
+hb_stop = Event()
+hb_thread = None
+
+CONNECTION_ERRORS = (OSError, WebSocketException)
+
+
+async def connect(uri):
+    """Open a websocket, retrying with backoff while the orchestrator is unreachable"""
+    deadline = time.monotonic() + CLIENT_RETRY_SECONDS
+    delay = 0.05
+    while True:
+        try:
+            return await websockets.connect(uri)
+        except OSError:
+            if time.monotonic() + delay > deadline:
+                raise
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1)
+
+
+async def register(app_id=None):
+    """
+    Ask the orchestrator for an ID, or re-attach with the one this process already has.
+    A sharded orchestrator (shard_router.py) answers with JSON naming the worker to stream
+    and heartbeat to; a single orchestrator answers with the bare ID.
+    """
+    global WEBSOCKET_URI
+    global HB_URI
+    async with await connect(APPSOCKET_URI) as ws:
+        await ws.send(f"{APP_NAME} {app_id}" if app_id else APP_NAME)
+        reply = await ws.recv()
+    if reply.startswith("{"):
+        shard = json.loads(reply)
+        WEBSOCKET_URI, HB_URI = shard["ws"], shard["hb"]
+        return shard["id"]
+    return reply
+
+
+async def send_heartbeats():
+    global APP_ID
+    attached = True
+    while not hb_stop.is_set():
+        try:
+            if not attached:
+                APP_ID = await register(APP_ID)
+                print(f"Re-attached to the orchestrator as {APP_ID}")
+                attached = True
+            async with websockets.connect(HB_URI) as ws:
+                hb_line = f"[{APP_ID}] [INFO] [{datetime.now().isoformat()}] Heartbeat"
+                await ws.send(hb_line)
+        except CONNECTION_ERRORS:
+            # Orchestrator down or restarting: keep trying and re-attach when it is back
+            attached = False
+        hb_stop.wait(HB_INTERVAL)
+
+
+def hb_thread_wrapper():
+    asyncio.run(send_heartbeats())
+
+
+def init(app_name):
+    global APP_ID
+    global APP_NAME
+    global hb_thread
+    APP_NAME = app_name
+    APP_ID = asyncio.run(register())
+    log(f"Application {APP_NAME} started with UUID: {APP_ID}")
+    hb_thread = Thread(target=hb_thread_wrapper, daemon=True)
+    hb_thread.start()
+
+
+async def rm_app_id():
+    async with await connect(HB_URI) as ws:
+        rm_line = f"[{APP_ID}] [INFO] [{datetime.now().isoformat()}] Exit"
+        await ws.send(rm_line)
+
+
+def deinit():
+    hb_stop.set()
+    if hb_thread:
+        hb_thread.join()
+    try:
+        asyncio.run(rm_app_id())
+    except CONNECTION_ERRORS:
+        print(f"Orchestrator not reachable; {APP_NAME} exits without deregistering")
+
+
+async def stream(log_line):
+    async with await connect(WEBSOCKET_URI) as ws:
+        await ws.send(f"[{APP_NAME}] {log_line}")
+
+
+def log(msg, sev="INFO", ts=None):
+    fields = f"[{sev}] [{ts or datetime.now().isoformat()}] "
+    try:
+        # The trace field times the line's hops to the dashboard (see tracing.py)
+        asyncio.run(stream(f"{fields}{tracing.stamp()}{msg}\n"))
+    except CONNECTION_ERRORS:
+        # Do not take the service down while the orchestrator restarts
+        print(f"[{APP_NAME}] {fields}{msg}")
+
+
+def info(msg):
+    log(msg, sev="INFO")
+
+
+def error(msg):
+    log(msg, sev="ERROR")
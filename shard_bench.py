@@ -0,0 +1,134 @@
+"""
+shard_bench.py
+Local multi-process harness for the sharded orchestrator (shard_router.py)
+For each shard count it starts the router, streams log lines from several client processes
+(each app on a persistent connection to the worker it was routed to) and measures how fast
+the workers ingest them, read back through the router's merged query port
+Stop any running orchestrator first: the harness uses the ports from .env
+Speedups are only reported for shard counts the host has usable CPUs for
+Usage: python shard_bench.py [--shards 1 2 4] [--clients 4] [--apps 4] [--lines 20000] [--timeout 120]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import websockets
+
+from datetime import datetime
+from multiprocessing import Process
+
+from dotenv import load_dotenv
+load_dotenv()
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+APPSOCKET_URI = "ws://" + os.getenv("APP_HOST") + ":" + os.getenv("APP_PORT")
+QS_URI = "ws://" + os.getenv("QS_HOST", "127.0.0.1") + ":" + os.getenv("QS_PORT", "3806")
+
+
+def usable_cpus():
+    """CPUs this process may run on (affinity / cgroup cpuset aware where the OS supports it)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+async def query(request):
+    async with websockets.connect(QS_URI) as ws:
+        await ws.send(json.dumps(request))
+        return json.loads(await ws.recv())
+
+
+async def wait_for_router(timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if (await query({"op": "search_stats"})).get("ok"):
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Router did not start")
+
+
+async def ingested():
+    """Documents indexed over every shard"""
+    result = (await query({"op": "search_stats"}))["result"]
+    return sum(stats["documents"] for stats in result.values())
+
+
+async def stream_app(app_name, lines):
+    async with websockets.connect(APPSOCKET_URI) as ws:
+        await ws.send(app_name)
+        shard = json.loads(await ws.recv())
+    async with websockets.connect(shard["ws"]) as ws:
+        for i in range(lines):
+            await ws.send(f"[{app_name}] [INFO] [{datetime.now().isoformat()}] bench line {i} request served\n")
+
+
+def client(index, apps, lines):
+    async def run():
+        await asyncio.gather(*(stream_app(f"bench-{index}-{app}.py", lines) for app in range(apps)))
+    asyncio.run(run())
+
+
+def run_one(shards, clients, apps, lines, timeout=120):
+    """Lines/s ingested over every shard; raises if they are not all indexed within `timeout` seconds"""
+    # A fresh state directory per run: restored state from an earlier run would inflate the document counts
+    state_dir = tempfile.mkdtemp(prefix="shard-bench-")
+    router = subprocess.Popen([sys.executable, os.path.join(SCRIPT_DIR, "shard_router.py"), "--shards", str(shards)],
+                              cwd=SCRIPT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              env=dict(os.environ, STATE_DIR=state_dir))
+    try:
+        asyncio.run(wait_for_router())
+        expected = clients * apps * lines
+        started = time.perf_counter()
+        procs = [Process(target=client, args=(index, apps, lines)) for index in range(clients)]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        deadline = time.perf_counter() + timeout
+        while True:
+            count = asyncio.run(ingested())
+            if count >= expected:
+                break
+            if router.poll() is not None:
+                raise RuntimeError(f"{shards} shard(s): router exited with {count} of {expected} lines indexed")
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"{shards} shard(s): only {count} of {expected} lines indexed after {timeout}s")
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        return expected / elapsed
+    finally:
+        router.terminate()
+        router.wait(timeout=10)
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure ingest throughput of the sharded orchestrator")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--apps", type=int, default=4, help="apps per client")
+    parser.add_argument("--lines", type=int, default=20000, help="lines per app")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for every line to be indexed")
+    args = parser.parse_args()
+
+    cpus = usable_cpus()
+    print(f"{cpus} usable CPU(s); {args.clients} clients x {args.apps} apps x {args.lines} lines")
+    if cpus < max(args.shards):
+        print(f"Shard counts above {cpus} share CPUs: their throughput is shown without a speedup, "
+              f"run on a host with at least {max(args.shards)} CPUs to measure scaling")
+    baseline = None
+    for shards in args.shards:
+        rate = run_one(shards, args.clients, args.apps, args.lines, args.timeout)
+        baseline = baseline or rate
+        scaling = f"({rate / baseline:.2f}x)" if shards <= cpus else f"(no speedup: {cpus} CPU(s))"
+        print(f"{shards} shard(s): {rate:>10,.0f} lines/s  {scaling}")
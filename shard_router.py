@@ -0,0 +1,285 @@
+"""
+shard_router.py
+Sharded mode of the orchestrator: runs N orchestrator.py workers and routes services to them
+Apps are placed on a consistent hash ring by name, so every instance and every log line of an app
+lands on the same worker and adding a worker only moves a fraction of the apps
+The router owns the registration port (it replies with the worker's stream / heartbeat URIs,
+which service_client.py follows) and the query port (it fans requests out and merges the results)
+Workers report health to the router, which forwards one merged view to the health monitor
+Usage: python shard_router.py [--shards N]
+"""
+
+import os
+import sys
+import time
+import signal
+import asyncio
+import hashlib
+import argparse
+import subprocess
+import websockets
+
+from bisect import bisect
+from datetime import datetime
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import metrics
+import tracing
+import perf_backend
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+WS_HOST = os.getenv("WS_HOST")
+APP_HOST = os.getenv("APP_HOST")
+APP_PORT = os.getenv("APP_PORT")
+HB_HOST = os.getenv("HB_HOST")
+HS_HM_HOST = os.getenv("HS_HM_HOST")
+HS_HM_PORT = os.getenv("HS_HM_PORT")
+QS_HOST = os.getenv("QS_HOST", "127.0.0.1")
+QS_PORT = os.getenv("QS_PORT", "3806")
+
+HS_HM_URI = "ws://" + HS_HM_HOST + ":" + HS_HM_PORT
+
+ORCHESTRATOR_SHARDS = int(os.getenv("ORCHESTRATOR_SHARDS", "2"))
+# Worker i listens on every base port + SHARD_PORT_STEP * (i + 1)
+SHARD_PORT_STEP = int(os.getenv("SHARD_PORT_STEP", "10"))
+RING_VNODES = 64  # points per worker on the hash ring
+
+SHARDED_PORTS = ["WS_PORT", "APP_PORT", "HB_PORT", "QS_PORT", "HS_HM_PORT"]
+# Other ports of the deployment a worker port must not land on
+RESERVED_PORTS = ["HS_PORT", "REPLICATION_PORT"]
+
+workers = []
+# Points of the hash ring: sorted hashes and the worker owning each
+ring_hashes = []
+ring_shards = []
+# Latest health report of every worker: shard : {"timestamp", "apps"}
+shard_health = dict()
+
+
+def shard_port(var, shard):
+    return str(int(os.getenv(var)) + SHARD_PORT_STEP * (shard + 1))
+
+
+def check_ports(shards):
+    """Raise ValueError when a worker port collides with a base port or another worker's port"""
+    owners = dict()
+    used = [(var, None, os.getenv(var)) for var in SHARDED_PORTS + RESERVED_PORTS if os.getenv(var)]
+    used += [(var, shard, shard_port(var, shard)) for shard in range(shards) for var in SHARDED_PORTS]
+    for var, shard, port in used:
+        owner = f"{var} of shard {shard}" if shard is not None else var
+        if port in owners:
+            raise ValueError(f"Port {port} would be both {owners[port]} and {owner}; "
+                             f"choose a SHARD_PORT_STEP that keeps {shards} shard(s) clear of the other ports")
+        owners[port] = owner
+
+
+def shard_env(shard):
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    for var in SHARDED_PORTS:
+        env[var] = shard_port(var, shard)
+    # Inside the router's own state directory, so benchmarks with a scratch STATE_DIR stay out of .state
+    env["STATE_DIR"] = os.path.join(os.getenv("STATE_DIR", ".state"), f"shard-{shard}")
+    env["ERROR_LOG_STREAM"] = f"log-shard-{shard}"
+    env["REPLICATION_PORT"] = ""  # workers run without a standby
+    env["SHARD"] = str(shard)  # labels the worker's metrics
+    # Workers report health to the router, which merges the views
+    env["HS_HM_HOST"] = "127.0.0.1"
+    return env
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+def build_ring(shards):
+    points = sorted((_hash(f"shard-{shard}-{vnode}"), shard)
+                    for shard in range(shards) for vnode in range(RING_VNODES))
+    ring_hashes[:] = [point for point, _ in points]
+    ring_shards[:] = [shard for _, shard in points]
+
+
+def shard_for(app_name):
+    return ring_shards[bisect(ring_hashes, _hash(app_name)) % len(ring_hashes)]
+
+
+def start_workers(shards):
+    orchestrator_path = os.path.join(SCRIPT_DIR, "orchestrator.py")
+    for shard in range(shards):
+        workers.append(subprocess.Popen([sys.executable, orchestrator_path], cwd=SCRIPT_DIR, env=shard_env(shard)))
+        print(f"Started orchestrator shard {shard} (pid {workers[-1].pid}, "
+              f"ports {', '.join(shard_port(var, shard) for var in SHARDED_PORTS)})")
+
+
+def stop_workers():
+    for proc in workers:
+        if proc.poll() is None:
+            proc.terminate()
+    for proc in workers:
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+async def wait_for_workers(timeout=15):
+    """Wait until every worker accepts connections on its query port"""
+    deadline = time.time() + timeout
+    for shard in range(len(workers)):
+        while True:
+            try:
+                async with websockets.connect(f"ws://{QS_HOST}:{shard_port('QS_PORT', shard)}"):
+                    break
+            except OSError:
+                if time.time() > deadline:
+                    raise RuntimeError(f"Orchestrator shard {shard} did not start")
+                await asyncio.sleep(0.1)
+
+
+async def register_handler(ws):
+    """Forward a registration to the app's worker and tell the service where to stream and heartbeat"""
+    msg = await ws.recv()
+    shard = shard_for(msg.strip().partition(" ")[0])
+    async with websockets.connect(f"ws://{APP_HOST}:{shard_port('APP_PORT', shard)}") as worker:
+        await worker.send(msg)
+        app_id = await worker.recv()
+    await ws.send(perf_backend.dumps({
+        "id": app_id,
+        "shard": shard,
+        "ws": f"ws://{WS_HOST}:{shard_port('WS_PORT', shard)}",
+        "hb": f"ws://{HB_HOST}:{shard_port('HB_PORT', shard)}",
+    }))
+
+
+def health_handler_for(shard):
+    async def handler(ws):
+        async for msg in ws:
+            shard_health[shard] = perf_backend.loads(msg)
+    return handler
+
+
+def merged_health():
+    return {"timestamp": datetime.now().isoformat(),
+            "apps": [app for report in shard_health.values() for app in report.get("apps", [])]}
+
+
+async def report_health():
+    while True:
+        try:
+            async with websockets.connect(HS_HM_URI) as ws:
+                await ws.send(perf_backend.dumps(merged_health()))
+        except OSError:
+            pass  # health monitor not running
+        await asyncio.sleep(1)
+
+
+async def shard_request(shard, request):
+    async with websockets.connect(f"ws://{QS_HOST}:{shard_port('QS_PORT', shard)}") as ws:
+        await ws.send(perf_backend.dumps(request))
+        return perf_backend.loads(await ws.recv())
+
+
+def merge_logs(request, results):
+    records = sorted((record for result in results for record in result), key=lambda record: record["received"])
+    return records[-int(request.get("limit", 200)):]
+
+
+def merge_search(request, results):
+    offset, limit = int(request.get("offset", 0)), int(request.get("limit", 50))
+    hits = sorted((hit for result in results for hit in result["hits"]),
+                  key=lambda hit: hit["received"], reverse=True)
+    return {
+        "hits": hits[offset:offset + limit],
+        "offset": offset,
+        "limit": limit,
+        "has_more": len(hits) > offset + limit or any(result["has_more"] for result in results),
+        "took_ms": max(result["took_ms"] for result in results),
+    }
+
+
+def merge_dicts(request, results):
+    merged = {}
+    for result in results:
+        merged.update(result)
+    return merged
+
+
+def merge_instances(request, results):
+    return {"live": merge_dicts(request, [result["live"] for result in results]),
+            "tombstones": sorted((t for result in results for t in result["tombstones"]),
+                                 key=lambda tombstone: tombstone["expired"])}
+
+
+def merge_metrics(request, results):
+    return metrics.merge_texts(results)
+
+
+def merge_traces(request, results):
+    return tracing.merge(results)
+
+
+# How results of each query op are combined; other ops return one result per shard
+MERGERS = {
+    "logs": merge_logs,
+    "search": merge_search,
+    "log_stats": merge_dicts,
+    "instances": merge_instances,
+    "metrics": merge_metrics,
+    "traces": merge_traces,
+}
+
+
+async def query_handler(ws):
+    """Same protocol as the orchestrator's query port, answered by every worker"""
+    async for msg in ws:
+        try:
+            request = perf_backend.loads(msg)
+            forwarded = dict(request)
+            if request.get("op") == "search":
+                # Every shard returns enough hits to fill the requested page on its own
+                forwarded["offset"] = 0
+                forwarded["limit"] = int(request.get("offset", 0)) + int(request.get("limit", 50))
+            responses = await asyncio.gather(*(shard_request(shard, forwarded)
+                                               for shard in range(len(workers))))
+            failed = [response for response in responses if not response.get("ok")]
+            if failed:
+                response = failed[0]
+            else:
+                results = [response["result"] for response in responses]
+                merger = MERGERS.get(request.get("op"))
+                result = merger(request, results) if merger else {f"shard-{shard}": r for shard, r in enumerate(results)}
+                response = {"ok": True, "result": result}
+        except Exception as e:
+            response = {"ok": False, "error": str(e)}
+        await ws.send(perf_backend.dumps(response))
+
+
+async def main(shards):
+    build_ring(shards)
+    # Health listeners first: workers start reporting as soon as they are up
+    for shard in range(shards):
+        await websockets.serve(health_handler_for(shard), "127.0.0.1", shard_port("HS_HM_PORT", shard))
+    start_workers(shards)
+    await wait_for_workers()
+    await websockets.serve(register_handler, APP_HOST, APP_PORT)
+    await websockets.serve(query_handler, QS_HOST, QS_PORT)
+    print(f"Router ready: {shards} shard(s), registrations on {APP_PORT}, queries on {QS_PORT}")
+    await report_health()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the orchestrator as N sharded worker processes")
+    parser.add_argument("--shards", type=int, default=ORCHESTRATOR_SHARDS)
+    args = parser.parse_args()
+    try:
+        check_ports(args.shards)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        perf_backend.run(main(args.shards))
+    finally:
+        stop_workers()
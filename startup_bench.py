@@ -0,0 +1,116 @@
+"""
+startup_bench.py
+Cold-start benchmark of every entry point, based on `python -X importtime`
+Each entry point is loaded in a fresh interpreter (its __main__ block is not run), several
+times; the median wall time of the process and of its imports is compared with the import
+budget below and with startup_baseline.json (written with --save-baseline)
+The slowest top-level imports are listed so a new heavy dependency is easy to spot
+Exit code 1 when an entry point is over budget or slower than the baseline by more than --tolerance
+Usage: python startup_bench.py [--runs 5] [--save-baseline] [entry points...]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+from datetime import datetime
+from statistics import median
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(SCRIPT_DIR, "startup_baseline.json")
+
+# Import time budget per entry point in milliseconds (warm page cache)
+STARTUP_BUDGET_MS = {
+    "1.py": 250,
+    "2.py": 250,
+    "3.py": 250,
+    "orchestrator.py": 300,
+    "AiAgent.py": 150,
+    "main.py": 900,
+    "shard_router.py": 300,
+}
+
+# Runs the module level of a script without its __main__ block
+LOADER = ("import importlib.util, sys; sys.path.insert(0, {dir!r}); "
+          "spec = importlib.util.spec_from_file_location('entry_point', {path!r}); "
+          "spec.loader.exec_module(importlib.util.module_from_spec(spec))")
+
+
+def parse_importtime(stderr):
+    """(total import ms, {top-level module: cumulative ms}) from -X importtime output"""
+    top = dict()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two more spaces per level
+        if not name.startswith("  "):
+            top[name.strip()] = int(cumulative) / 1000
+    return sum(top.values()), top
+
+
+def measure(entry_point, runs):
+    path = os.path.join(SCRIPT_DIR, entry_point)
+    command = [sys.executable, "-X", "importtime", "-c", LOADER.format(dir=SCRIPT_DIR, path=path)]
+    walls, imports, tops = [], [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(command, cwd=SCRIPT_DIR, capture_output=True, text=True,
+                                stdin=subprocess.DEVNULL, timeout=60)
+        walls.append((time.perf_counter() - started) * 1000)
+        if result.returncode != 0:
+            raise RuntimeError(f"{entry_point} failed to load:\n{result.stderr.splitlines()[-1]}")
+        total, top = parse_importtime(result.stderr)
+        imports.append(total)
+        tops.append(top)
+    # Slowest imports of the median run
+    slowest = sorted(tops[imports.index(sorted(imports)[len(imports) // 2])].items(),
+                     key=lambda item: item[1], reverse=True)[:5]
+    return {"wall_ms": round(median(walls), 1), "import_ms": round(median(imports), 1)}, slowest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cold-start time of each entry point")
+    parser.add_argument("entry_points", nargs="*", default=list(STARTUP_BUDGET_MS))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown against the baseline")
+    parser.add_argument("--save-baseline", action="store_true", help=f"store the results in {os.path.basename(BASELINE_FILE)}")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, "r") as f:
+            baseline = json.load(f)["results"]
+
+    print(f"Python {sys.version.split()[0]}, median of {args.runs} runs")
+    results, failures = dict(), []
+    for entry_point in args.entry_points:
+        result, slowest = measure(entry_point, args.runs)
+        results[entry_point] = result
+        budget = STARTUP_BUDGET_MS.get(entry_point)
+        line = f"{entry_point:<18} wall {result['wall_ms']:>7.1f} ms   imports {result['import_ms']:>7.1f} ms"
+        if budget:
+            line += f" / {budget} ms budget"
+            if result["import_ms"] > budget:
+                line += "  OVER BUDGET"
+                failures.append(entry_point)
+        old = baseline.get(entry_point)
+        if old:
+            change = (result["import_ms"] - old["import_ms"]) / old["import_ms"]
+            line += f"   {change:+.0%} vs baseline"
+            if change > args.tolerance:
+                line += "  REGRESSION"
+                failures.append(entry_point)
+        print(line)
+        print("    slowest: " + ", ".join(f"{name} {ms:.1f}" for name, ms in slowest))
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump({"recorded": datetime.now().isoformat(), "python": sys.version.split()[0], "results": results},
+                      f, indent=2)
+        print(f"Baseline saved to {BASELINE_FILE}")
+    elif failures:
+        sys.exit(1)
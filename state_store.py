@@ -0,0 +1,121 @@
+"""
+state_store.py
+Durable orchestrator state: a periodic compact snapshot plus a write-ahead log
+Registrations, exits and expiries are appended to the WAL as they happen; snapshots also capture the
+last heartbeat of every instance and let the WAL be truncated
+On start the orchestrator loads the snapshot and replays the WAL entries newer than it,
+so a restart keeps every registered service and its UUID
+"""
+
+import os
+import json
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_DIR = os.path.join(SCRIPT_DIR, os.getenv("STATE_DIR", ".state"))
+SNAPSHOT_FILE = os.path.join(STATE_DIR, "snapshot.json")
+WAL_FILE = os.path.join(STATE_DIR, "wal.jsonl")
+STATE_FSYNC = os.getenv("STATE_FSYNC", "0") == "1"  # fsync every WAL entry (survives power loss, slower)
+
+# Sequence number of the last WAL entry written (or loaded)
+seq = 0
+wal = None
+# Called with every WAL entry once it is written (replication.py streams them to a standby)
+LISTENERS = []
+
+
+def use_dir(path):
+    """Keep state in another directory (a standby next to its primary on the same host)"""
+    global STATE_DIR, SNAPSHOT_FILE, WAL_FILE, wal
+    STATE_DIR = path
+    SNAPSHOT_FILE = os.path.join(STATE_DIR, "snapshot.json")
+    WAL_FILE = os.path.join(STATE_DIR, "wal.jsonl")
+    if wal:
+        wal.close()
+        wal = None
+
+
+def empty_state():
+    """'apps' : {'app_name' : [app_id, ...]}, 'health' : {'app_id' : last heartbeat ts}"""
+    return {"apps": {}, "health": {}}
+
+
+def apply(state, entry):
+    """Replay one WAL entry onto a state dict"""
+    if entry["op"] == "register":
+        ids = state["apps"].setdefault(entry["name"], [])
+        if entry["id"] not in ids:
+            ids.append(entry["id"])
+    elif entry["op"] == "exit":
+        state["health"].pop(entry["id"], None)
+    elif entry["op"] == "expire":
+        state["health"].pop(entry["id"], None)
+        for name, ids in list(state["apps"].items()):
+            if entry["id"] in ids:
+                ids.remove(entry["id"])
+            if not ids:
+                del state["apps"][name]
+
+
+def load():
+    """Latest snapshot with the newer WAL entries applied; returns (state, stats)"""
+    global seq
+    started = time.perf_counter()
+    state, replayed = empty_state(), 0
+    try:
+        with open(SNAPSHOT_FILE, "r") as f:
+            snapshot = json.load(f)
+        state = snapshot["state"]
+        seq = snapshot["seq"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        seq = 0
+
+    try:
+        with open(WAL_FILE, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # torn last write
+                # Entries at or below the snapshot's seq are already in it
+                if entry["seq"] > seq:
+                    apply(state, entry)
+                    seq = entry["seq"]
+                    replayed += 1
+    except FileNotFoundError:
+        pass
+
+    return state, {"replayed": replayed, "seq": seq,
+                   "ms": round((time.perf_counter() - started) * 1000, 2)}
+
+
+def record(op, **fields):
+    """Append one entry to the WAL before the change is acknowledged"""
+    global seq, wal
+    if wal is None:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        wal = open(WAL_FILE, "a")
+    seq += 1
+    entry = {"seq": seq, "op": op, "ts": time.time(), **fields}
+    wal.write(json.dumps(entry) + "\n")
+    wal.flush()
+    if STATE_FSYNC:
+        os.fsync(wal.fileno())
+    for listener in LISTENERS:
+        listener(entry)
+
+
+def snapshot(state):
+    """Write the full state atomically, then truncate the WAL it covers"""
+    global wal
+    os.makedirs(STATE_DIR, exist_ok=True)
+    tmp_path = SNAPSHOT_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"seq": seq, "taken": time.time(), "state": state}, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, SNAPSHOT_FILE)
+    # A crash before this point only leaves WAL entries the snapshot already covers
+    if wal:
+        wal.close()
+    wal = open(WAL_FILE, "w")
@@ -0,0 +1,357 @@
+"""
+supervisor.py
+Starts and supervises the services of the PoC from main.py's event loop
+Uses asyncio subprocesses (no shell, no extra terminals) so it runs on Windows and Linux
+Tracks PIDs, captures stdout/stderr of every service into a per-service buffer
+Restarts crashed services with exponential backoff and gives up on crash loops
+Services that listen on a port are probed until they accept connections; callers wait for that
+(wait_ready) instead of sleeping for a fixed time
+"""
+
+import os
+import asyncio
+import time
+
+from collections import deque
+from datetime import datetime
+
+import log_archive
+from venvs import service_python
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+RESTART_BACKOFF = float(os.getenv("RESTART_BACKOFF", "0.5"))  # first restart delay in seconds
+RESTART_BACKOFF_MAX = float(os.getenv("RESTART_BACKOFF_MAX", "30"))
+CRASH_LOOP_LIMIT = int(os.getenv("CRASH_LOOP_LIMIT", "5"))  # crashes within the window below
+CRASH_LOOP_WINDOW = float(os.getenv("CRASH_LOOP_WINDOW", "60"))
+STOP_TIMEOUT = 5
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", "30"))  # seconds a service may take to accept connections
+READY_POLL = 0.05
+PROMPT_DELAY = 0.2  # seconds of silence after a partial line before it is shown as a prompt
+OUTPUT_LINES = 1000  # captured lines kept per service
+
+# Service definitions: 'name' : {"scripts": [...], "restart": "always" | "on-failure" | "never", ...}
+#   scripts     - python scripts run in order; the run stops at the first one that fails
+#   restart     - "always" replaces the Code1.bat loop, "on-failure" only restarts non-zero exits
+#   interactive - stdin is a pipe fed by send_input() (/api/services/<name>/input, /ws/jobs/<id>);
+#                 prompts (output without a newline) are captured once the service waits for input
+#   archive     - optional log_archive stream that also receives the captured output
+#   smoke       - how fleet_check.py validates the service against a candidate environment:
+#                 timeout in seconds, whether still running at the timeout counts as a pass
+#                 (long-running services), stdin to feed it and files ({name: content}) to seed
+#                 its scratch working directory with (fleet_check.py never uses the real ones)
+#   ready       - (host, port) environment variables of the port that accepts connections once the
+#                 service is ready; services without it are ready as soon as they are started
+SERVICES = {
+    "orchestrator.py": {"scripts": ["orchestrator.py"], "restart": "on-failure", "archive": "orchestrator",
+                        "ready": ("QS_HOST", "QS_PORT")},
+    "shard_router.py": {"scripts": ["shard_router.py"], "restart": "on-failure", "archive": "orchestrator",
+                        "ready": ("QS_HOST", "QS_PORT")},
+    "1.py": {"scripts": ["1.py"], "restart": "always",
+             "smoke": {"timeout": 10, "pass_on_timeout": True, "files": {"tmp1_py.txt": "true"}}},
+    "2.py": {"scripts": ["2.py"], "restart": "never", "interactive": True,
+             "smoke": {"timeout": 10, "stdin": "6\n3\n"}},
+    "3.py": {"scripts": ["3.py"], "restart": "never",
+             "smoke": {"timeout": 30}},
+    "upgrade_checker.py": {"scripts": ["upgrade_checker.py"], "restart": "never"},
+    "health_websocket_simulator.py": {"scripts": ["health_websocket_simulator.py"], "restart": "never"},
+    "UpdateChecker.bat": {"scripts": ["upgrade_checker.py", "auto_update.py"], "restart": "never"},
+}
+
+# Runtime state: 'name' : dict (see _new_state)
+STATE = dict()
+
+
+def _new_state():
+    return {
+        "status": "stopped",
+        "pid": None,
+        "started": None,
+        "exit_code": None,
+        "restarts": 0,
+        "crashes": deque(maxlen=CRASH_LOOP_LIMIT),  # monotonic timestamps of recent crashes
+        "output": deque(maxlen=OUTPUT_LINES),       # (stream, line) tuples
+        "subscribers": set(),                       # asyncio.Queue per live reader
+        "proc": None,
+        "task": None,
+        "stopping": False,
+        "ready": False,
+        "ready_seconds": None,                      # from spawn to accepting connections
+        "ready_event": asyncio.Event(),
+    }
+
+
+def _emit(name, stream, line):
+    """Record one captured line and hand it to every subscriber of the service."""
+    state = STATE[name]
+    state["output"].append((stream, line))
+    for queue in state["subscribers"]:
+        queue.put_nowait((stream, line))
+
+
+def _capture(name, stream_name, raw, archive):
+    line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+    _emit(name, stream_name, line)
+    if archive:
+        log_archive.append(archive, line)
+
+
+async def _pump(name, stream_name, reader, archive, prompts=False):
+    """Capture output line by line; with prompts, a partial line followed by PROMPT_DELAY of silence too"""
+    pending = b""
+    while True:
+        if prompts and pending:
+            try:
+                chunk = await asyncio.wait_for(reader.read(65536), PROMPT_DELAY)
+            except asyncio.TimeoutError:
+                _capture(name, stream_name, pending, archive)
+                pending = b""
+                continue
+        else:
+            chunk = await reader.read(65536)
+        if not chunk:
+            break
+        *lines, pending = (pending + chunk).split(b"\n")
+        for raw in lines:
+            _capture(name, stream_name, raw, archive)
+    if pending:
+        _capture(name, stream_name, pending, archive)
+
+
+async def _probe_ready(name, spec, proc):
+    """Mark the service ready once its port accepts a connection (or give up when it exits or times out)"""
+    host_var, port_var = spec["ready"]
+    if not os.getenv(port_var):
+        _set_ready(name, 0)  # nothing to probe
+        return
+    host, port = os.getenv(host_var, "127.0.0.1"), int(os.getenv(port_var))
+    started = time.monotonic()
+    while proc.returncode is None and time.monotonic() - started < READY_TIMEOUT:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            await asyncio.sleep(READY_POLL)
+            continue
+        writer.close()
+        seconds = time.monotonic() - started
+        _set_ready(name, seconds)
+        _emit(name, "supervisor", f"ready after {seconds:.2f}s")
+        return
+    if proc.returncode is None:
+        _emit(name, "supervisor", f"not accepting connections on {host}:{port} after {READY_TIMEOUT:.0f}s")
+
+
+def _set_ready(name, seconds):
+    state = STATE[name]
+    state.update(ready=True, ready_seconds=round(seconds, 3))
+    state["ready_event"].set()
+
+
+async def wait_ready(name, timeout=READY_TIMEOUT):
+    """Wait until a started service is ready; False if it is not within timeout"""
+    state = STATE.get(name)
+    if not state:
+        return False
+    try:
+        await asyncio.wait_for(state["ready_event"].wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+async def _run_once(name, spec):
+    """Run the scripts of a service once and return the exit code of the last one run."""
+    state = STATE[name]
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    archive = spec.get("archive")
+
+    try:
+        returncode = 0
+        for script in spec["scripts"]:
+            proc = await asyncio.create_subprocess_exec(
+                service_python(), os.path.join(SCRIPT_DIR, script),
+                cwd=SCRIPT_DIR,
+                env=env,
+                stdin=asyncio.subprocess.PIPE if spec.get("interactive") else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            state.update(proc=proc, pid=proc.pid, status="running", started=datetime.now().isoformat(),
+                         ready=False, ready_seconds=None)
+            state["ready_event"].clear()
+            _emit(name, "supervisor", f"started {script} (pid {proc.pid})")
+            probe = asyncio.create_task(_probe_ready(name, spec, proc)) if spec.get("ready") else None
+            if probe is None:
+                _set_ready(name, 0)
+
+            await asyncio.gather(
+                _pump(name, "stdout", proc.stdout, archive, prompts=spec.get("interactive", False)),
+                _pump(name, "stderr", proc.stderr, archive),
+            )
+            returncode = await proc.wait()
+            if probe is not None:
+                probe.cancel()
+            _emit(name, "supervisor", f"{script} exited with code {returncode}")
+            if returncode != 0 or state["stopping"]:
+                break
+        return returncode
+    finally:
+        state["proc"] = None
+        state["pid"] = None
+        state["ready"] = False
+        state["ready_event"].clear()
+
+
+async def _supervise(name):
+    spec = SERVICES[name]
+    state = STATE[name]
+    backoff = RESTART_BACKOFF
+
+    while True:
+        started = time.monotonic()
+        returncode = await _run_once(name, spec)
+        state["exit_code"] = returncode
+
+        if state["stopping"]:
+            state["status"] = "stopped"
+            return
+
+        crashed = returncode != 0
+        if crashed:
+            state["crashes"].append(time.monotonic())
+        if spec["restart"] == "never" or (spec["restart"] == "on-failure" and not crashed):
+            state["status"] = "crashed" if crashed else "exited"
+            return
+
+        # CRASH_LOOP_LIMIT crashes inside the window: stop restarting until someone intervenes
+        crashes = state["crashes"]
+        if len(crashes) == CRASH_LOOP_LIMIT and crashes[-1] - crashes[0] <= CRASH_LOOP_WINDOW:
+            state["status"] = "crash-loop"
+            _emit(name, "supervisor", f"{len(crashes)} crashes within {CRASH_LOOP_WINDOW:.0f}s, giving up")
+            return
+
+        # A run that stayed up for a while resets the backoff
+        if time.monotonic() - started > CRASH_LOOP_WINDOW:
+            backoff = RESTART_BACKOFF
+
+        state["status"] = "backoff"
+        _emit(name, "supervisor", f"restarting in {backoff:.1f}s")
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+        state["restarts"] += 1
+
+
+async def start(name):
+    """Start a service unless it is already running. Returns its status."""
+    if name not in SERVICES:
+        raise KeyError(name)
+    state = STATE.setdefault(name, _new_state())
+    if state["task"] and not state["task"].done():
+        return service_status(name)
+
+    state["stopping"] = False
+    state["crashes"].clear()
+    state["status"] = "starting"
+    state["task"] = asyncio.create_task(_supervise(name))
+    # Give the process a chance to spawn so callers get a PID back
+    for _ in range(20):
+        if state["pid"] or state["task"].done():
+            break
+        await asyncio.sleep(0.01)
+    return service_status(name)
+
+
+async def stop(name):
+    """Stop a service and its restart loop. Returns its status."""
+    state = STATE.get(name)
+    if not state or not state["task"]:
+        return service_status(name)
+
+    state["stopping"] = True
+    proc = state["proc"]
+    if proc and proc.returncode is None:
+        proc.terminate()
+        try:
+            await asyncio.wait_for(proc.wait(), STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            proc.kill()
+    if state["status"] == "backoff":
+        state["task"].cancel()
+    try:
+        await state["task"]
+    except asyncio.CancelledError:
+        pass
+    state["status"] = "stopped"
+    return service_status(name)
+
+
+async def send_input(name, text):
+    """Write a line to the stdin of a running interactive service; raises ValueError otherwise"""
+    if not SERVICES.get(name, {}).get("interactive"):
+        raise ValueError(f"{name} does not take input")
+    proc = STATE.get(name, {}).get("proc")
+    if proc is None or proc.stdin is None or proc.returncode is not None:
+        raise ValueError(f"{name} is not running")
+    line = text.rstrip("\r\n")
+    _emit(name, "stdin", line)
+    proc.stdin.write((line + "\n").encode("utf-8"))
+    await proc.stdin.drain()
+
+
+async def wait_exit(name):
+    """Wait until a service's supervision ends (it exited for good, crash-looped or was stopped). Returns its status."""
+    state = STATE.get(name)
+    if state and state["task"]:
+        try:
+            await asyncio.shield(state["task"])
+        except asyncio.CancelledError:
+            if not state["task"].cancelled():
+                raise
+    return service_status(name)
+
+
+async def restart(name):
+    await stop(name)
+    return await start(name)
+
+
+async def stop_all():
+    await asyncio.gather(*(stop(name) for name in list(STATE)))
+
+
+def service_status(name):
+    state = STATE.get(name) or _new_state()
+    return {
+        "name": name,
+        "status": state["status"],
+        "pid": state["pid"],
+        "started": state["started"],
+        "exit_code": state["exit_code"],
+        "ready": state["ready"],
+        "ready_seconds": state["ready_seconds"],
+        "restarts": state["restarts"],
+        "restart_policy": SERVICES[name]["restart"],
+    }
+
+
+def status():
+    return {name: service_status(name) for name in SERVICES}
+
+
+def recent_output(name, lines=200):
+    """Return the last captured lines of a service as (stream, line) tuples."""
+    state = STATE.get(name)
+    if not state:
+        return []
+    return list(state["output"])[-lines:]
+
+
+def subscribe(name):
+    """Return a queue that receives every line captured from now on."""
+    queue = asyncio.Queue()
+    STATE.setdefault(name, _new_state())["subscribers"].add(queue)
+    return queue
+
+
+def unsubscribe(name, queue):
+    STATE.get(name, _new_state())["subscribers"].discard(queue)
@@ -0,0 +1,79 @@
+"""
+test_upgrade_bisect.py
+Bisection of upgrade_bisect.py driven by a fake fleet test instead of real installs
+Run with: python -m pytest test_upgrade_bisect.py (or python -m unittest test_upgrade_bisect)
+"""
+
+import unittest
+
+import upgrade_bisect
+
+CURRENT = {"alpha": "1.0", "bravo": "1.0", "charlie": "1.0", "delta": "1.0",
+           "echo": "1.0", "foxtrot": "1.0", "golf": "1.0"}
+TARGET = {name: "2.0" for name in CURRENT}
+
+
+def fake_test(breaks):
+    """test(pins) failing when any set in `breaks` is fully upgraded; records every set it was given"""
+    def test(pins):
+        test.calls.append(dict(pins))
+        return not any(all(name in pins for name in combination) for combination in breaks)
+    test.calls = []
+    return test
+
+
+class FindCulpritsTest(unittest.TestCase):
+    def test_single_culprit(self):
+        test = fake_test([{"delta"}])
+        self.assertEqual(upgrade_bisect.find_culprits(TARGET, test), ["delta"])
+        # Every tested set only contains upgrades from the target
+        self.assertTrue(all(set(pins) <= set(TARGET) for pins in test.calls))
+
+    def test_interacting_culprits(self):
+        # Only the combination breaks: each package works on its own
+        test = fake_test([{"bravo", "foxtrot"}])
+        culprits = upgrade_bisect.find_culprits(TARGET, test)
+        self.assertEqual(len(culprits), 1)
+        self.assertIn(culprits[0], ("bravo", "foxtrot"))
+        self.assertTrue(test({name: TARGET[name] for name in TARGET if name not in culprits}))
+
+    def test_all_good(self):
+        test = fake_test([])
+        self.assertEqual(upgrade_bisect.find_culprits(TARGET, test), [])
+        self.assertEqual(len(test.calls), 1)
+
+    def test_known_failing_skips_full_set(self):
+        test = fake_test([{"alpha"}])
+        self.assertEqual(upgrade_bisect.find_culprits(TARGET, test, known_failing=True), ["alpha"])
+        self.assertNotIn(TARGET, test.calls)
+
+
+class BisectUpgradesTest(unittest.TestCase):
+    def test_single_culprit(self):
+        pins, culprits = upgrade_bisect.bisect_upgrades(CURRENT, TARGET, fake_test([{"charlie"}]))
+        self.assertEqual(culprits, {"charlie": "2.0"})
+        self.assertEqual(pins, dict(TARGET, charlie="1.0"))
+
+    def test_interacting_culprits(self):
+        test = fake_test([{"bravo", "foxtrot"}])
+        pins, culprits = upgrade_bisect.bisect_upgrades(CURRENT, TARGET, test)
+        self.assertEqual(len(culprits), 1)
+        self.assertTrue(set(culprits) <= {"bravo", "foxtrot"})
+        # Only the rejected package stays at its old pin and the resulting set passes
+        self.assertEqual({name for name in pins if pins[name] != TARGET[name]}, set(culprits))
+        self.assertTrue(test({name: ver for name, ver in pins.items() if CURRENT[name] != ver}))
+
+    def test_all_good(self):
+        pins, culprits = upgrade_bisect.bisect_upgrades(CURRENT, TARGET, fake_test([]))
+        self.assertEqual(culprits, {})
+        self.assertEqual(pins, TARGET)
+
+    def test_new_package_culprit_is_dropped(self):
+        target = dict(TARGET, hotel="1.0")
+        pins, culprits = upgrade_bisect.bisect_upgrades(CURRENT, target, fake_test([{"hotel"}]))
+        self.assertEqual(culprits, {"hotel": "1.0"})
+        self.assertNotIn("hotel", pins)
+
+
+if __name__ == "__main__":
+    unittest.main()
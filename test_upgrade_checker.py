@@ -0,0 +1,103 @@
+"""
+test_upgrade_checker.py
+PyPI lookups of upgrade_checker.py against a local mirror: 200 answers are cached with their ETag, 304 answers reuse them
+Run with: python -m pytest test_upgrade_checker.py (or python -m unittest test_upgrade_checker)
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import upgrade_checker
+
+# Fake index: package -> (version, etag)
+INDEX = {"alpha": ("2.0", '"alpha-2.0"'), "bravo": ("1.5", '"bravo-1.5"')}
+
+
+class MirrorHandler(BaseHTTPRequestHandler):
+    """JSON API of a PyPI mirror honouring If-None-Match; records every request it was given"""
+    requests = []
+
+    def do_GET(self):
+        MirrorHandler.requests.append((self.path, self.headers.get("If-None-Match")))
+        name = self.path.strip('/').split('/')[0]
+        if name not in INDEX or self.path != f"/{name}/json":
+            self.send_response(404)
+            self.end_headers()
+            return
+        latest, etag = INDEX[name]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        body = json.dumps({"info": {"version": latest}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GetLatestVersionsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), MirrorHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        MirrorHandler.requests = []
+        self.tmp = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmp, ".pypi_cache.json")
+        url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        for name, value in (("PYPI_INDEX_URL", url.rstrip('/')), ("PYPI_CACHE_PATH", self.cache_path)):
+            patcher = mock.patch.object(upgrade_checker, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_200_caches_etag(self):
+        latest = upgrade_checker.get_latest_versions(["alpha", "bravo"])
+        self.assertEqual(latest, {"alpha": "2.0", "bravo": "1.5"})
+        # Every request went to the mirror, without a validator on a cold cache
+        self.assertEqual(sorted(MirrorHandler.requests), [("/alpha/json", None), ("/bravo/json", None)])
+        with open(self.cache_path) as f:
+            cache = json.load(f)
+        url = f"{upgrade_checker.PYPI_INDEX_URL}/alpha/json"
+        self.assertEqual(cache[url]["etag"], '"alpha-2.0"')
+        self.assertEqual(cache[url]["version"], "2.0")
+
+    def test_304_uses_cached_version(self):
+        upgrade_checker.get_latest_versions(["alpha"])
+        # A 304 carries no body: the answer can only come from the cache
+        url = f"{upgrade_checker.PYPI_INDEX_URL}/alpha/json"
+        cache = upgrade_checker.load_cache()
+        cache[url]["version"] = "2.0-cached"
+        upgrade_checker.save_cache(cache)
+        MirrorHandler.requests = []
+        self.assertEqual(upgrade_checker.get_latest_versions(["alpha"]), {"alpha": "2.0-cached"})
+        self.assertEqual(MirrorHandler.requests, [("/alpha/json", '"alpha-2.0"')])
+
+    def test_unknown_package(self):
+        self.assertEqual(upgrade_checker.get_latest_versions(["charlie"]), {"charlie": None})
+        self.assertEqual(upgrade_checker.load_cache(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
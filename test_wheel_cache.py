@@ -0,0 +1,35 @@
+"""
+test_wheel_cache.py
+Lockfiles of wheel_cache.py, written for the running interpreter
+Run with: python -m pytest test_wheel_cache.py (or python -m unittest test_wheel_cache)
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import importlib.metadata
+
+import wheel_cache
+
+
+class LockEnvironmentTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="wheel-cache-test-")
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def test_lock_into_missing_directory(self):
+        # Like .venvs/current.lock on a fresh checkout
+        lock_file = os.path.join(self.tmp, ".venvs", "current.lock")
+        self.assertEqual(wheel_cache.lock_environment(sys.executable, lock_file), lock_file)
+        # websockets is a dependency of the services, so it is installed wherever they run
+        pins = wheel_cache.read_lock(lock_file)
+        self.assertEqual(pins.get("websockets"), importlib.metadata.version("websockets"))
+
+    def test_read_missing_lock(self):
+        self.assertEqual(wheel_cache.read_lock(os.path.join(self.tmp, "missing.lock")), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
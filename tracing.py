@@ -0,0 +1,103 @@
+"""
+tracing.py
+Per-stage latency of log lines and heartbeats on their way from a service to the dashboard
+service_client.py stamps every log line with a trace field after the timestamp,
+[trace:<id>:<epoch sent>], and each process on the path records how long its hop took:
+  client            log() called -> line received by the orchestrator (connect + send)
+  ingest            line received -> stored, indexed and (ERROR/FATAL) archived
+  dashboard         ERROR/FATAL line archived -> first served by the admin panel's /api/logs
+  heartbeat         heartbeat sent -> received by the orchestrator
+  publish           heartbeat received -> sent to the health monitor in a health report
+  monitor           health report sent -> received by the health monitor
+  dashboard_health  health report received -> first served by /api/health-status
+Samples feed the trace_stage_seconds histogram (/metrics) and a window of recent samples per
+stage, which processes exchange with export() / merge() and /api/traces summarises
+"""
+
+import os
+import re
+import time
+
+from collections import deque
+
+import metrics
+
+TRACE_SAMPLES = int(os.getenv("TRACE_SAMPLES", "2000"))  # recent samples kept per stage
+TRACE_LIMIT = int(os.getenv("TRACE_LIMIT", "200"))  # recent traced lines kept with their hop times
+
+TRACE_FIELD = re.compile(r"\[trace:([0-9a-f]+):([0-9.]+)\] ")
+STAGES = ("client", "ingest", "dashboard", "heartbeat", "publish", "monitor", "dashboard_health")
+
+STAGE_SECONDS = metrics.histogram("trace_stage_seconds", "Latency of each hop between a service and the dashboard",
+                                  ("stage",))
+
+SAMPLES = {stage: deque(maxlen=TRACE_SAMPLES) for stage in STAGES}
+# 'trace id' : {"id", "app", "severity", "sent", "received", "stored", "served"}, oldest dropped first
+TRACES = dict()
+
+
+def stamp():
+    """Trace field for a line about to be sent"""
+    return f"[trace:{os.urandom(8).hex()}:{time.time():.6f}] "
+
+
+def parse(text):
+    """(trace id, epoch sent, rest of the text) of text starting with a trace field, else (None, None, text)"""
+    match = TRACE_FIELD.match(text)
+    if match is None:
+        return None, None, text
+    return match.group(1), float(match.group(2)), text[match.end():]
+
+
+def observe(stage, seconds):
+    seconds = max(0.0, seconds)
+    SAMPLES[stage].append(seconds)
+    if metrics.ENABLED:
+        metrics.observe(STAGE_SECONDS, seconds, (stage,))
+
+
+def hop(trace_id, name, ts=None, **fields):
+    """Record when a traced line passed a hop ("received", "stored", "served")"""
+    trace = TRACES.get(trace_id)
+    if trace is None:
+        trace = TRACES[trace_id] = {"id": trace_id}
+        if len(TRACES) > TRACE_LIMIT:
+            del TRACES[next(iter(TRACES))]
+    trace.update(fields)
+    trace[name] = ts or time.time()
+    return trace
+
+
+def export():
+    """Recent samples and traces of this process, in the form merge() combines"""
+    return {"samples": {stage: list(values) for stage, values in SAMPLES.items() if values},
+            "traces": list(TRACES.values())}
+
+
+def merge(exports):
+    """Combine the exports of several processes; hops of one trace recorded in different processes are joined"""
+    samples, traces = dict(), dict()
+    for part in exports:
+        for stage, values in part["samples"].items():
+            samples.setdefault(stage, []).extend(values)
+        for trace in part["traces"]:
+            traces.setdefault(trace["id"], {}).update(trace)
+    return {"samples": samples, "traces": sorted(traces.values(), key=lambda trace: trace.get("sent", 0))}
+
+
+def _percentile(values, p):
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def summary(samples):
+    """Count, mean and percentiles (ms) per stage, in path order"""
+    stages = dict()
+    for stage in STAGES:
+        values = sorted(samples.get(stage, ()))
+        if not values:
+            continue
+        stages[stage] = {"count": len(values), "mean_ms": round(sum(values) / len(values) * 1000, 2)}
+        for p in (50, 95, 99):
+            stages[stage][f"p{p}_ms"] = round(_percentile(values, p) * 1000, 2)
+        stages[stage]["max_ms"] = round(values[-1] * 1000, 2)
+    return stages
@@ -0,0 +1,173 @@
+"""
+upgrade_bisect.py
+Finds the largest set of dependency upgrades the services still work with
+Bisects a failing upgrade set to isolate the package(s) that break the service
+Every candidate set is tested in its own snapshot of the service virtualenv, in parallel
+Everything but the upgraded packages is constrained to the frozen baseline (.venvs/current.lock),
+so pip cannot move other dependencies and a set that only installs by moving them counts as failing
+pip honours PIP_INDEX_URL / PIP_FIND_LINKS, so a local package index can stand in for PyPI
+"""
+
+import os
+import shutil
+import tempfile
+import subprocess
+import venv
+
+from concurrent.futures import ThreadPoolExecutor
+
+import auto_update
+import venvs
+import fleet_check
+import wheel_cache
+
+BISECT_WORKERS = int(os.getenv("BISECT_WORKERS", str(os.cpu_count() or 2)))
+
+# Every upgrade set tested so far with its fleet results: ({package: version}, {service: result})
+TESTED = []
+
+
+def read_pins(file):
+    """'package' : 'version' for every name==version line of a requirements file"""
+    pins = {}
+    with open(file, "r") as f:
+        for line in f:
+            line = line.strip()
+            if "==" in line and not line.startswith("#"):
+                name, ver = line.split("==", 1)
+                pins[name.strip()] = ver.strip()
+    return pins
+
+
+def write_pins(file, pins):
+    with open(file, "w") as f:
+        for name, ver in pins.items():
+            f.write(f"{name}=={ver}\n")
+
+
+def create_test_env():
+    """A throwaway snapshot of the service environment; returns (env_dir, python)"""
+    os.makedirs(venvs.VENV_DIR, exist_ok=True)
+    env_dir = tempfile.mkdtemp(prefix="bisect-", dir=venvs.VENV_DIR)
+    if os.path.exists(venvs.CURRENT_ENV):
+        shutil.rmtree(env_dir)
+        shutil.copytree(venvs.CURRENT_ENV, env_dir, symlinks=True)
+    else:
+        # The overlay sees the base interpreter's pip, so there is no need to install one
+        venv.create(env_dir, system_site_packages=True, with_pip=False)
+    return env_dir, venvs.env_python(env_dir)
+
+
+def write_constraints(file, upgrades, python):
+    """
+    Pin every package of the frozen baseline except the upgraded ones.
+    The baseline is the current environment's lockfile, or a freeze of `python` when there is none yet.
+    """
+    lock_file = venvs.CURRENT_LOCK
+    if not os.path.exists(lock_file):
+        lock_file = wheel_cache.lock_environment(python, file)
+    upgraded = {auto_update.normalize(name) for name in upgrades}
+    baseline = wheel_cache.read_lock(lock_file)
+    write_pins(file, {name: ver for name, ver in baseline.items() if name not in upgraded})
+    return file
+
+
+def test_upgrades(upgrades):
+    """Install the given {package: version} upgrades into a fresh snapshot and smoke check the fleet"""
+    env_dir, python = create_test_env()
+    try:
+        if upgrades:
+            pins = [f"{name}=={ver}" for name, ver in upgrades.items()]
+            constraints = write_constraints(os.path.join(env_dir, "constraints.txt"), upgrades, python)
+            result = subprocess.run([python, "-m", "pip", "install", "--quiet", "-c", constraints,
+                                     "--find-links", wheel_cache.WHEELHOUSE, *pins],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"[-] Could not install {', '.join(pins)}: {result.stderr.strip()}")
+                return False
+        results = fleet_check.run_fleet(python)
+        TESTED.append((dict(upgrades), results))
+        return all(result["ok"] for result in results.values())
+    finally:
+        shutil.rmtree(env_dir, ignore_errors=True)
+
+
+def find_culprits(upgrades, test=test_upgrades, known_failing=False):
+    """
+    Return the packages of a failing upgrade set that break the service.
+    Each round splits every failing group in two and tests all halves in parallel.
+    When both halves pass on their own, the left half is kept as a base and the right half
+    is bisected on top of it, so failures caused by a combination still narrow down.
+    """
+    names = sorted(upgrades)
+    results = {}
+
+    def run(batch):
+        """Test a batch of name lists in parallel, reusing results of sets already seen"""
+        todo = list({frozenset(group) for group in batch if frozenset(group) not in results})
+        with ThreadPoolExecutor(max_workers=BISECT_WORKERS) as pool:
+            for group, ok in zip(todo, pool.map(lambda g: test({n: upgrades[n] for n in g}), todo)):
+                results[group] = ok
+        return [results[frozenset(group)] for group in batch]
+
+    if not names or (not known_failing and run([names])[0]):
+        return []
+
+    culprits = []
+    groups = [([], names)]  # (base, items): base + items is known to fail, base alone passes
+    while groups:
+        splits = []
+        for base, items in groups:
+            if len(items) == 1:
+                culprits.append(items[0])
+            else:
+                middle = len(items) // 2
+                splits.append((base, items[:middle], items[middle:]))
+
+        outcomes = run([base + half for base, left, right in splits for half in (left, right)])
+        groups = []
+        for i, (base, left, right) in enumerate(splits):
+            left_ok, right_ok = outcomes[2 * i], outcomes[2 * i + 1]
+            if not left_ok:
+                groups.append((base, left))
+            if not right_ok:
+                groups.append((base, right))
+            if left_ok and right_ok:
+                groups.append((base + left, right))
+    return sorted(culprits)
+
+
+def bisect_upgrades(current_pins, target_pins, test=test_upgrades, known_failing=False):
+    """
+    Work out the largest compatible upgrade set.
+    Returns (pins to write to requirements.txt, culprits as {package: rejected version}).
+    """
+    upgrades = {name: ver for name, ver in target_pins.items() if current_pins.get(name) != ver}
+    culprits = {}
+    while upgrades:
+        found = find_culprits(upgrades, test, known_failing)
+        if not found:
+            break
+        for name in found:
+            culprits[name] = upgrades.pop(name)
+        # Re-check what is left: removing one culprit can expose another combination
+        known_failing = False
+
+    pins = dict(target_pins)
+    for name in culprits:
+        if name in current_pins:
+            pins[name] = current_pins[name]
+        else:
+            del pins[name]
+    return pins, culprits
+
+
+if __name__ == "__main__":
+    current = read_pins(auto_update.BACKUP_FILE)
+    target = read_pins(auto_update.REQ_FILE)
+    pins, culprits = bisect_upgrades(current, target)
+    fleet_check.print_matrix(fleet_check.build_matrix(TESTED))
+    write_pins(auto_update.REQ_FILE, pins)
+    print("[+] requirements.txt written with the largest compatible upgrade set.")
+    for name, ver in culprits.items():
+        print(f"[-] {name}=={ver} breaks the service (kept {current.get(name, 'not installed')})")
@@ -4,14 +4,24 @@ Backs up existing requirements.txt file and creates new requirements.txt with ne
 Upgrades individual depenedency to the latest version
 Checks if service 3.py runs with upgraded version
 Rollsback to backup if service does not run as expected
+Latest versions are fetched concurrently and cached on disk (ETag / Last-Modified revalidation)
 """
 
 import requests
 import importlib.metadata
 from packaging import version
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+import json
 import os
 import re
 
+# PyPI JSON API base URL; point it at a local mirror to test without the internet
+PYPI_INDEX_URL = os.getenv("PYPI_INDEX_URL", "https://pypi.org/pypi").rstrip('/')
+PYPI_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.getenv("PYPI_CACHE", ".pypi_cache.json"))
+PYPI_WORKERS = int(os.getenv("PYPI_WORKERS", "16"))
+PYPI_TIMEOUT = 5
+
 def get_packages_from_requirements():
     """Read packages from requirements.txt file"""
     packages = {}
@@ -41,19 +51,65 @@ def get_packages_from_requirements():
     
     return packages
 
-def get_latest_version(package_name):
-    """Fetch the latest version from PyPI"""
+def load_cache():
+    """Load cached PyPI metadata: 'url' : {"etag", "last_modified", "version"}"""
+    try:
+        with open(PYPI_CACHE_PATH, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_cache(cache):
+    tmp_path = PYPI_CACHE_PATH + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, PYPI_CACHE_PATH)
+
+def make_session():
+    """HTTP session whose connection pool is large enough for every worker thread"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=PYPI_WORKERS, pool_maxsize=PYPI_WORKERS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def get_latest_version(package_name, session=None, cache=None):
+    """Fetch the latest version from PyPI, revalidating any cached answer"""
+    url = f"{PYPI_INDEX_URL}/{package_name}/json"
+    cached = cache.get(url) if cache is not None else None
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
     try:
-        url = f"https://pypi.org/pypi/{package_name}/json"
-        response = requests.get(url, timeout=5)
+        response = (session or requests).get(url, headers=headers, timeout=PYPI_TIMEOUT)
+        if response.status_code == 304 and cached:
+            return cached["version"]
         if response.status_code == 200:
-            data = response.json()
-            return data["info"]["version"]
+            latest = response.json()["info"]["version"]
+            if cache is not None:
+                cache[url] = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "version": latest
+                }
+            return latest
         else:
             return None
     except Exception:
         return None
 
+def get_latest_versions(package_names):
+    """Fetch the latest version of every package concurrently: 'package' : version or None"""
+    cache = load_cache()
+    with make_session() as session, ThreadPoolExecutor(max_workers=PYPI_WORKERS) as pool:
+        results = pool.map(lambda name: get_latest_version(name, session, cache), package_names)
+        latest_versions = dict(zip(package_names, results))
+    save_cache(cache)
+    return latest_versions
+
 def check_updates():
     requirements_path = os.path.join(os.path.dirname(__file__), 'requirements.txt')
     if not os.path.exists(requirements_path):
@@ -63,8 +119,7 @@ def check_updates():
     with open(requirements_path, 'r') as f:
         lines = f.readlines()
 
-    packages_info = []
-    updated_lines = lines[:]  # copy
+    requirements = []
     for i, line in enumerate(lines):
         line_stripped = line.strip()
         if not line_stripped or line_stripped.startswith('#'):
@@ -72,23 +127,29 @@ def check_updates():
 
         match = re.match(r'^([a-zA-Z0-9\-_\.]+)==(.+)', line_stripped)
         if match:
-            package_name = match.group(1)
-            current_version = match.group(2)
-            try:
-                installed_version = importlib.metadata.version(package_name)
-                latest = get_latest_version(package_name)
-                if latest and version.parse(installed_version) < version.parse(latest):
-                    status = "⬆️ Update available"
-                    # Update the line
-                    updated_lines[i] = f"{package_name}=={latest}\n"
-                elif not latest:
-                    status = "❓ Couldn't check"
-                else:
-                    status = "✅ Up to date"
-            except importlib.metadata.PackageNotFoundError:
-                status = "❌ Not Installed"
-                latest = "N/A"
-            packages_info.append((package_name, installed_version if 'installed_version' in locals() else "Not Installed", latest or 'N/A', status))
+            requirements.append((i, match.group(1)))
+
+    latest_versions = get_latest_versions([package_name for _, package_name in requirements])
+
+    packages_info = []
+    updated_lines = lines[:]  # copy
+    for i, package_name in requirements:
+        try:
+            installed_version = importlib.metadata.version(package_name)
+            latest = latest_versions[package_name]
+            if latest and version.parse(installed_version) < version.parse(latest):
+                status = "⬆️ Update available"
+                # Update the line
+                updated_lines[i] = f"{package_name}=={latest}\n"
+            elif not latest:
+                status = "❓ Couldn't check"
+            else:
+                status = "✅ Up to date"
+        except importlib.metadata.PackageNotFoundError:
+            installed_version = "Not Installed"
+            status = "❌ Not Installed"
+            latest = "N/A"
+        packages_info.append((package_name, installed_version, latest or 'N/A', status))
 
     # Print table
     print(f"{'Package':<30} {'Installed':<15} {'Latest':<15} {'Status'}")
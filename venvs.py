@@ -0,0 +1,32 @@
+"""
+venvs.py
+Locations of the service virtualenvs managed by auto_update.py, and the interpreter services run with
+Kept apart from auto_update.py so long-running processes (orchestrator, supervisor) do not import
+the upgrade pipeline just to find their interpreter
+"""
+
+import os
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+VENV_DIR = os.path.join(SCRIPT_DIR, ".venvs")
+CURRENT_ENV = os.path.join(VENV_DIR, "current")      # environment the services run in
+CANDIDATE_ENV = os.path.join(VENV_DIR, "candidate")  # snapshot receiving the upgrades
+PREVIOUS_ENV = os.path.join(VENV_DIR, "previous")    # last promoted-over environment
+# Resolved package set of each environment; moved together with the environment directory
+CURRENT_LOCK = CURRENT_ENV + ".lock"
+CANDIDATE_LOCK = CANDIDATE_ENV + ".lock"
+PREVIOUS_LOCK = PREVIOUS_ENV + ".lock"
+
+
+def env_python(env_dir):
+    """Path of the interpreter inside a virtualenv"""
+    if sys.platform == "win32":
+        return os.path.join(env_dir, "Scripts", "python.exe")
+    return os.path.join(env_dir, "bin", "python")
+
+
+def service_python():
+    """Interpreter services should run with: the promoted virtualenv if there is one"""
+    python = env_python(CURRENT_ENV)
+    return python if os.path.exists(python) else sys.executable
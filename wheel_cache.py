@@ -0,0 +1,145 @@
+"""
+wheel_cache.py
+Local wheel cache and resolved lockfiles for the upgrade pipeline
+Every environment the pipeline builds is locked (pip freeze) and its wheels are kept in .wheelhouse,
+so rolling back or re-applying an upgrade installs from the cache without touching the index
+The cache is size limited and evicts the least recently used wheels first,
+never the ones pinned by a lockfile still in use
+"""
+
+import os
+import re
+import json
+import time
+import subprocess
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+WHEELHOUSE = os.path.join(SCRIPT_DIR, os.getenv("WHEELHOUSE", ".wheelhouse"))
+USAGE_FILE = os.path.join(WHEELHOUSE, "usage.json")  # 'wheel filename' : last used (epoch seconds)
+WHEEL_CACHE_MAX_MB = float(os.getenv("WHEEL_CACHE_MAX_MB", "2048"))
+
+
+def _normalize(name):
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def _wheel_key(filename):
+    """(normalized name, version) of a wheel / sdist filename"""
+    if filename.endswith(".whl"):
+        name, ver = filename.split("-")[:2]
+    else:
+        match = re.match(r"^(.+)-([^-]+)\.(tar\.gz|zip)$", filename)
+        if not match:
+            return None
+        name, ver = match.group(1), match.group(2)
+    return _normalize(name), ver
+
+
+def read_lock(lock_file):
+    """'normalized name' : version of a lockfile (empty if missing)"""
+    pins = {}
+    if not os.path.exists(lock_file):
+        return pins
+    with open(lock_file, "r") as f:
+        for line in f:
+            line = line.strip()
+            if "==" in line and not line.startswith("#"):
+                name, ver = line.split("==", 1)
+                pins[_normalize(name)] = ver.strip()
+    return pins
+
+
+def lock_environment(python, lock_file):
+    """Write the fully resolved package set of an environment to lock_file"""
+    result = subprocess.run([python, "-m", "pip", "freeze", "--exclude-editable"],
+                            capture_output=True, text=True, check=True)
+    pins = [line for line in result.stdout.splitlines() if "==" in line]
+    # On a fresh checkout nothing has created .venvs yet
+    os.makedirs(os.path.dirname(os.path.abspath(lock_file)), exist_ok=True)
+    with open(lock_file, "w") as f:
+        f.write("\n".join(pins) + "\n")
+    return lock_file
+
+
+def _load_usage():
+    try:
+        with open(USAGE_FILE, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_usage(usage):
+    with open(USAGE_FILE + ".tmp", "w") as f:
+        json.dump(usage, f, indent=2)
+    os.replace(USAGE_FILE + ".tmp", USAGE_FILE)
+
+
+def _cached_files():
+    return [name for name in os.listdir(WHEELHOUSE) if _wheel_key(name)]
+
+
+def mark_used(lock_file):
+    """Refresh the LRU timestamp of every cached file pinned by lock_file"""
+    pins = read_lock(lock_file)
+    usage = _load_usage()
+    now = time.time()
+    for filename in _cached_files():
+        name, ver = _wheel_key(filename)
+        if pins.get(name) == ver:
+            usage[filename] = now
+    _save_usage(usage)
+
+
+def ensure_cached(python, lock_file):
+    """
+    Make sure every package of lock_file is in the wheelhouse.
+    A cache-only pass is tried first; the index is contacted only for what is missing.
+    """
+    os.makedirs(WHEELHOUSE, exist_ok=True)
+    offline = subprocess.run([python, "-m", "pip", "download", "--quiet", "--no-deps", "--no-index",
+                              "--find-links", WHEELHOUSE, "-d", WHEELHOUSE, "-r", lock_file],
+                             capture_output=True, text=True)
+    if offline.returncode != 0:
+        subprocess.run([python, "-m", "pip", "wheel", "--quiet", "--no-deps",
+                        "--find-links", WHEELHOUSE, "-w", WHEELHOUSE, "-r", lock_file])
+    mark_used(lock_file)
+
+
+def install_offline(python, lock_file):
+    """Install exactly the locked set from the wheelhouse without contacting any index"""
+    result = subprocess.run([python, "-m", "pip", "install", "--quiet", "--no-index", "--no-deps",
+                             "--find-links", WHEELHOUSE, "-r", lock_file])
+    if result.returncode == 0:
+        mark_used(lock_file)
+    return result.returncode == 0
+
+
+def cache_size():
+    return sum(os.path.getsize(os.path.join(WHEELHOUSE, name)) for name in _cached_files())
+
+
+def evict(protected_locks=(), max_mb=WHEEL_CACHE_MAX_MB):
+    """Delete least recently used files until the cache fits max_mb; returns the files removed"""
+    if not os.path.isdir(WHEELHOUSE):
+        return []
+    protected = [read_lock(lock) for lock in protected_locks]
+    usage = _load_usage()
+    total = cache_size()
+    limit = max_mb * 1024 * 1024
+    removed = []
+
+    for filename in sorted(_cached_files(), key=lambda name: usage.get(name, 0)):
+        if total <= limit:
+            break
+        name, ver = _wheel_key(filename)
+        if any(pins.get(name) == ver for pins in protected):
+            continue
+        path = os.path.join(WHEELHOUSE, filename)
+        total -= os.path.getsize(path)
+        os.remove(path)
+        usage.pop(filename, None)
+        removed.append(filename)
+
+    _save_usage(usage)
+    return removed